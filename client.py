@@ -0,0 +1,206 @@
+from metrics import FunctionStats
+from server import DEFAULT_PORT, STATUS_DATA, STATUS_END, STATUS_ERROR, read_frame
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time as time_module
+
+
+class HotelClientError(Exception):
+    pass
+
+
+class HotelClient:
+    # client แบบ pipeline: ส่งหลายคำขอพร้อมกันบน connection เดียว แล้วจับคู่คำตอบด้วย id
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                frame = await read_frame(self._reader)
+                if frame is None:
+                    break
+                request_id, status, payload = frame
+                queue = self._pending.get(request_id)
+                if queue is not None:
+                    queue.put_nowait((status, payload))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for queue in self._pending.values():
+                queue.put_nowait((STATUS_ERROR, "Error: Connection closed"))
+
+    def _send(self, command, args):
+        request_id = str(next(self._ids))
+        self._pending[request_id] = asyncio.Queue()
+        self._writer.write(" ".join([request_id, command, *map(str, args)]).encode("utf-8") + b"\n")
+        return request_id
+
+    async def stream(self, command, *args):
+        # คืนผลลัพธ์ทีละชิ้นตามที่ server ส่งมา (DATA ... END) หรือชิ้นเดียวสำหรับคำสั่งทั่วไป
+        request_id = self._send(command, args)
+        queue = self._pending[request_id]
+        try:
+            await self._writer.drain()
+            while True:
+                status, payload = await queue.get()
+                if status == STATUS_ERROR:
+                    raise HotelClientError(payload)
+                if status == STATUS_END:
+                    return
+                yield payload
+                if status != STATUS_DATA:
+                    return
+        finally:
+            del self._pending[request_id]
+
+    async def request(self, command, *args):
+        return "".join([chunk async for chunk in self.stream(command, *args)])
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._receiver.cancel()
+        try:
+            await self._receiver
+        except asyncio.CancelledError:
+            pass
+
+
+# สัดส่วนคำสั่งเริ่มต้นของ load generator: ค้นหาเป็นหลัก มีการเพิ่มห้องและอ่านหน้าห้องที่เรียงแล้วปนอยู่
+DEFAULT_MIX = "F=70,M=25,P=5"
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        command, _, weight = item.partition("=")
+        mix[command.strip().upper()] = float(weight or 1)
+    return mix
+
+
+def _make_request(command, rnd, room_space):
+    if command == 'F':
+        return ('F', rnd.randint(1, room_space))
+    if command == 'M':
+        # ห้องใหม่เหนือช่วงที่ค้นหา สุ่มจากช่วงกว้างเพื่อไม่ชนกับห้องที่ load รอบก่อนเพิ่มไว้
+        return ('M', rnd.randint(room_space + 1, 1 << 62), "load", "Loadgen")
+    if command == 'R':
+        return ('R', rnd.randint(1, room_space))
+    if command == 'P':
+        return ('P', rnd.randint(0, 1000), 100)
+    if command == 'C':
+        return ('C',)
+    raise ValueError(f"Load generator does not support command {command}")
+
+
+async def run_load(host, port, path, connections, concurrency, total, mix, room_space, seed=None):
+    clients = [await HotelClient.connect(host, port, path) for _ in range(connections)]
+    stats = {}
+    errors = 0
+    rnd = random.Random(seed)
+    commands = list(mix)
+    weights = [mix[command] for command in commands]
+    remaining = itertools.count()
+
+    async def worker(client):
+        nonlocal errors
+        while next(remaining) < total:
+            command, *args = _make_request(rnd.choices(commands, weights)[0], rnd, room_space)
+            started = time_module.perf_counter()
+            try:
+                await client.request(command, *args)
+            except HotelClientError:
+                errors += 1
+            op_stats = stats.get(command)
+            if op_stats is None:
+                op_stats = stats[command] = FunctionStats()
+            op_stats.record(time_module.perf_counter() - started)
+
+    started = time_module.perf_counter()
+    try:
+        await asyncio.gather(*(worker(clients[index % connections]) for index in range(concurrency)))
+    finally:
+        for client in clients:
+            await client.close()
+    return stats, errors, time_module.perf_counter() - started
+
+
+def print_load_summary(stats, errors, wall_time, file=sys.stdout):
+    total = sum(op_stats.calls for op_stats in stats.values())
+    everything = FunctionStats()
+    for op_stats in stats.values():
+        everything.merge(op_stats)
+    print(f"{total} requests in {wall_time:.3f} seconds ({total / wall_time if wall_time else 0:.0f} requests/sec), {errors} errors", file=file)
+    for name, op_stats in [("all", everything)] + sorted(stats.items()):
+        print(f"{name}: {op_stats.calls} requests, p50 {op_stats.percentile(0.50) * 1e6:.1f}us, "
+              f"p95 {op_stats.percentile(0.95) * 1e6:.1f}us, p99 {op_stats.percentile(0.99) * 1e6:.1f}us, "
+              f"p99.9 {op_stats.percentile(0.999) * 1e6:.1f}us, max {op_stats.max * 1e6:.1f}us", file=file)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Send commands or generate load against a hotel server")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server TCP port")
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--load", type=int, metavar="REQUESTS", help="send REQUESTS generated requests and report throughput")
+    parser.add_argument("--connections", type=int, default=4, help="connections used by the load generator")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight across all connections")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command weights, e.g. F=70,M=25,P=5")
+    parser.add_argument("--room-space", type=int, default=1000000, help="rooms looked up by generated requests")
+    parser.add_argument("--seed", type=int, help="random seed for generated requests (random by default)")
+    parser.add_argument("command", nargs="*", help="a single command to send, e.g. F 1024")
+    return parser.parse_args(argv)
+
+
+async def _send_command(options):
+    client = await HotelClient.connect(options.host, options.port, options.unix)
+    try:
+        async for chunk in client.stream(options.command[0].upper(), *options.command[1:]):
+            sys.stdout.write(chunk if chunk.endswith("\n") else chunk + "\n")
+    finally:
+        await client.close()
+
+
+def main(argv=None):
+    options = parse_arguments(argv)
+    try:
+        if options.load:
+            stats, errors, wall_time = asyncio.run(run_load(
+                options.host, options.port, options.unix, options.connections, options.concurrency,
+                options.load, parse_mix(options.mix), options.room_space, options.seed))
+            print_load_summary(stats, errors, wall_time)
+        elif options.command:
+            asyncio.run(_send_command(options))
+        else:
+            print("Error: Give a command to send or --load REQUESTS", file=sys.stderr)
+            return 2
+    except HotelClientError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import threading
+from contextlib import contextmanager
+
+from journal import OP_CODES
+
+# เมธอดที่แก้ไขโรงแรม (ต้องถือ write lock) นอกนั้นถือว่าเป็นการอ่าน
+WRITE_METHODS = frozenset(OP_CODES) | {"compact", "compact_journal", "close_journal", "set_metrics_enabled", "save_snapshot"}
+# การอ่านที่ค้นผ่าน relocation ที่ยังรออยู่ได้เอง (การอ่านอื่นต้อง compact ก่อน ซึ่งเป็นการแก้ไข)
+RELOCATION_AWARE_READS = frozenset({"find_room", "iter_sorted_rooms", "sorted_rooms_page", "sort_rooms",
+                                    "iter_csv_chunks", "export_csv", "write_to_file"})
+
+
+class ReadWriteLock:
+    # ผู้อ่านหลายคนทำงานพร้อมกันได้ ผู้เขียนทำงานทีละคน และได้สิทธิ์ก่อนผู้อ่านที่มาทีหลัง (ผู้เขียนไม่อดตาย)
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class HotelEngine:
+    # โรงแรมเดียวที่ใช้ร่วมกันหลายเธรด: เรียกเมธอดของ Hilberts ผ่าน engine ได้เหมือนเรียกโดยตรง
+    # เมธอดที่คืน iterator จะถูกอ่านจนจบภายใต้ read lock (ใช้ reading() ถ้าต้องการอ่านแบบ streaming)
+    def __init__(self, hotel):
+        self.hotel = hotel
+        self.lock = ReadWriteLock()
+        # เธรดที่ถือ lock อยู่แล้ว (เช่นภายใน reading()/writing()) เรียก engine ซ้อนได้โดยไม่ล็อกซ้ำ
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.hotel, name)
+        if not callable(attribute):
+            # dict/list/set ของโรงแรม (เช่น channels) คืนเป็นสำเนาที่อ่านภายใต้ read lock ผู้เรียกจึงวนได้ขณะมีผู้เขียน
+            with self.reading() as hotel:
+                attribute = getattr(hotel, name)
+                return attribute.copy() if isinstance(attribute, (dict, list, set)) else attribute
+        if name in WRITE_METHODS:
+            return lambda *args, **kwargs: self._call_write(name, args, kwargs)
+        return lambda *args, **kwargs: self._call_read(name, args, kwargs)
+
+    def _holding(self):
+        return getattr(self._local, "mode", None)
+
+    def _call_read(self, name, args, kwargs):
+        if self._holding():
+            return getattr(self.hotel, name)(*args, **kwargs)
+        while True:
+            with self.reading() as hotel:
+                # ตรวจภายใต้ read lock: ผู้เขียนอาจเพิ่ม relocation ได้ทุกเมื่อก่อนที่ผู้อ่านจะได้ lock
+                if not hotel.relocations or name in RELOCATION_AWARE_READS:
+                    result = getattr(hotel, name)(*args, **kwargs)
+                    if hasattr(result, "__next__"):
+                        result = list(result)
+                    return result
+            # การอ่านนี้ต้อง compact ก่อน (เป็นการแก้ไข) จึงทำภายใต้ write lock แล้วตรวจใหม่
+            with self.lock.write():
+                if self.hotel.relocations:
+                    self.hotel.compact()
+
+    def _call_write(self, name, args, kwargs):
+        if self._holding() == "write":
+            return getattr(self.hotel, name)(*args, **kwargs)
+        if self._holding() == "read":
+            raise RuntimeError(f"Cannot call {name} while holding the hotel read lock")
+        with self.writing() as hotel:
+            return getattr(hotel, name)(*args, **kwargs)
+
+    @contextmanager
+    def reading(self):
+        # อ่านหลายขั้นตอน (หรืออ่าน iterator แบบ streaming) ภายใต้ read lock เดียว
+        if self._holding():
+            yield self.hotel
+            return
+        with self.lock.read():
+            self._local.mode = "read"
+            try:
+                yield self.hotel
+            finally:
+                self._local.mode = None
+
+    @contextmanager
+    def writing(self):
+        # แก้ไขหลายขั้นตอนแบบ atomic; การรอ fsync ของ journal เกิดหลังปล่อย lock เพื่อให้ group commit รวมหลายเธรดได้
+        if self._holding() == "write":
+            yield self.hotel
+            return
+        if self._holding() == "read":
+            raise RuntimeError("Cannot upgrade a hotel read lock to a write lock")
+        journal = self.hotel.journal
+        if journal is not None:
+            journal.defer_acknowledgements()
+        try:
+            with self.lock.write():
+                self._local.mode = "write"
+                try:
+                    yield self.hotel
+                finally:
+                    self._local.mode = None
+        finally:
+            if journal is not None:
+                sequence = journal.take_deferred_acknowledgement()
+                if sequence:
+                    journal.wait_durable(sequence)
+
+    def replace(self, hotel):
+        # สลับเป็นโรงแรมใหม่ (เช่นโหลดจาก snapshot) เมื่อไม่มีใครอ่านหรือเขียนอยู่
+        with self.lock.write():
+            previous, self.hotel = self.hotel, hotel
+        previous.close_journal()
+        return hotel
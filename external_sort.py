@@ -0,0 +1,43 @@
+from room_id import RoomId
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(buffer, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def encode_room(room, out):
+    # header คู่ = จำนวนเต็มยาว header // 2 ไบต์, header คี่ = RoomId ตามด้วย base และ exponent
+    if isinstance(room, RoomId):
+        encode_varint(1, out)
+        encode_varint(room.base, out)
+        encode_varint(room.exponent, out)
+        return
+    length = (room.bit_length() + 7) // 8
+    encode_varint(length << 1, out)
+    out += room.to_bytes(length, "little")
+
+
+def decode_room(buffer, position):
+    header, position = decode_varint(buffer, position)
+    if header & 1:
+        base, position = decode_varint(buffer, position)
+        exponent, position = decode_varint(buffer, position)
+        return RoomId(base, exponent), position
+    length = header >> 1
+    end = position + length
+    return int.from_bytes(buffer[position:end], "little"), end
@@ -0,0 +1,664 @@
+import bisect
+import collections
+import heapq
+import itertools
+import re
+import sys
+import threading
+from array import array
+
+from room_id import RoomId
+from room_index import RoomPostings, SortedRoomIndex
+
+# ห้องที่เป็น int ไม่เกิน 64 บิตเก็บในคอลัมน์ array; ห้องที่ใหญ่กว่าหรือเป็น RoomId เก็บใน dict แยก (มีน้อย)
+_KEY_LIMIT = 1 << 64
+_KEY_LIMIT_LOG = 64 * 0.6931471805599453
+_CHANNEL_CODE_LIMIT = 1 << 16
+# รหัส channel 0 = ช่องที่ถูกลบแล้ว (tombstone), รหัสสตริง 0 = ไม่มีค่า (None)
+_NO_CODE = 0
+# ห้องใหม่เข้า buffer ก่อน แล้วรวมเข้าคอลัมน์เมื่อ buffer เกิน 1/PENDING_RATIO ของจำนวนห้อง (อย่างน้อย MIN_PENDING)
+MIN_PENDING = 1024
+PENDING_RATIO = 32
+_WORD = re.compile(r"\w+")
+
+
+def guest_tokens(guest_info):
+    # คำตัวพิมพ์เล็กใน guest_info ที่ใช้ในดัชนีค้นด้วย prefix
+    return set(_WORD.findall(str(guest_info).lower()))
+
+
+class GuestRecord:
+    # ข้อมูลแขกของห้องหนึ่ง ใช้แทน dict เดิมได้ (info["channel"], info.get("manual_channel"), "manual_channel" in info)
+    __slots__ = ("channel", "guest_info", "manual_channel")
+
+    def __init__(self, channel, guest_info, manual_channel=None):
+        self.channel = channel
+        self.guest_info = guest_info
+        self.manual_channel = manual_channel
+
+    @classmethod
+    def of(cls, info):
+        if isinstance(info, cls):
+            return info
+        return cls(info["channel"], info["guest_info"], info.get("manual_channel"))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            other = GuestRecord.of(other)
+        if not isinstance(other, GuestRecord):
+            return NotImplemented
+        return (self.channel, self.guest_info, self.manual_channel) == (other.channel, other.guest_info, other.manual_channel)
+
+    __hash__ = None
+
+    def as_dict(self):
+        info = {"channel": self.channel, "guest_info": self.guest_info}
+        if self.manual_channel is not None:
+            info["manual_channel"] = self.manual_channel
+        return info
+
+    def __repr__(self):
+        return f"GuestRecord({self.channel!r}, {self.guest_info!r}, {self.manual_channel!r})"
+
+
+def _array_key(room):
+    # key ในคอลัมน์ของห้องนี้ (int ไม่เกิน 64 บิต) หรือ None; RoomId ที่เล็กพอเท่ากับ int ของมัน
+    if type(room) is int:
+        return room if 0 <= room < _KEY_LIMIT else None
+    if isinstance(room, RoomId) and room.log() < _KEY_LIMIT_LOG:
+        room = int(room)
+        return room if room < _KEY_LIMIT else None
+    return None
+
+
+class GuestStore:
+    # ที่เก็บห้อง materialized แบบคอลัมน์ (struct-of-arrays) แทน dict ของ dict:
+    # key ที่เรียงแล้วใน array("Q"), รหัส channel 2 ไบต์, guest_info และ manual_channel เป็นรหัสของตารางสตริงที่ใช้ร่วมกัน
+    # ใช้ได้เหมือน dict {room: info} (ค่าที่อ่านได้เป็น GuestRecord) และเป็นดัชนีเรียงของห้องไปในตัว
+    def __init__(self, items=()):
+        self._keys = array("Q")
+        self._channel_codes = array("H")
+        self._info_codes = array("I")
+        self._manual_codes = array("I")
+        self._live = 0
+        self._channel_names = [None]
+        self._channel_lookup = {}
+        # ตารางสตริงพร้อมตัวนับการอ้างอิง สตริงที่ไม่มีห้องใช้แล้วถูกคืนช่องให้ใช้ใหม่
+        self._strings = [None]
+        self._string_lookup = {}
+        self._string_refs = [0]
+        self._free_strings = []
+        self._string_bytes = 0
+        # ห้องที่ยังไม่ได้รวมเข้าคอลัมน์ (ห้องใหม่ และห้องที่ไม่ใช่ int 64 บิต): {room: GuestRecord}
+        self._boxed = {}
+        self._boxed_index = SortedRoomIndex()
+        self._pending = 0
+        # ดัชนีรองของห้อง: {ค่า: RoomPostings} ตาม channel และตาม manual_channel
+        # สร้างเมื่อค้นแบบกรอง channel ครั้งแรก (None = ยังไม่สร้าง) เช่นเดียวกับดัชนีคำ: RoomPostings เก็บห้องซ้ำอีกชุด
+        # ซึ่งใหญ่กว่าคอลัมน์เอง การนับและรายการห้องของ channel ที่ไม่มีดัชนีจึงสแกนคอลัมน์รหัส channel แทน
+        self._by_channel = None
+        self._by_manual_channel = None
+        # ดัชนีคำใน guest_info {คำ: ห้อง หรือ RoomPostings} พร้อมรายการคำที่เรียงไว้สำหรับค้นด้วย prefix
+        # สร้างเมื่อค้นด้วยคำครั้งแรก (None = ยังไม่สร้าง): guest_info ที่ไม่ซ้ำกันมีคำไม่ซ้ำหลายคำต่อห้อง
+        # ดัชนีนี้จึงใหญ่กว่าคอลัมน์หลายเท่า โรงแรมที่ไม่เคยค้นด้วยชื่อแขกไม่ต้องจ่ายหน่วยความจำส่วนนี้
+        self._by_token = None
+        self._token_list = []
+        if items:
+            self._load_sorted(sorted(((room, GuestRecord.of(info)) for room, info in dict(items).items()), key=_first))
+
+    def _channel_code(self, channel):
+        code = self._channel_lookup.get(channel)
+        if code is None:
+            code = len(self._channel_names)
+            if code >= _CHANNEL_CODE_LIMIT:
+                raise ValueError(f"Guest store supports at most {_CHANNEL_CODE_LIMIT - 1} distinct channels")
+            self._channel_names.append(channel)
+            self._channel_lookup[channel] = code
+        return code
+
+    def _lookup(self):
+        # {สตริง: รหัส} สร้างเมื่อ intern ครั้งแรกหลังโหลดคอลัมน์ (None = ยังไม่สร้าง): การอ่านใช้แค่ตารางสตริง
+        if self._string_lookup is None:
+            lookup = dict(zip(self._strings, range(len(self._strings))))
+            lookup.pop(None, None)
+            self._string_lookup = lookup
+        return self._string_lookup
+
+    def _intern(self, value):
+        if value is None:
+            return _NO_CODE
+        code = self._lookup().get(value)
+        if code is None:
+            if self._free_strings:
+                code = self._free_strings.pop()
+                self._strings[code] = value
+            else:
+                code = len(self._strings)
+                self._strings.append(value)
+                self._string_refs.append(0)
+            self._string_lookup[value] = code
+            self._string_bytes += sys.getsizeof(value)
+        self._string_refs[code] += 1
+        return code
+
+    def _release(self, code):
+        if code == _NO_CODE:
+            return
+        self._string_refs[code] -= 1
+        if not self._string_refs[code]:
+            value = self._strings[code]
+            if self._string_lookup is not None:
+                del self._string_lookup[value]
+            self._strings[code] = None
+            self._free_strings.append(code)
+            self._string_bytes -= sys.getsizeof(value)
+
+    def _intern_many(self, values):
+        # intern ทั้งคอลัมน์ในครั้งเดียว: นับจำนวนครั้งที่ใช้ของแต่ละสตริง สตริงใหม่ได้รหัสต่อท้ายตารางเป็นช่วงเดียว
+        lookup = self._lookup()
+        refs = self._string_refs
+        counts = collections.Counter(values)
+        counts.pop(None, None)
+        new = [value for value in counts if value not in lookup]
+        if len(new) < len(counts):
+            for value in counts.keys() & lookup.keys():
+                refs[lookup[value]] += counts[value]
+        self._string_bytes += sum(map(sys.getsizeof, new))
+        while new and self._free_strings:
+            value = new.pop()
+            code = self._free_strings.pop()
+            self._strings[code] = value
+            lookup[value] = code
+            refs[code] = counts[value]
+        start = len(self._strings)
+        self._strings += new
+        refs += map(counts.__getitem__, new)
+        lookup.update(zip(new, range(start, start + len(new))))
+        return array("I", map(lookup.get, values, itertools.repeat(_NO_CODE)))
+
+    def _encode(self, room, record):
+        return room, self._channel_code(record.channel), self._intern(record.guest_info), self._intern(record.manual_channel)
+
+    def _index(self, room, record):
+        if self._by_channel is not None:
+            _post_channels(self._by_channel, self._by_manual_channel, room, record)
+        if self._by_token is not None:
+            self._index_tokens(room, record)
+
+    def _unindex(self, room, record):
+        if self._by_channel is not None:
+            _unpost(self._by_channel, record.channel, room)
+            if record.manual_channel is not None:
+                _unpost(self._by_manual_channel, record.manual_channel, room)
+        if self._by_token is not None:
+            for token in guest_tokens(record.guest_info):
+                if _unpost_token(self._by_token, token, room):
+                    del self._token_list[bisect.bisect_left(self._token_list, token)]
+
+    def _build_channel_index(self):
+        with _INDEX_LOCK:
+            if self._by_channel is not None:
+                return
+            by_channel, by_manual_channel = {}, {}
+            for room, record in self.items():
+                _post_channels(by_channel, by_manual_channel, room, record)
+            self._by_manual_channel = by_manual_channel
+            self._by_channel = by_channel
+
+    def _index_tokens(self, room, record):
+        for token in guest_tokens(record.guest_info):
+            if _post_token(self._by_token, token, room):
+                bisect.insort(self._token_list, token)
+
+    def _build_token_index(self):
+        # สร้างใน dict ใหม่แล้วค่อยผูก ผู้อ่านคนอื่นจึงไม่เห็นดัชนีที่สร้างไม่ครบ
+        with _INDEX_LOCK:
+            if self._by_token is not None:
+                return
+            by_token = {}
+            for room, record in self.items():
+                for token in guest_tokens(record.guest_info):
+                    _post_token(by_token, token, room)
+            self._token_list = sorted(by_token)
+            self._by_token = by_token
+
+    def _record(self, index):
+        strings = self._strings
+        return GuestRecord(self._channel_names[self._channel_codes[index]], strings[self._info_codes[index]],
+                           strings[self._manual_codes[index]])
+
+    def _position(self, key):
+        # ตำแหน่งในคอลัมน์ของห้องที่ยังอยู่ หรือ -1 (ห้องที่ถูกเพิ่มซ้ำจะอยู่หน้า tombstone ของ key เดียวกันเสมอ)
+        keys = self._keys
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key and self._channel_codes[index]:
+            return index
+        return -1
+
+    def __len__(self):
+        return self._live + len(self._boxed)
+
+    def __contains__(self, room):
+        if room in self._boxed:
+            return True
+        key = _array_key(room)
+        return key is not None and self._position(key) >= 0
+
+    def intersection(self, rooms):
+        # เซตของห้องใน rooms (set) ที่มีอยู่ในที่เก็บ: ชุดใหญ่เทียบกับคอลัมน์ทั้งคอลัมน์ในครั้งเดียวแทนการ bisect ทีละห้อง
+        if len(rooms) * 16 < self._live:
+            return {room for room in rooms if room in self}
+        found = rooms.intersection(itertools.compress(self._keys, self._channel_codes))
+        found.update(rooms.intersection(self._boxed))
+        return found
+
+    def __getitem__(self, room):
+        record = self._boxed.get(room)
+        if record is not None:
+            return record
+        key = _array_key(room)
+        index = -1 if key is None else self._position(key)
+        if index < 0:
+            raise KeyError(room)
+        return self._record(index)
+
+    def get(self, room, default=None):
+        try:
+            return self[room]
+        except KeyError:
+            return default
+
+    def __setitem__(self, room, info):
+        record = GuestRecord.of(info)
+        if room in self._boxed:
+            self._unindex(room, self._boxed[room])
+            self._index(room, record)
+            self._boxed[room] = record
+            return
+        key = _array_key(room)
+        index = -1 if key is None else self._position(key)
+        if index >= 0:
+            # แก้ไขในคอลัมน์โดยตรง
+            self._unindex(room, self._record(index))
+            self._index(room, record)
+            self._release(self._info_codes[index])
+            self._release(self._manual_codes[index])
+            _, self._channel_codes[index], self._info_codes[index], self._manual_codes[index] = self._encode(key, record)
+            return
+        self._index(room, record)
+        self._boxed[room] = record
+        self._boxed_index.add(room)
+        if type(room) is int and key is not None:
+            self._pending += 1
+            if self._pending > max(MIN_PENDING, self._live // PENDING_RATIO):
+                self._merge()
+
+    def pop(self, room, *default):
+        record = self._boxed.pop(room, None)
+        if record is not None:
+            self._boxed_index.discard(room)
+            self._unindex(room, record)
+            if _array_key(room) is not None and type(room) is int:
+                self._pending -= 1
+            return record
+        key = _array_key(room)
+        index = -1 if key is None else self._position(key)
+        if index < 0:
+            if default:
+                return default[0]
+            raise KeyError(room)
+        record = self._record(index)
+        self._unindex(room, record)
+        # ทำเครื่องหมาย tombstone แล้วค่อยบีบคอลัมน์ทิ้งเมื่อ tombstone มากเกินไป
+        self._channel_codes[index] = _NO_CODE
+        self._release(self._info_codes[index])
+        self._release(self._manual_codes[index])
+        self._info_codes[index] = self._manual_codes[index] = _NO_CODE
+        self._live -= 1
+        if len(self._keys) - self._live > max(MIN_PENDING, self._live):
+            self._merge()
+        return record
+
+    def __delitem__(self, room):
+        self.pop(room)
+
+    def update_many(self, items):
+        # เพิ่มหลายห้องแล้วรวมเข้าคอลัมน์ครั้งเดียว (ห้องที่มีอยู่แล้วถูกเขียนทับ)
+        added = []
+        # ห้องที่มากกว่า key สุดท้ายของคอลัมน์ (กรณีปกติของการเพิ่มแบบ bulk) ไม่ต้อง bisect
+        last = self._keys[-1] if self._keys else -1
+        for room, info in items:
+            record = GuestRecord.of(info)
+            if (type(room) is not int or not 0 <= room < _KEY_LIMIT or room in self._boxed
+                    or (room <= last and self._position(room) >= 0)):
+                self[room] = record
+                continue
+            self._boxed[room] = record
+            self._index(room, record)
+            added.append(room)
+        self._pending += len(added)
+        if self._pending > MIN_PENDING:
+            self._merge()
+        else:
+            self._boxed_index.add_many(added)
+
+    def _merge(self):
+        # รวมห้องใน buffer เข้าคอลัมน์และทิ้ง tombstone
+        incoming = sorted(((room, record) for room, record in self._boxed.items() if type(room) is int and room < _KEY_LIMIT and room >= 0),
+                          key=_first)
+        for room, _ in incoming:
+            del self._boxed[room]
+        self._boxed_index = SortedRoomIndex(self._boxed)
+        self._pending = 0
+        records = [record for _, record in incoming]
+        self._merge_columns(array("Q", [room for room, _ in incoming]), self._channel_codes_of([record.channel for record in records]),
+                            self._intern_many([record.guest_info for record in records]),
+                            self._intern_many([record.manual_channel for record in records]))
+
+    def _channel_codes_of(self, channels):
+        codes = {channel: self._channel_code(channel) for channel in dict.fromkeys(channels)}
+        return array("H", map(codes.__getitem__, channels))
+
+    def _merge_columns(self, add_keys, add_channels, add_infos, add_manuals):
+        # รวมคอลัมน์ของห้องใหม่ (เรียงตาม key แล้ว และไม่ซ้ำกับห้องที่ยังอยู่) เข้าคอลัมน์หลัก
+        # ถ้าห้องใหม่มีน้อยจะคัดลอกคอลัมน์เดิมเป็นช่วงๆ แทรกห้องใหม่ระหว่างช่วง ไม่อย่างนั้นสร้างคอลัมน์ใหม่ทั้งหมด
+        keys, channels, infos, manuals = self._keys, self._channel_codes, self._info_codes, self._manual_codes
+        dead = len(keys) - self._live
+        if dead * 4 <= len(keys) and add_keys and (not keys or add_keys[0] > keys[-1]):
+            # ห้องใหม่อยู่หลังคอลัมน์เดิมทั้งหมด (เช่นโหลดครั้งแรก) ต่อท้ายได้เลย
+            # สร้าง array ใหม่เสมอ: iterator ที่ยังอ่านคอลัมน์เดิมผ่าน memoryview อยู่จะไม่ถูกกระทบ
+            self._keys, self._channel_codes, self._info_codes, self._manual_codes = (
+                keys + add_keys, channels + add_channels, infos + add_infos, manuals + add_manuals)
+        elif dead * 4 > len(keys) or len(add_keys) * 8 > len(keys):
+            mask = channels
+            columns = [array(column.typecode, itertools.compress(column, mask)) for column in (keys, channels, infos, manuals)]
+            for column, added in zip(columns, (add_keys, add_channels, add_infos, add_manuals)):
+                column += added
+            # timsort รวมสอง run ที่เรียงแล้วได้ในเวลาเชิงเส้น ลำดับที่ได้ใช้จัดทุกคอลัมน์
+            order = sorted(range(len(columns[0])), key=columns[0].__getitem__)
+            self._keys, self._channel_codes, self._info_codes, self._manual_codes = (
+                array(column.typecode, map(column.__getitem__, order)) for column in columns)
+        else:
+            new_keys, new_channels, new_infos, new_manuals = array("Q"), array("H"), array("I"), array("I")
+            previous = 0
+            for key, channel, info, manual in zip(add_keys, add_channels, add_infos, add_manuals):
+                position = bisect.bisect_left(keys, key)
+                new_keys += keys[previous:position]
+                new_channels += channels[previous:position]
+                new_infos += infos[previous:position]
+                new_manuals += manuals[previous:position]
+                new_keys.append(key)
+                new_channels.append(channel)
+                new_infos.append(info)
+                new_manuals.append(manual)
+                previous = position
+            new_keys += keys[previous:]
+            new_channels += channels[previous:]
+            new_infos += infos[previous:]
+            new_manuals += manuals[previous:]
+            self._keys, self._channel_codes, self._info_codes, self._manual_codes = new_keys, new_channels, new_infos, new_manuals
+        self._live = len(self._keys) - self._channel_codes.count(_NO_CODE)
+
+    def insert_many(self, rooms, channel, guest_infos, manual_channels):
+        # เพิ่มห้องใหม่ของ channel เดียวกันทั้งชุดจากคอลัมน์ (ผู้เรียกตรวจแล้วว่าไม่ซ้ำกันและยังไม่มีห้องใดอยู่ในที่เก็บ)
+        # intern สตริงและรวมเข้าคอลัมน์ครั้งเดียว ไม่ผ่าน buffer และ GuestRecord ทีละห้อง
+        rooms = list(rooms)
+        if not rooms:
+            return
+        if set(map(type, rooms)) != {int} or min(rooms) < 0 or max(rooms) >= _KEY_LIMIT:
+            self.update_many(zip(rooms, map(GuestRecord, itertools.repeat(channel), guest_infos, manual_channels)))
+            return
+        order = sorted(range(len(rooms)), key=rooms.__getitem__)
+        keys = array("Q", map(rooms.__getitem__, order))
+        guest_infos, manual_channels = (list(map(column.__getitem__, order)) for column in (guest_infos, manual_channels))
+        if self._by_channel is not None or self._by_token is not None:
+            for room, record in zip(keys, map(GuestRecord, itertools.repeat(channel), guest_infos, manual_channels)):
+                self._index(room, record)
+        self._merge_columns(keys, array("H", [self._channel_code(channel)]) * len(keys), self._intern_many(guest_infos),
+                            self._intern_many(manual_channels))
+
+    def _load_sorted(self, items):
+        # สร้างคอลัมน์ใหม่จากรายการ (room, GuestRecord) ที่เรียงแล้ว
+        keys, channels, infos, manuals = array("Q"), array("H"), array("I"), array("I")
+        for room, record in items:
+            self._index(room, record)
+            if type(room) is int and 0 <= room < _KEY_LIMIT:
+                _, channel, info, manual = self._encode(room, record)
+                keys.append(room)
+                channels.append(channel)
+                infos.append(info)
+                manuals.append(manual)
+            else:
+                self._boxed[room] = record
+                self._boxed_index.add(room)
+        self._keys, self._channel_codes, self._info_codes, self._manual_codes = keys, channels, infos, manuals
+        self._live = len(keys)
+
+    def columns(self):
+        # สถานะสำหรับเขียน snapshot: คอลัมน์ (keys, channel_codes, info_codes, manual_codes) ที่ไม่มี tombstone,
+        # ตารางชื่อ channel, ตารางสตริง (ช่องว่างเป็น None) และห้องที่ไม่ใช่ int 64 บิตเป็นรายการ (room, GuestRecord) ที่เรียงแล้ว
+        if self._pending:
+            self._merge()
+        columns = (self._keys, self._channel_codes, self._info_codes, self._manual_codes)
+        if self._live < len(self._keys):
+            columns = tuple(array(column.typecode, itertools.compress(column, self._channel_codes)) for column in columns)
+        return columns, self._channel_names, self._strings, [(room, self._boxed[room]) for room in self._boxed_index]
+
+    @classmethod
+    def from_columns(cls, columns, channel_names, strings):
+        # สร้างจากคอลัมน์ที่เรียงแล้วและไม่มี tombstone (เช่นอ่านจาก snapshot) โดยไม่สร้าง GuestRecord ทีละห้อง
+        # ตัวนับการอ้างอิงของสตริงนับจากคอลัมน์รหัส ช่องของตารางที่ไม่มีห้องใช้กลายเป็นช่องว่างให้ใช้ใหม่
+        store = cls()
+        store._keys, store._channel_codes, store._info_codes, store._manual_codes = columns
+        store._live = len(store._keys)
+        store._channel_names = list(channel_names)
+        store._channel_lookup = {name: code for code, name in enumerate(channel_names) if code}
+        refs = [0] * len(strings)
+        for codes in (store._info_codes, store._manual_codes):
+            for code, count in collections.Counter(codes).items():
+                refs[code] += count
+        refs[_NO_CODE] = 0
+        store._strings = [value if count else None for value, count in zip(strings, refs)]
+        store._string_refs = refs
+        store._free_strings = [code for code in range(1, len(refs)) if not refs[code]]
+        store._string_lookup = None
+        store._string_bytes = sum(map(sys.getsizeof, store._strings)) - store._strings.count(None) * sys.getsizeof(None)
+        return store
+
+    def relocated(self, relocate):
+        # สำเนาที่ทุก key ถูกแปลงด้วยฟังก์ชันเพิ่ม relocate (ลำดับเดิมจึงยังเรียงอยู่)
+        store = GuestStore()
+        store._load_sorted((relocate(room), record) for room, record in self.items())
+        return store
+
+    def with_channel(self, channel):
+        # ห้องของ channel (รวม "Manual") เป็น RoomPostings ที่เรียงแล้ว
+        if self._by_channel is None:
+            self._build_channel_index()
+        return self._by_channel.get(channel) or _EMPTY_POSTINGS
+
+    def with_manual_channel(self, manual_channel):
+        if self._by_channel is None:
+            self._build_channel_index()
+        return self._by_manual_channel.get(manual_channel) or _EMPTY_POSTINGS
+
+    def channel_rooms(self, channel, lo=None):
+        # ห้องของ channel เรียงจากน้อยไปมากโดยสแกนคอลัมน์รหัส channel (ไม่สร้างดัชนีรอง)
+        # channel ที่ยังไม่มีรหัส (ห้องทั้งหมดยังอยู่ใน buffer) ใช้ -1 ซึ่งไม่ตรงกับรหัสใดในคอลัมน์
+        code = self._channel_lookup.get(channel, -1)
+        start = 0 if lo is None else bisect.bisect_left(self._keys, lo)
+        column = itertools.compress(memoryview(self._keys)[start:], map(code.__eq__, memoryview(self._channel_codes)[start:]))
+        if not self._boxed:
+            return column
+        boxed = (room for room in self._boxed_index.irange(lo) if self._boxed[room].channel == channel)
+        return heapq.merge(column, boxed)
+
+    def count_channel(self, channel):
+        code = self._channel_lookup.get(channel, -1)
+        return self._channel_codes.count(code) + sum(1 for record in self._boxed.values() if record.channel == channel)
+
+    def token_postings(self, prefix):
+        # RoomPostings ของทุกคำที่ขึ้นต้นด้วย prefix (ห้องหนึ่งอาจอยู่ในหลายรายการ)
+        if self._by_token is None:
+            self._build_token_index()
+        tokens = self._token_list
+        index = bisect.bisect_left(tokens, prefix)
+        postings = []
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            token_rooms = self._by_token[tokens[index]]
+            postings.append(token_rooms if isinstance(token_rooms, RoomPostings) else RoomPostings([token_rooms]))
+            index += 1
+        return postings
+
+    def last(self):
+        # ห้องที่มากที่สุด (ข้าม tombstone ท้ายคอลัมน์)
+        index = len(self._keys) - 1
+        while index >= 0 and not self._channel_codes[index]:
+            index -= 1
+        candidates = [self._keys[index]] if index >= 0 else []
+        if self._boxed:
+            candidates.append(max(self._boxed))
+        return max(candidates)
+
+    def _column_keys(self, start=0):
+        return itertools.compress(memoryview(self._keys)[start:], memoryview(self._channel_codes)[start:])
+
+    def irange(self, lo=None):
+        # ห้องเรียงจากน้อยไปมากที่ไม่น้อยกว่า lo
+        start = 0 if lo is None else bisect.bisect_left(self._keys, lo)
+        column = self._column_keys(start)
+        if not self._boxed:
+            return column
+        return heapq.merge(column, self._boxed_index.irange(lo))
+
+    def __iter__(self):
+        return self.irange()
+
+    def keys(self):
+        return self.irange()
+
+    def items(self, lo=None):
+        start = 0 if lo is None else bisect.bisect_left(self._keys, lo)
+        column = zip(self._column_keys(start), map(self._record, itertools.compress(itertools.count(start), memoryview(self._channel_codes)[start:])))
+        if not self._boxed:
+            return column
+        boxed = ((room, self._boxed[room]) for room in self._boxed_index.irange(lo))
+        return heapq.merge(column, boxed, key=_first)
+
+    def values(self):
+        return (record for _, record in self.items())
+
+    def count_range(self, lo, hi, channel=None):
+        # จำนวนห้องใน [lo, hi] (เฉพาะ channel ถ้าระบุ): นับรหัสในช่วงของคอลัมน์ (tombstone หรือรหัส channel)
+        # ถ้ามีดัชนีรองของ channel อยู่แล้วใช้ bisect บนดัชนีนั้นแทน
+        if hi < lo:
+            return 0
+        if channel is not None and self._by_channel is not None:
+            postings = self._by_channel.get(channel)
+            return postings.count_range(lo, hi) if postings else 0
+        first = bisect.bisect_left(self._keys, lo)
+        last = bisect.bisect_right(self._keys, hi)
+        codes = self._channel_codes[first:last]
+        if channel is None:
+            count = (last - first) - codes.count(_NO_CODE)
+        else:
+            count = codes.count(self._channel_lookup.get(channel, -1))
+        if self._boxed:
+            for room in self._boxed_index.irange(lo):
+                if room > hi:
+                    break
+                if channel is None or self._boxed[room].channel == channel:
+                    count += 1
+        return count
+
+    def memory_breakdown(self):
+        indexes = (self._by_channel or {}, self._by_manual_channel or {}, self._by_token or {})
+        boxed_keys = sum(sys.getsizeof(room) for room in self._boxed)
+        boxed_records = sum(sys.getsizeof(record) for record in self._boxed.values())
+        return {
+            "room_keys": sys.getsizeof(self._keys) + boxed_keys + sys.getsizeof(self._boxed_index),
+            "room_payloads": (sys.getsizeof(self._channel_codes) + sys.getsizeof(self._info_codes) + sys.getsizeof(self._manual_codes)
+                              + sys.getsizeof(self._boxed) + boxed_records),
+            "room_strings": (sys.getsizeof(self._strings) + sys.getsizeof(self._string_lookup or {}) + sys.getsizeof(self._string_refs)
+                             + self._string_bytes),
+            "room_indexes": (sum(sys.getsizeof(index) + sum(map(sys.getsizeof, index.values())) for index in indexes)
+                             + sys.getsizeof(self._token_list) + sum(map(sys.getsizeof, self._token_list))),
+        }
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sum(self.memory_breakdown().values())
+
+
+def _first(item):
+    return item[0]
+
+
+def _post(index, value, room):
+    # เพิ่มห้องในรายการของ value คืนค่า True ถ้าเพิ่งสร้างรายการใหม่
+    postings = index.get(value)
+    if postings is None:
+        index[value] = RoomPostings([room])
+        return True
+    postings.add(room)
+    return False
+
+
+def _post_channels(by_channel, by_manual_channel, room, record):
+    _post(by_channel, record.channel, room)
+    if record.manual_channel is not None:
+        _post(by_manual_channel, record.manual_channel, room)
+
+
+def _post_token(by_token, token, room):
+    # เหมือน _post แต่คำที่มีห้องเดียวเก็บเป็นหมายเลขห้อง (คำส่วนใหญ่ของ guest_info ที่ไม่ซ้ำกันมีห้องเดียว)
+    postings = by_token.get(token)
+    if postings is None:
+        by_token[token] = room
+        return True
+    if isinstance(postings, RoomPostings):
+        postings.add(room)
+    else:
+        by_token[token] = RoomPostings([postings, room])
+    return False
+
+
+def _unpost_token(by_token, token, room):
+    # คืนค่า True ถ้าคำไม่มีห้องเหลือและถูกลบทิ้ง คำที่เหลือห้องเดียวกลับไปเก็บเป็นหมายเลขห้อง
+    postings = by_token[token]
+    if not isinstance(postings, RoomPostings):
+        del by_token[token]
+        return True
+    postings.discard(room)
+    if len(postings) == 1:
+        by_token[token] = next(iter(postings))
+    return False
+
+
+def _unpost(index, value, room):
+    # ลบห้องออกจากรายการของ value คืนค่า True ถ้ารายการว่างและถูกลบทิ้ง
+    postings = index[value]
+    postings.discard(room)
+    if not postings:
+        del index[value]
+        return True
+    return False
+
+
+_EMPTY_POSTINGS = RoomPostings()
+# ผู้อ่านหลายเธรดอาจค้นแบบกรองครั้งแรกพร้อมกัน จึงสร้างดัชนีรองภายใต้ lock ร่วมกันตัวเดียว (เหมือน RoomPostings)
+_INDEX_LOCK = threading.Lock()
@@ -2,109 +2,332 @@ import sys
 import csv
 import math
 import time as time_module
-import os 
-#import heapq
-import tempfile
 import io
+import functools
+import types
+import heapq
+import itertools
+import bisect
+from prime_powers import prime_after, prime_power_exponent
+from room_id import RoomId, ceil_log, floor_log, parse_room, room_count
+from room_index import IntervalSet, SortedRoomIndex
+from guest_store import GuestRecord, GuestStore, guest_tokens
+from memory_profile import deep_sizeof, sampled_size, traced_size
+from metrics import Metrics
+from result_cache import ResultCache
+from snapshot import read_snapshot, write_snapshot
+from journal import encode_arguments, open_hotel
+SMALL_POWER_LIMIT = 1 << 64
+IDENTITY_TRANSFORM = (1, 0)
+DEFAULT_STATUS_PAGE_SIZE = 50
+DEFAULT_QUERY_LIMIT = 100
+DEFAULT_CHANNELS = ("Original", "Bus", "Train", "Plane", "Ship")
+# ช่องทางเริ่มต้นมีรหัสยานพาหนะเป็นเวกเตอร์ 5 ตำแหน่ง (no_1_2_1_1_1 = Bus) ช่องทางที่ลงทะเบียนภายหลังใช้ลำดับของช่องทางแทน
+VEHICLE_SLOTS = len(DEFAULT_CHANNELS)
+DEFAULT_VEHICLE_LABEL = "no_" + "_".join(["1"] * VEHICLE_SLOTS)
+
+
+def _journal_value(value):
+    if isinstance(value, (str, bytes, list, tuple, dict, RoomId)) or not hasattr(value, "__iter__") or hasattr(value, "tolist"):
+        return value
+    return list(value)
+
+
+def _scaled_size(sample, total_count):
+    # ขนาดรวมโดยประมาณของสมาชิก total_count ตัวจากขนาดเฉลี่ยของตัวอย่าง
+    return sum(map(sys.getsizeof, sample)) * total_count // len(sample) if sample else 0
+
+
+def _query_room(entry):
+    return entry[0]
+
+
+def _words_match(tokens, words):
+    # ทุกคำค้นเป็นคำขึ้นต้นของบางคำใน tokens
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def _numbers_with_prefix(prefix, first, last):
+    # จำนวนเต็มใน [first, last] ที่เขียนเป็นเลขฐานสิบขึ้นต้นด้วย prefix เรียงจากน้อยไปมาก: p, p0-p9, p00-p99, ...
+    if not (prefix.isascii() and prefix.isdigit()) or prefix[0] == "0":
+        return
+    low = high = int(prefix)
+    while low <= last:
+        yield from range(max(low, first), min(high, last) + 1)
+        low, high = low * 10, high * 10 + 9
+
+
 class Hilberts:
-    def __init__(self):
-        self.channels = {
-            "Original": 2,
-            "Bus": 3,
-            "Train": 5,
-            "Plane": 7,
-            "Ship": 11
-        }
-        # Stores all rooms: {room_number: {"channel": channel, "guest_info": info}}
-        self.rooms = {}  
-        self.guests_per_channel = {channel: 0 for channel in self.channels}
-        self.function_times = {}
+    def __init__(self, compact_room_ids=False, verbose=True):
+        # Registered channels {name: base}; bases are consecutive primes in registration order (defaults get 2, 3, 5, 7, 11)
+        self.channels = {}
+        self._channel_by_base = {}
+        self._channel_labels = {}
+        # ผลคูณของทุกฐาน: ห้องขนาดใหญ่ที่เป็น base ** k มี gcd กับผลคูณนี้เท่ากับ base พอดี
+        self._channel_product = 1
+        # ฐานของช่องทางที่มีแขกแล้วเรียงจากน้อยไปมาก งานรายช่องทางวนเฉพาะช่องทางเหล่านี้
+        self._active_bases = []
+        # Stores materialized rooms only (manual rooms and guests moved out of their channel room):
+        # {room_number: GuestRecord(channel, guest_info)} kept as sorted columns, so it is also the materialized room index
+        self.rooms = GuestStore()
+        # Channel guests are implicit: channel c occupies rooms base ** 1 .. base ** guests_per_channel[c]
+        self.guests_per_channel = {}
+        # Exponents whose channel guest has moved away (sparse exceptions to the ranges above)
+        self.vacated_exponents = {}
+        self.vacated_index = {}
+        # Exponents (up to guests_per_channel) whose channel room is in removed_rooms while its guest is still there
+        self.removed_powers = {}
+        # Materialized rooms that sit on a channel's power sequence: {channel: {exponent: room}}
+        self.materialized_powers = {}
+        self.initial_guests = 0
+        self.metrics = Metrics()
         self.highest_occupied_room = 0
-        self.removed_rooms = set()
+        # ห้องที่ถูกลบเก็บเป็นช่วงต่อเนื่อง: ลบทั้งชั้น (หลายพันห้องติดกัน) ใช้หน่วยความจำเท่าช่วงเดียว
+        self.removed_rooms = IntervalSet()
+        # Free-space index: runs of rooms that are materialized or removed (channel rooms are checked by decoding)
+        self.blocked_rooms = IntervalSet()
         self.large_input_threshold = 10**6
         self.extreme_input_threshold = 10**12
+        # เก็บหมายเลขห้องของช่องทางเป็น RoomId(base, exponent) แทนจำนวนเต็มขนาดใหญ่
+        self.compact_room_ids = compact_room_ids
+        self.decode_cache_size = 4096
+        self._decode_channel_room = functools.lru_cache(maxsize=self.decode_cache_size)(self.decode_room)
+        # ตารางเลขยกกำลังของทุกช่องทางที่น้อยกว่า 2**64: ถอดรหัสห้องขนาดปกติได้ด้วยการค้น dict ครั้งเดียว
+        self._small_powers = {}
+        # verbose=False ปิดข้อความ log ของเมธอด (ใช้ตอนรันสคริปต์หรือ replay จำนวนมาก)
+        self.verbose = verbose
+        # journal แบบ append-only (ตั้งค่าโดย open_durable) บันทึกทุกการเรียกเมธอดที่แก้ไขสถานะ
+        self.journal = None
+        # การย้ายแขกทั้งโรงแรมแบบ lazy: ห้อง n -> multiplier * n + offset
+        # relocations คือ stack ของ transform ที่ยังไม่ถูกนำไปใช้ ส่วน _pending_relocation คือผลประกอบของทั้ง stack
+        self.relocations = []
+        self._pending_relocation = None
+        # transform ที่นำไปใช้แล้วกับช่องทาง: แขกคนที่ k ของช่องทางอยู่ห้อง multiplier * base ** k + offset
+        self.channel_transform = IDENTITY_TRANSFORM
+        # ระหว่างการแก้ไขแบบ bulk: {room: (เคย materialized, เคยถูกลบ)} เพื่อปรับ blocked_rooms ครั้งเดียวตอนจบ batch
+        self._batch = None
+        # version เพิ่มขึ้นทุกครั้งที่มีการแก้ไข ผลลัพธ์การอ่านที่แคชไว้ผูกกับ version ที่คำนวณ
+        self.version = 0
+        self.result_cache = ResultCache()
+        for channel in DEFAULT_CHANNELS:
+            self._add_channel(channel, self._next_channel_base())
 
     def track_time(func):
         def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.enabled:
+                return func(self, *args, **kwargs)
+            frame = metrics.enter()
             start_time = time_module.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                metrics.exit(func.__name__, frame, time_module.perf_counter() - start_time)
+        wrapper.__name__ = func.__name__
+        wrapper.untracked = func
+        return wrapper
+
+    def journaled(func):
+        # บันทึกการเรียกลง journal หลังเมธอดทำงานเสร็จ (replay ให้ผลเหมือนเดิมเพราะทุกเมธอดเป็น deterministic)
+        # แล้วคืนค่าเมื่อ record ถึงดิสก์ตามโหมด durability ของ journal
+        def wrapper(self, *args, **kwargs):
+            self.version += 1
+            journal = self.journal
+            if journal is None:
+                return func(self, *args, **kwargs)
+            # iterable อื่น (iterator, range, set) เก็บเป็น list ก่อน: iterator ใช้ได้ครั้งเดียวและ journal บันทึกได้เฉพาะ list
+            args = tuple(_journal_value(arg) for arg in args)
+            # encode ก่อนเรียกเมธอด ถ้าบันทึกไม่ได้จะไม่มีการแก้ไขสถานะที่ไม่อยู่ใน journal
+            arguments = encode_arguments(args, kwargs)
             result = func(self, *args, **kwargs)
-            end_time = time_module.perf_counter()
-            execution_time = end_time - start_time
-            self.function_times[func.__name__] = self.function_times.get(func.__name__, 0) + execution_time
+            sequence = journal.append(func.__name__, arguments)
+            journal.acknowledge(sequence)
+            if journal.needs_compaction():
+                journal.compact(self)
             return result
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    def cached(func):
+        # ผลลัพธ์ของการอ่านซ้ำบนโรงแรมที่ไม่เปลี่ยนมาจาก result_cache (key = ชื่อเมธอด, args, version)
+        def wrapper(self, *args, **kwargs):
+            key = (func.__name__, args, tuple(kwargs.items()))
+            try:
+                hit, result = self.result_cache.get(key, self.version)
+            except TypeError:
+                # args ที่ hash ไม่ได้ไม่ถูกแคช
+                return func(self, *args, **kwargs)
+            if not hit:
+                result = func(self, *args, **kwargs)
+                self.result_cache.put(key, self.version, result)
+            # list ที่แคชไว้ถูกคัดลอกเพื่อไม่ให้ผู้เรียกแก้ไขค่าในแคช
+            return list(result) if isinstance(result, list) else result
+        wrapper.__name__ = func.__name__
         return wrapper
 
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+
+    def set_metrics_enabled(self, enabled):
+        # ปิด metrics แบบไม่มี overhead: ผูกเมธอดต้นฉบับไว้ที่ instance แทน wrapper
+        self.metrics.enabled = enabled
+        for name, member in vars(type(self)).items():
+            untracked = getattr(member, "untracked", None)
+            if untracked is None:
+                continue
+            if enabled:
+                self.__dict__.pop(name, None)
+            else:
+                setattr(self, name, types.MethodType(untracked, self))
+
     @track_time
+    @journaled
     def add_room_manual(self, room_number, guest_info, channel):
-        room_number = int(room_number)
+        self._apply_relocations()
+        room_number = self._room_key(room_number)
         if room_number in self.removed_rooms:
-            self.removed_rooms.remove(room_number)
-        if room_number in self.rooms:
-            suggested_rooms = self.suggest_rooms(10)
+            self._unremove(room_number)
+        if self._is_occupied(room_number):
+            suggested_rooms = self.suggest_rooms(10, near=room_number)
             return f"Error: Room {room_number} is already occupied. Suggested unoccupied rooms: {', '.join(map(str, suggested_rooms))}"
-        self.rooms[room_number] = {"channel": "Manual", "guest_info": guest_info, "manual_channel": channel}
+        self._materialize(room_number, {"channel": "Manual", "guest_info": guest_info, "manual_channel": channel})
         self.update_highest_occupied_room(room_number)
         return f"Room {room_number} added manually with guest info: {guest_info}"
 
     @track_time
+    @journaled
     def remove_room(self, room_number):
-        room_number = int(room_number)
-        print(f"Attempting to remove room {room_number}")
+        self._apply_relocations()
+        room_number = self._room_key(room_number)
 
-        if room_number in self.rooms:
-            print(f"Room {room_number} is occupied and cannot be removed.")
+        if self._is_occupied(room_number):
+            self._log(f"Room {room_number} is occupied and cannot be removed.")
             return f"Error: Room {room_number} is occupied and cannot be removed."
 
         if room_number in self.removed_rooms:
-            print(f"Room {room_number} has already been removed.")
+            self._log(f"Room {room_number} has already been removed.")
             return f"Room {room_number} has already been removed. No action needed."
 
         # ตรวจสอบว่าห้องนี้อยู่ในช่วงที่สามารถมีอยู่ได้หรือไม่
         if room_number > self.highest_occupied_room:
-            print(f"Room {room_number} is beyond the highest occupied room and doesn't need to be removed.")
+            self._log(f"Room {room_number} is beyond the highest occupied room and doesn't need to be removed.")
             return f"Room {room_number} is beyond the highest occupied room and doesn't need to be removed."
 
         # ลบห้องออกจากโครงสร้างข้อมูล
-        self.removed_rooms.add(room_number)
-        print(f"Room {room_number} has been removed from the data structure.")
+        self._mark_removed(room_number)
+        self._log(f"Room {room_number} has been removed from the data structure.")
         return f"Room {room_number} has been removed from the data structure."
+
+    def _room_range(self, lo, hi):
+        lo, hi = self._room_key(lo), self._room_key(hi)
+        if self._is_huge(lo) or self._is_huge(hi):
+            raise ValueError("Room ranges must fit in a regular integer")
+        return int(lo), int(hi)
+
+    @track_time
+    @journaled
+    def remove_range(self, lo, hi):
+        # ลบห้องว่างทั้งช่วง [lo, hi] ในครั้งเดียว (เช่นปิดทั้งชั้น) ห้องใน removed_rooms และ blocked_rooms เป็นช่วงเดียว
+        self._apply_relocations()
+        try:
+            lo, hi = self._room_range(lo, hi)
+        except ValueError as e:
+            return f"Error: Invalid room range: {e}"
+        if lo <= 0 or hi < lo:
+            return f"Error: Invalid room range {lo}-{hi}. Room numbers must be positive and lo <= hi."
+        # ห้องที่อยู่เกินห้องสูงสุดไม่ต้องลบ (เหมือน remove_room)
+        hi = min(hi, int(self.highest_occupied_room))
+        if hi < lo:
+            return f"Rooms {lo}-{hi} are beyond the highest occupied room and don't need to be removed."
+        occupied = self.count_occupied(lo, hi)
+        if occupied:
+            return f"Error: {occupied} rooms in {lo}-{hi} are occupied and cannot be removed."
+        removed = (hi - lo + 1) - self.removed_rooms.count_range(lo, hi)
+        self._mark_removed_range(lo, hi)
+        self.metrics.add_items(removed)
+        self._log(f"Removed rooms {lo}-{hi}")
+        return f"Removed {removed} rooms in {lo}-{hi} ({hi - lo + 1 - removed} already removed)"
+
+    @track_time
+    @journaled
+    def restore_range(self, lo, hi):
+        # คืนห้องที่ถูกลบในช่วง [lo, hi] ให้กลับมาเป็นห้องว่าง (แขกของช่องทางที่ยังอยู่ในห้องนั้นจะกลับมาแสดง)
+        self._apply_relocations()
+        try:
+            lo, hi = self._room_range(lo, hi)
+        except ValueError as e:
+            return f"Error: Invalid room range: {e}"
+        if lo <= 0 or hi < lo:
+            return f"Error: Invalid room range {lo}-{hi}. Room numbers must be positive and lo <= hi."
+        restored = self.removed_rooms.count_range(lo, hi)
+        if not restored:
+            return f"No removed rooms in {lo}-{hi}. No action needed."
+        for channel in self._active_channels(hi):
+            for exponent in self._channel_exponents(channel, lo, hi):
+                self.removed_powers[channel].discard(exponent)
+        # ห้องที่ถูกลบไม่เคยเป็นห้อง materialized จึงปลด blocked_rooms ได้ตรงตามช่วงที่ถูกลบ
+        for start, end in self.removed_rooms.runs(lo, hi):
+            self.blocked_rooms.remove_range(start, end)
+        self.removed_rooms.remove_range(lo, hi)
+        self.metrics.add_items(restored)
+        self._log(f"Restored rooms {lo}-{hi}")
+        return f"Restored {restored} rooms in {lo}-{hi}"
     
     @track_time
+    @journaled
     def move_guest(self, from_room, to_room):
-        print(f"Attempting to move guest from room {from_room} to room {to_room}")
-        from_room, to_room = int(from_room), int(to_room)
-        if from_room not in self.rooms:
-            print(f"Error: Room {from_room} is not occupied")
+        self._apply_relocations()
+        self._log(f"Attempting to move guest from room {from_room} to room {to_room}")
+        from_room, to_room = self._room_key(from_room), self._room_key(to_room)
+        if not self._is_occupied(from_room):
+            self._log(f"Error: Room {from_room} is not occupied")
             return f"Error: Room {from_room} is not occupied"
-        if to_room in self.rooms:
-            print(f"Error: Room {to_room} is already occupied")
+        if self._is_occupied(to_room):
+            self._log(f"Error: Room {to_room} is already occupied")
             return f"Error: Room {to_room} is already occupied"
         
-        guest_info = self.rooms.pop(from_room)
-        self.rooms[to_room] = guest_info
-        
-        # ปรับปรุง guests_per_channel ถ้าจำเป็น
-        if guest_info['channel'] != "Manual":
-            channel = guest_info['channel']
-            base = self.channels[channel]
-            old_exponent = int(math.log(from_room, base))
-            new_exponent = int(math.log(to_room, base))
-            if old_exponent != new_exponent:
-                self.guests_per_channel[channel] = max(self.guests_per_channel[channel], new_exponent)
-        
+        self._move(from_room, to_room)
         self.update_highest_occupied_room(to_room)
-        print(f"Guest successfully moved from room {from_room} to room {to_room}")
+        self._log(f"Guest successfully moved from room {from_room} to room {to_room}")
         return f"Guest successfully moved from room {from_room} to room {to_room}"
 
+    @track_time
+    @journaled
+    def hand_off_guest(self, room_number):
+        # ครึ่งแรกของการย้ายแขกไปอีกโรงแรม (เช่น shard อื่น): นำแขกออกจากห้องแล้วคืนข้อมูลแขกให้ receive_guest
+        self._apply_relocations()
+        room_number = self._room_key(room_number)
+        if not self._is_occupied(room_number):
+            return f"Error: Room {room_number} is not occupied"
+        guest = self._take_guest(room_number)
+        return guest.as_dict() if isinstance(guest, GuestRecord) else guest
+
+    @track_time
+    @journaled
+    def receive_guest(self, room_number, guest):
+        # ครึ่งหลังของการย้ายแขกจากอีกโรงแรม: guest คือ {"channel", "guest_info"[, "manual_channel"]} จาก hand_off_guest
+        self._apply_relocations()
+        room_number = self._room_key(room_number)
+        if self._is_occupied(room_number):
+            return f"Error: Room {room_number} is already occupied"
+        self._place_guest(room_number, guest)
+        self.update_highest_occupied_room(room_number)
+        return f"Guest received in room {room_number}"
+
     @track_time
     def find_room(self, room_number):
-        room_number = int(room_number)
+        room_number = self._room_key(room_number)
         if room_number <= 0:
             return f"Error: Invalid room number {room_number}. Room numbers must be positive integers."
-        if room_number in self.removed_rooms:
+        # ค้นผ่าน transform ที่ยังรออยู่: ห้องที่ไม่มีห้องเดิมใดถูกย้ายมาเป็นห้องว่าง
+        stored_room = self._unrelocate(room_number)
+        if stored_room is None:
+            return f"Room {room_number} is an empty room, any guest can reserve this room."
+        if stored_room in self.removed_rooms:
             return f"Room {room_number} has been removed."
-        if room_number in self.rooms:
-            info = self.rooms[room_number]
+        info = self._room_info(stored_room)
+        if info is not None:
             if info["channel"] == "Manual":
                 return f"Room {room_number}: Occupied by guest ---> {info['guest_info']} : {info['manual_channel']}"
             else:
@@ -112,164 +335,836 @@ class Hilberts:
         return f"Room {room_number} is an empty room, any guest can reserve this room."
 
     @track_time
+    @journaled
     def add_new_guests(self, channel, num_guests):
+        self._apply_relocations()
         try:
             num_guests = int(num_guests)
             if channel not in self.channels:
                 return f"Error: Invalid channel name {channel}"
             if num_guests <= 0:
                 return "Error: Number of guests must be positive"
-            base = self.channels[channel]
-            for _ in range(num_guests):
-                self.guests_per_channel[channel] += 1
-                room_number = base ** self.guests_per_channel[channel]
-                self.rooms[room_number] = {"channel": channel, "guest_info": f"Guest from {channel}"}
-            new_highest_room = base ** self.guests_per_channel[channel]
+            self._extend_channel(channel, self.guests_per_channel[channel] + num_guests)
+            self.metrics.add_items(num_guests)
+            new_highest_room = self._channel_room(channel, self.guests_per_channel[channel])
             self.update_highest_occupied_room(new_highest_room)
             return f"Added {num_guests} new guests to channel {channel}. Total guests in channel {channel}: {self.guests_per_channel[channel]}"
         except ValueError:
             return f"Error: Invalid input for channel {channel} or number of guests {num_guests}"
 
     @track_time
+    @journaled
+    def register_channel(self, name):
+        # เพิ่มช่องทางใหม่ ฐานคือจำนวนเฉพาะตัวถัดจากฐานล่าสุด (จากตะแกรงที่แคชไว้) แขกคนที่ k อยู่ห้อง base ** k
+        self._apply_relocations()
+        name = str(name).strip()
+        if not name or name == "Manual":
+            return f"Error: Invalid channel name {name!r}"
+        if name in self.channels:
+            return f"Error: Channel {name} is already registered with base {self.channels[name]}"
+        base = self._next_channel_base()
+        self._add_channel(name, base)
+        self._log(f"Registered channel {name} with base {base}")
+        return f"Registered channel {name} with base {base}"
+
+    @track_time
+    @journaled
     def add_initial_guests(self, num_guests):
+        self._apply_relocations()
         try:
             num_guests = int(num_guests)
             if num_guests <= 0:
                 return "Error: Number of guests must be positive"
             if self.guests_per_channel["Original"] > 0:
                 return "Error: Initial guests have already been added. Use 'Add guests to channels' to add more guests."
-            self.guests_per_channel["Original"] = num_guests
-            base = self.channels["Original"]
-            for i in range(1, num_guests + 1):
-                room_number = base ** i
-                self.rooms[room_number] = {"channel": "Original", "guest_info": f"Initial Guest {i}"}
-            new_highest_room = base ** num_guests
+            self.initial_guests = num_guests
+            self._extend_channel("Original", num_guests)
+            self.metrics.add_items(num_guests)
+            new_highest_room = self._channel_room("Original", num_guests)
             self.update_highest_occupied_room(new_highest_room)
             return f"Added {num_guests} initial guests to the Original channel"
         except ValueError:
             return "Error: Invalid number of guests"
 
+    @staticmethod
+    def _as_rows(values):
+        # รับ list, iterable หรือ NumPy array (แปลงด้วย tolist เพื่อให้ได้ int/str ของ Python)
+        return values.tolist() if hasattr(values, "tolist") else list(values)
+
+    @track_time
+    @journaled
+    def add_rooms_manual_bulk(self, rows):
+        # rows: [(room_number, guest_info, channel), ...] ตรวจสอบทั้งหมดก่อน แล้วเพิ่มทั้งชุดหรือไม่เพิ่มเลย
+        # ตรวจทั้งชุดด้วยการทำงานกับเซตครั้งเดียว (ไม่ค้นทีละห้อง) แล้วเพิ่มเป็นคอลัมน์ด้วยการรวมแบบเรียงครั้งเดียว
+        self._apply_relocations()
+        try:
+            rows = self._as_rows(rows)
+            room_numbers = [room_number if type(room_number) is int else self._room_key(room_number) for room_number, _, _ in rows]
+        except (TypeError, ValueError) as e:
+            return f"Error: Invalid bulk rows: {e}"
+        batch = set(room_numbers)
+        decodings = self._decode_rooms(batch)
+        occupied = self.rooms.intersection(batch)
+        occupied.update(room_number for room_number, decoded in decodings.items() if self._channel_slot_occupied(*decoded))
+        conflicts = [room_number for room_number in room_numbers if room_number in occupied] if occupied else []
+        if len(batch) != len(room_numbers):
+            seen = set()
+            conflicts += [room_number for room_number in room_numbers if room_number in seen or seen.add(room_number)]
+        if conflicts:
+            return f"Error: {len(conflicts)} rooms are already occupied or repeated in the batch: {', '.join(map(str, conflicts[:10]))}"
+        if self.removed_rooms:
+            # ห้องที่ถูกลบยังคงอยู่ใน blocked_rooms เพราะกลายเป็นห้อง materialized
+            unremoved = [room_number for room_number in room_numbers if room_number in self.removed_rooms]
+            for room_number in unremoved:
+                decoded = decodings.get(room_number)
+                if decoded is not None:
+                    self.removed_powers[decoded[0]].discard(decoded[1])
+            self.removed_rooms.remove_many(map(int, unremoved))
+        for room_number, (channel, exponent) in decodings.items():
+            self.materialized_powers[channel][exponent] = room_number
+        if rows:
+            self.rooms.insert_many(room_numbers, "Manual", [guest_info for _, guest_info, _ in rows], [channel for _, _, channel in rows])
+            self.blocked_rooms.add_many(map(int, room_numbers))
+            self.update_highest_occupied_room(max(room_numbers))
+        self.metrics.add_items(len(rows))
+        return f"Added {len(rows)} rooms manually"
+
+    @track_time
+    @journaled
+    def remove_rooms_bulk(self, room_numbers):
+        self._apply_relocations()
+        try:
+            room_numbers = [self._room_key(room_number) for room_number in self._as_rows(room_numbers)]
+        except (TypeError, ValueError) as e:
+            return f"Error: Invalid bulk rooms: {e}"
+        occupied = [room_number for room_number in room_numbers if self._is_occupied(room_number)]
+        if occupied:
+            return f"Error: {len(occupied)} rooms are occupied and cannot be removed: {', '.join(map(str, occupied[:10]))}"
+        # ห้องที่ถูกลบแล้วหรืออยู่เกินห้องสูงสุดไม่ต้องทำอะไร (เหมือน remove_room)
+        highest = self.highest_occupied_room
+        to_remove = [room_number for room_number in dict.fromkeys(room_numbers)
+                     if room_number not in self.removed_rooms and room_number <= highest]
+        self.removed_rooms.add_many(map(int, to_remove))
+        for room_number in to_remove:
+            decoded = self.decode_room(room_number)
+            if decoded is not None and self._channel_slot_occupied(*decoded):
+                self.removed_powers[decoded[0]].add(decoded[1])
+        self.blocked_rooms.add_many(map(int, to_remove))
+        self.metrics.add_items(len(room_numbers))
+        return f"Removed {len(to_remove)} rooms ({len(room_numbers) - len(to_remove)} already removed or beyond the highest occupied room)"
+
+    @track_time
+    @journaled
+    def move_guests_bulk(self, pairs):
+        # ย้ายตามลำดับ (a->b แล้ว b->c ได้) ตรวจสอบทั้งชุดด้วยสถานะจำลองก่อน แล้วย้ายทั้งหมดหรือไม่ย้ายเลย
+        self._apply_relocations()
+        try:
+            pairs = [(self._room_key(from_room), self._room_key(to_room)) for from_room, to_room in self._as_rows(pairs)]
+        except (TypeError, ValueError) as e:
+            return f"Error: Invalid bulk moves: {e}"
+        occupancy = {}
+        for index, (from_room, to_room) in enumerate(pairs, 1):
+            from_occupied = occupancy[from_room] if from_room in occupancy else self._is_occupied(from_room)
+            if not from_occupied:
+                return f"Error: Move {index}: Room {from_room} is not occupied"
+            to_occupied = occupancy[to_room] if to_room in occupancy else self._is_occupied(to_room)
+            if to_occupied:
+                return f"Error: Move {index}: Room {to_room} is already occupied"
+            occupancy[from_room] = False
+            occupancy[to_room] = True
+        self._batch = {}
+        try:
+            for from_room, to_room in pairs:
+                self._move(from_room, to_room)
+        finally:
+            self._finish_batch()
+        if pairs:
+            self.update_highest_occupied_room(max(to_room for _, to_room in pairs))
+        self.metrics.add_items(len(pairs))
+        return f"Moved {len(pairs)} guests"
+
+    @track_time
+    @journaled
+    def relocate(self, multiplier=1, offset=0):
+        # ย้ายแขกทุกคนจากห้อง n ไปห้อง multiplier * n + offset ในเวลา O(1) โดยเก็บเป็น transform ที่รอไว้
+        # ผังโรงแรมทั้งหมดเลื่อนไปด้วยกัน (รวมห้องที่ถูกลบ) จึงไม่มีแขกชนกัน ห้องที่ไม่มีใครถูกย้ายมาจะว่าง
+        try:
+            multiplier, offset = int(multiplier), int(offset)
+        except ValueError:
+            return "Error: Relocation multiplier and offset must be integers"
+        if multiplier < 1 or offset < 0:
+            return "Error: Relocation needs multiplier >= 1 and offset >= 0"
+        if (multiplier, offset) == IDENTITY_TRANSFORM:
+            return "Relocation n -> n leaves every guest in place"
+        self.relocations.append((multiplier, offset))
+        pending_multiplier, pending_offset = self._pending_relocation or IDENTITY_TRANSFORM
+        self._pending_relocation = (multiplier * pending_multiplier, multiplier * pending_offset + offset)
+        return f"All guests relocated from room n to room {multiplier}n + {offset} ({len(self.relocations)} pending relocations)"
+
+    @track_time
+    def compact(self):
+        count = len(self.relocations)
+        if not count:
+            return "No pending relocations"
+        self._apply_relocations()
+        return f"Applied {count} pending relocations"
+
+    def _relocate(self, room_number):
+        multiplier, offset = self._pending_relocation
+        return multiplier * int(room_number) + offset
+
+    def _unrelocate(self, room_number):
+        # หมายเลขห้องที่เก็บอยู่ซึ่งถูกย้ายมาเป็น room_number หรือ None ถ้าไม่มี
+        if self._pending_relocation is None:
+            return room_number
+        multiplier, offset = self._pending_relocation
+        stored, remainder = divmod(int(room_number) - offset, multiplier)
+        return stored if stored >= 1 and not remainder else None
+
+    def _apply_relocations(self):
+        # นำ transform ที่รออยู่ไปใช้จริง: ห้อง materialized/ห้องที่ถูกลบเปลี่ยน key (O(จำนวนห้องที่เก็บ))
+        # ส่วนช่องทางเก็บแค่ transform ที่ประกอบแล้ว เพราะแขกของช่องทางไม่ได้ถูกเก็บทีละห้อง
+        if self._pending_relocation is None:
+            return
+        multiplier, offset = self._pending_relocation
+        relocate = self._relocate
+        self.rooms = self.rooms.relocated(relocate)
+        self.removed_rooms = self.removed_rooms.transformed(multiplier, offset)
+        self.materialized_powers = {channel: {exponent: relocate(room_number) for exponent, room_number in powers.items()}
+                                    for channel, powers in self.materialized_powers.items()}
+        self.blocked_rooms = self.blocked_rooms.transformed(multiplier, offset)
+        if self.highest_occupied_room:
+            self.highest_occupied_room = relocate(self.highest_occupied_room)
+        channel_multiplier, channel_offset = self.channel_transform
+        self.channel_transform = (multiplier * channel_multiplier, multiplier * channel_offset + offset)
+        self._decode_channel_room.cache_clear()
+        self.relocations = []
+        self._pending_relocation = None
+
     def update_highest_occupied_room(self, new_room):
         self.highest_occupied_room = max(self.highest_occupied_room, new_room)
 
     def recalculate_highest_occupied_room(self):
-        self.highest_occupied_room = max(self.rooms.keys()) if self.rooms else 0
+        candidates = [self.rooms.last()] if self.rooms else []
+        for channel in self._active_channels():
+            exponent = self.guests_per_channel[channel]
+            while exponent > 0 and exponent in self.vacated_exponents[channel]:
+                exponent -= 1
+            if exponent > 0:
+                candidates.append(self._channel_room(channel, exponent))
+        self.highest_occupied_room = max(candidates) if candidates else 0
 
-    @track_time
-    def sort_rooms(self, chunk_size=1000000):
-        print(f"Sorting rooms with chunk size: {chunk_size}")
-        all_rooms = set(self.rooms.keys()) - self.removed_rooms
-        if len(all_rooms) < chunk_size:
-            print("Using regular sorting")
-            return sorted(all_rooms)
-        
-        print("Using External Sorting")
-        temp_files = []
-        
-        # แบ่งข้อมูลเป็น chunks และเรียงลำดับแต่ละ chunk
-        for i in range(0, len(all_rooms), chunk_size):
-            print(f"Processing chunk {i // chunk_size + 1}")
-            chunk = sorted(list(all_rooms)[i:i+chunk_size])
-            temp_file = tempfile.NamedTemporaryFile(delete=False, mode='w+')
-            for room in chunk:
-                temp_file.write(f"{room}\n")
-            temp_file.close()
-            temp_files.append(temp_file.name)
-        
-        print(f"Created {len(temp_files)} temporary files")
-        
-        # ใช้ k-way merge สำหรับ chunks ที่เรียงลำดับแล้ว
-        sorted_rooms = self._merge_sorted_files(temp_files)
-        
-        # ลบไฟล์ชั่วคราว
-        for file in temp_files:
-            os.unlink(file)
-        
-        print(f"Sorting complete. Total rooms sorted: {len(sorted_rooms)}")
-        return sorted_rooms
+    def _channel_guest_info(self, channel, exponent):
+        if channel == "Original" and exponent <= self.initial_guests:
+            return f"Initial Guest {exponent}"
+        return f"Guest from {channel}"
 
-    def _merge_sorted_files(self, file_list):
-        heap = []
-        sorted_rooms = []
-        open_files = []
-        
-        # เปิดทุกไฟล์และเพิ่มค่าแรกลงใน heap
-        for filename in file_list:
-            file = open(filename, 'r')
-            open_files.append(file)
-            first_line = file.readline().strip()
-            if first_line:
-                self._heap_push(heap, (int(first_line), file))
-        
-        # ทำ k-way merge
-        while heap:
-            value, file = self._heap_pop(heap)
-            sorted_rooms.append(value)
-            next_line = file.readline().strip()
-            if next_line:
-                self._heap_push(heap, (int(next_line), file))
-        
-        # ปิดไฟล์ทั้งหมด
-        for file in open_files:
-            file.close()
-        
-        return sorted_rooms
+    def decode_room(self, room_number):
+        # คืนค่า (channel, exponent) ถ้าห้องเป็นเลขยกกำลังของฐานของช่องทาง ไม่เช่นนั้นคืนค่า None
+        if self.channel_transform != IDENTITY_TRANSFORM:
+            # ถอด transform ของช่องทางออกก่อน แล้วถอดรหัสเหมือนช่องทางที่ไม่เคยถูกย้าย
+            multiplier, offset = self.channel_transform
+            room_number, remainder = divmod(int(parse_room(room_number)) - offset, multiplier)
+            if room_number < 1 or remainder:
+                return None
+        if type(room_number) is int and room_number < SMALL_POWER_LIMIT:
+            return self._small_powers.get(room_number)
+        if type(room_number) is not int:
+            room_number = parse_room(room_number)
+        if isinstance(room_number, RoomId):
+            channel = self._channel_by_base.get(room_number.base)
+            if channel is not None:
+                return (channel, room_number.exponent) if room_number.exponent > 0 else None
+            room_number = int(room_number)
+        # base ** k หารด้วยฐานของช่องทางอื่นไม่ลงตัว gcd กับผลคูณของทุกฐานจึงเป็นฐานของมันเอง (ไม่ต้องไล่ทีละช่องทาง)
+        base = math.gcd(room_number, self._channel_product)
+        channel = self._channel_by_base.get(base)
+        if channel is None:
+            return None
+        exponent = prime_power_exponent(room_number, base)
+        return None if exponent is None else (channel, exponent)
 
-    def _heap_push(self, heap, item):
-        heap.append(item)
-        self._sift_up(heap, len(heap) - 1)
+    def _decode_rooms(self, room_numbers):
+        # decode_room ของทั้งเซต คืนเฉพาะห้องของช่องทาง {ห้อง: (channel, exponent)}
+        # ห้อง int ที่เล็กกว่า SMALL_POWER_LIMIT หาได้จากการ intersect กับตาราง _small_powers ครั้งเดียว
+        decodings = {}
+        rest = room_numbers
+        if self.channel_transform == IDENTITY_TRANSFORM:
+            if set(map(type, room_numbers)) == {int} and max(room_numbers) < SMALL_POWER_LIMIT:
+                small, rest = room_numbers, ()
+            else:
+                small = {room_number for room_number in room_numbers if type(room_number) is int and room_number < SMALL_POWER_LIMIT}
+                rest = room_numbers - small
+            decodings = {room_number: self._small_powers[room_number] for room_number in self._small_powers.keys() & small}
+        for room_number in rest:
+            decoded = self.decode_room(room_number)
+            if decoded is not None:
+                decodings[room_number] = decoded
+        return decodings
+
+    def _room_key(self, room_number):
+        if type(room_number) is int:
+            return room_number
+        room_number = parse_room(room_number)
+        if isinstance(room_number, RoomId) and not self.compact_room_ids:
+            return int(room_number)
+        return room_number
+
+    def _channel_room(self, channel, exponent):
+        if self.channel_transform != IDENTITY_TRANSFORM:
+            multiplier, offset = self.channel_transform
+            return multiplier * self.channels[channel] ** exponent + offset
+        if self.compact_room_ids:
+            return RoomId(self.channels[channel], exponent)
+        return self.channels[channel] ** exponent
 
-    def _heap_pop(self, heap):
-        if not heap:
+    def _channel_guest_at(self, room_number):
+        decoded = self._decode_channel_room(room_number)
+        if decoded is None:
             return None
-        if len(heap) == 1:
-            return heap.pop()
-        min_val = heap[0]
-        heap[0] = heap.pop()
-        self._sift_down(heap, 0)
-        return min_val
-
-    def _sift_up(self, heap, i):
-        parent = (i - 1) // 2
-        while i > 0 and heap[i][0] < heap[parent][0]:
-            heap[i], heap[parent] = heap[parent], heap[i]
-            i = parent
-            parent = (i - 1) // 2
-
-    def _sift_down(self, heap, i):
-        min_index = i
-        left = 2 * i + 1
-        right = 2 * i + 2
-        if left < len(heap) and heap[left][0] < heap[min_index][0]:
-            min_index = left
-        if right < len(heap) and heap[right][0] < heap[min_index][0]:
-            min_index = right
-        if i != min_index:
-            heap[i], heap[min_index] = heap[min_index], heap[i]
-            self._sift_down(heap, min_index)
+        channel, exponent = decoded
+        if exponent > self.guests_per_channel[channel] or exponent in self.vacated_exponents[channel]:
+            return None
+        return decoded
 
-    @track_time
-    def count_empty_rooms(self):
-        if sum(self.guests_per_channel.values()) > self.extreme_input_threshold:
-            return "Infinite (too large to count)"
+    def _channel_slot_occupied(self, channel, exponent):
+        return exponent <= self.guests_per_channel[channel] and exponent not in self.vacated_exponents[channel]
+
+    def _is_occupied(self, room_number):
+        return room_number in self.rooms or self._channel_guest_at(room_number) is not None
+
+    def _room_info(self, room_number):
+        if room_number in self.rooms:
+            return self.rooms[room_number]
+        decoded = self._channel_guest_at(room_number)
+        if decoded is None:
+            return None
+        channel, exponent = decoded
+        return {"channel": channel, "guest_info": self._channel_guest_info(channel, exponent)}
+
+    def _move(self, from_room, to_room):
+        self._place_guest(to_room, self._take_guest(from_room))
+
+    def _take_guest(self, room_number):
+        if room_number in self.rooms:
+            return self._dematerialize(room_number)
+        # แขกจากช่องทาง: ทำเครื่องหมายว่าห้องเดิมว่าง แล้วคืนข้อมูลแขกเพื่อเก็บไว้ในห้องใหม่
+        channel, exponent = self._channel_guest_at(room_number)
+        self._vacate(channel, exponent)
+        return {"channel": channel, "guest_info": self._channel_guest_info(channel, exponent)}
+
+    def _place_guest(self, room_number, guest_info):
+        if room_number in self.removed_rooms:
+            self._unremove(room_number)
+        self._materialize(room_number, guest_info)
+
+    def _batch_touch(self, room_number):
+        if room_number not in self._batch:
+            self._batch[room_number] = (room_number in self.rooms, room_number in self.removed_rooms)
+
+    def _finish_batch(self):
+        # เทียบสถานะก่อน/หลังของห้องที่ถูกแก้ไข แล้วปรับ blocked_rooms ในรอบเดียว
+        touched, self._batch = self._batch, None
+        blocked, unblocked = [], []
+        for room_number, (was_materialized, was_removed) in touched.items():
+            materialized = room_number in self.rooms
+            is_blocked = materialized or room_number in self.removed_rooms
+            if is_blocked != (was_materialized or was_removed):
+                (blocked if is_blocked else unblocked).append(int(room_number))
+        self.blocked_rooms.remove_many(unblocked)
+        self.blocked_rooms.add_many(blocked)
+
+    def _mark_removed(self, room_number):
+        if self._batch is None:
+            self.blocked_rooms.add(int(room_number))
         else:
-            return max(0, self.highest_occupied_room - len(self.rooms))
+            self._batch_touch(room_number)
+        self.removed_rooms.add(int(room_number))
+        decoded = self._decode_channel_room(room_number)
+        if decoded is not None and self._channel_slot_occupied(*decoded):
+            self.removed_powers[decoded[0]].add(decoded[1])
+
+    def _mark_removed_range(self, lo, hi):
+        # เหมือน _mark_removed สำหรับทุกห้องใน [lo, hi] (ต้องไม่มีห้อง materialized อยู่ในช่วง)
+        for channel in self._active_channels(hi):
+            vacated = self.vacated_exponents[channel]
+            exponents = self._channel_exponents(channel, lo, hi)
+            for exponent in range(exponents.start, min(exponents.stop, self.guests_per_channel[channel] + 1)):
+                if exponent not in vacated and self._channel_room(channel, exponent) not in self.removed_rooms:
+                    self.removed_powers[channel].add(exponent)
+        self.removed_rooms.add_range(lo, hi)
+        self.blocked_rooms.add_range(lo, hi)
+
+    def _unremove(self, room_number):
+        if self._batch is None:
+            self.blocked_rooms.discard(int(room_number))
+        else:
+            self._batch_touch(room_number)
+        self.removed_rooms.discard(int(room_number))
+        decoded = self._decode_channel_room(room_number)
+        if decoded is not None:
+            self.removed_powers[decoded[0]].discard(decoded[1])
+
+    def _vacate(self, channel, exponent):
+        self.vacated_exponents[channel].add(exponent)
+        self.vacated_index[channel].add(exponent)
+        self.removed_powers[channel].discard(exponent)
+
+    def _materialize(self, room_number, info):
+        if room_number not in self.rooms:
+            if self._batch is None:
+                self.blocked_rooms.add(int(room_number))
+            else:
+                self._batch_touch(room_number)
+        self.rooms[room_number] = info
+        decoded = self._decode_channel_room(room_number)
+        if decoded is not None:
+            channel, exponent = decoded
+            self.materialized_powers[channel][exponent] = room_number
+
+    def _restore_rooms(self, rooms, removed_rooms, blocked_rooms):
+        # ใส่ที่เก็บห้องและเซตช่วงที่โหลดมาทั้งชุด (จาก snapshot) แล้วสร้าง removed_powers และ materialized_powers
+        # จากห้องของช่องทางในช่วงของข้อมูลแทนการ decode ทีละห้อง: ช่องทางหนึ่งมีห้องต่ำกว่า 2**64 ไม่เกิน 64 ห้อง
+        # ห้องในคอลัมน์ของ rooms เป็น int 64 บิตทั้งหมด ห้องอื่นผู้เรียกเพิ่มเองด้วย _materialize
+        self.rooms, self.removed_rooms, self.blocked_rooms = rooms, removed_rooms, blocked_rooms
+        removed_lo = next(iter(removed_rooms.runs()), (None,))[0]
+        for channel in self.channels:
+            if removed_lo is not None:
+                vacated = self.vacated_exponents[channel]
+                exponents = self._channel_exponents(channel, removed_lo, removed_rooms.last())
+                self.removed_powers[channel].add_many(
+                    exponent for exponent in range(exponents.start, min(exponents.stop, self.guests_per_channel[channel] + 1))
+                    if exponent not in vacated and self._channel_room(channel, exponent) in removed_rooms)
+            powers = self.materialized_powers[channel]
+            for exponent in self._channel_exponents(channel, 1, SMALL_POWER_LIMIT - 1):
+                room_number = self._channel_room(channel, exponent)
+                if room_number in rooms:
+                    powers[exponent] = int(room_number)
+
+    def _dematerialize(self, room_number):
+        if self._batch is None:
+            self.blocked_rooms.discard(int(room_number))
+        else:
+            self._batch_touch(room_number)
+        info = self.rooms.pop(room_number)
+        decoded = self._decode_channel_room(room_number)
+        if decoded is not None:
+            channel, exponent = decoded
+            self.materialized_powers[channel].pop(exponent, None)
+        return info
+
+    def _next_channel_base(self):
+        # ฐานถูกเพิ่มเรียงจากน้อยไปมาก ฐานล่าสุดจึงเป็น key ตัวท้ายของ dict
+        return prime_after(next(reversed(self._channel_by_base), 1))
+
+    def _add_channel(self, name, base):
+        self.channels[name] = base
+        self._channel_by_base[base] = name
+        index = len(self._channel_labels)
+        if index < VEHICLE_SLOTS:
+            vehicle_numbers = [1] * VEHICLE_SLOTS
+            vehicle_numbers[index] = index + 1
+            self._channel_labels[name] = f"no_{'_'.join(map(str, vehicle_numbers))}"
+        else:
+            self._channel_labels[name] = f"no_{index + 1}"
+        self._channel_product *= base
+        self.guests_per_channel[name] = 0
+        self.vacated_exponents[name] = set()
+        self.vacated_index[name] = SortedRoomIndex()
+        self.removed_powers[name] = SortedRoomIndex()
+        self.materialized_powers[name] = {}
+        exponent, power = 1, base
+        while power < SMALL_POWER_LIMIT:
+            self._small_powers[power] = (name, exponent)
+            exponent, power = exponent + 1, power * base
+        # ห้องที่เคยถอดรหัสไม่ได้อาจเป็นห้องของช่องทางใหม่แล้ว
+        self._decode_channel_room.cache_clear()
+        if self.rooms:
+            # ห้อง materialized ที่อยู่บนลำดับเลขยกกำลังของฐานใหม่: ห้องขนาดปกติมีไม่เกิน 64 ตำแหน่ง ส่วนห้องใหญ่มีน้อย
+            powers = self.materialized_powers[name]
+            for exponent in self._channel_exponents(name, 1, SMALL_POWER_LIMIT - 1):
+                room = self._channel_room(name, exponent)
+                if room in self.rooms:
+                    powers[exponent] = room
+            for room in self.rooms.irange(SMALL_POWER_LIMIT):
+                decoded = self._decode_channel_room(room)
+                if decoded is not None and decoded[0] == name:
+                    powers[decoded[1]] = room
+
+    def _active_channels(self, hi=None):
+        # ช่องทางที่มีแขกเรียงตามฐาน ถ้าระบุ hi จะตัดช่องทางที่ห้องแรก (base ** 1 หลัง transform) เกิน hi ออกด้วย bisect
+        bases = self._active_bases
+        if hi is not None and not self._is_huge(hi):
+            multiplier, offset = self.channel_transform
+            bases = bases[:bisect.bisect_right(bases, (int(hi) - offset) // multiplier)]
+        by_base = self._channel_by_base
+        return [by_base[base] for base in bases]
+
+    def _extend_channel(self, channel, new_count):
+        old_count = self.guests_per_channel[channel]
+        self.guests_per_channel[channel] = new_count
+        if not old_count:
+            bisect.insort(self._active_bases, self.channels[channel])
+        # ห้องที่ถูกเก็บไว้แบบ materialized ในช่วงใหม่จะถูกแขกของช่องทางเขียนทับ
+        shadowed = [exponent for exponent in self.materialized_powers[channel] if old_count < exponent <= new_count]
+        for exponent in shadowed:
+            self._dematerialize(self.materialized_powers[channel][exponent])
+        # removed_powers เก็บเฉพาะ exponent ที่มีแขกแล้ว ห้องที่ถูกลบไว้ก่อนในช่วงใหม่จึงต้องเพิ่มตอนนี้
+        # โดยตรวจเฉพาะ exponent ที่ห้องไม่เกินห้องที่ถูกลบที่มากที่สุด
+        if self.removed_rooms:
+            vacated = self.vacated_exponents[channel]
+            exponents = self._channel_exponents(channel, 1, self.removed_rooms.last())
+            for exponent in range(max(exponents.start, old_count + 1), min(exponents.stop, new_count + 1)):
+                if exponent not in vacated and self._channel_room(channel, exponent) in self.removed_rooms:
+                    self.removed_powers[channel].add(exponent)
+
+    def _iter_channel_rooms(self, channel):
+        base = self.channels[channel]
+        vacated = self.vacated_exponents[channel]
+        multiplier, offset = self.channel_transform
+        if multiplier != 1 or offset:
+            room_number = 1
+            for exponent in range(1, self.guests_per_channel[channel] + 1):
+                room_number *= base
+                if exponent not in vacated:
+                    yield multiplier * room_number + offset
+            return
+        if self.compact_room_ids:
+            for exponent in range(1, self.guests_per_channel[channel] + 1):
+                if exponent not in vacated:
+                    yield RoomId(base, exponent)
+            return
+        room_number = 1
+        for exponent in range(1, self.guests_per_channel[channel] + 1):
+            room_number *= base
+            if exponent not in vacated:
+                yield room_number
+
+    def _occupied_count(self):
+        channel_rooms = sum(self.guests_per_channel[channel] - len(self.vacated_exponents[channel]) for channel in self._active_channels())
+        return channel_rooms + len(self.rooms)
+
+    def iter_sorted_rooms(self, start=0):
+        # ห้องของแต่ละช่องทางเรียงอยู่แล้ว (base ** k) จึงใช้ k-way merge กับดัชนีห้อง materialized ได้เลย
+        sequences = [self._iter_channel_rooms(channel) for channel in self._active_channels()]
+        sequences.append(self.rooms.irange())
+        removed_rooms = self.removed_rooms
+        merged = heapq.merge(*sequences)
+        if removed_rooms:
+            merged = (room for room in merged if room not in removed_rooms)
+        if self._pending_relocation is not None:
+            # transform เป็นฟังก์ชันเพิ่ม จึงคงลำดับที่เรียงไว้
+            merged = map(self._relocate, merged)
+        return itertools.islice(merged, start, None)
+
+    @track_time
+    @cached
+    def sorted_rooms_page(self, start, count):
+        start, count = int(start), int(count)
+        page = list(itertools.islice(self.iter_sorted_rooms(start), count))
+        self.metrics.add_items(start + len(page))
+        return page
+
+    @track_time
+    def sort_rooms(self):
+        self._log("Sorting rooms")
+        # ห้องของแต่ละช่องทางและห้อง materialized (คอลัมน์ที่เรียงแล้วของ GuestStore) เป็น run ที่เรียงแล้วทั้งหมด
+        # จึงเหลือแค่การ merge แบบ streaming ไม่ต้อง spill ลงไฟล์
+        runs = [self._iter_channel_rooms(channel) for channel in self._active_channels()]
+        runs.append(self.rooms.irange())
+        merged = heapq.merge(*runs)
+        removed_rooms = self.removed_rooms
+        if removed_rooms:
+            merged = (room for room in merged if room not in removed_rooms)
+        if self._pending_relocation is not None:
+            merged = map(self._relocate, merged)
+        return merged
+
+    def _range_bounds(self, lo, hi):
+        lo = 1 if lo is None else self._room_key(lo)
+        hi = self.highest_occupied_room if hi is None else self._room_key(hi)
+        lo = max(lo, 1)
+        # RoomId ที่ยังเล็กพอแปลงเป็น int เพื่อคำนวณแบบปกติ
+        if isinstance(lo, RoomId) and not self._is_huge(lo):
+            lo = int(lo)
+        if isinstance(hi, RoomId) and not self._is_huge(hi):
+            hi = int(hi)
+        return lo, hi
+
+    def _is_huge(self, room_number):
+        return isinstance(room_number, RoomId) and room_number.log() / math.log(2) > self.large_input_threshold
+
+    def _channel_exponents(self, channel, lo, hi):
+        # ช่วงของ exponent k ที่ห้องของช่องทาง (base ** k หลัง transform) อยู่ใน [lo, hi] ไม่จำกัดด้วยจำนวนแขก
+        base = self.channels[channel]
+        if self.channel_transform != IDENTITY_TRANSFORM:
+            # แปลงช่วง [lo, hi] กลับเป็นช่วงของ base ** k ก่อน
+            multiplier, offset = self.channel_transform
+            lo = max(-(-(int(lo) - offset) // multiplier), 1)
+            hi = (int(hi) - offset) // multiplier
+            if hi < lo:
+                return range(0)
+        return range(max(ceil_log(lo, base), 1), floor_log(hi, base) + 1)
+
+    def _count_channel(self, channel, lo, hi):
+        # จำนวนห้องของช่องทางที่มีแขกอยู่ใน [lo, hi] จากช่วง exponent โดยตรง
+        exponents = self._channel_exponents(channel, lo, hi)
+        first = exponents.start
+        last = min(exponents.stop - 1, self.guests_per_channel[channel])
+        if first > last:
+            return 0
+        return (last - first + 1) - self.vacated_index[channel].count_range(first, last) - self.removed_powers[channel].count_range(first, last)
+
+    def _count_materialized(self, lo, hi, channel=None):
+        return self.rooms.count_range(lo, hi, channel)
+
+    def _count_removed(self, lo, hi):
+        if self._is_huge(hi):
+            # ดัชนีช่วงเก็บเฉพาะ int ที่เล็กกว่า hi อยู่แล้ว
+            return len(self.removed_rooms) - self.removed_rooms.rank(lo - 1) if not self._is_huge(lo) else 0
+        return self.removed_rooms.count_range(lo, hi)
+
+    @track_time
+    def count_occupied(self, lo=None, hi=None, channel=None):
+        self._apply_relocations()
+        lo, hi = self._range_bounds(lo, hi)
+        if lo > hi:
+            return 0
+        if channel is not None and channel not in self.channels and channel != "Manual":
+            return f"Error: Invalid channel name {channel}"
+        channels = self._active_channels(hi) if channel is None else [channel] if channel in self.channels else []
+        occupied = sum(self._count_channel(name, lo, hi) for name in channels)
+        return occupied + self._count_materialized(lo, hi, channel)
+
+    @track_time
+    @cached
+    def count_empty_rooms(self, lo=None, hi=None):
+        self._apply_relocations()
+        lo, hi = self._range_bounds(lo, hi)
+        if lo > hi:
+            return 0
+        occupied = self.count_occupied(lo, hi)
+        removed = self._count_removed(lo, hi)
+        # ขอบเขตที่ยังเป็น RoomId ใหญ่เกินกว่าจะสร้างเป็น int ได้ ผลจึงเป็น RoomCount (ใช้เป็นตัวเลขได้ และแสดงเป็นนิพจน์)
+        return room_count(lo, hi, occupied + removed)
+
+    def next_free(self, after=0):
+        # ข้ามช่วงห้องที่ถูกใช้/ถูกลบด้วยดัชนีช่วง ส่วนห้องของช่องทางเป็นเลขยกกำลังที่อยู่ห่างกัน จึงข้ามทีละห้อง
+        self._apply_relocations()
+        room = max(int(after), 0) + 1
+        while True:
+            room = self.blocked_rooms.next_missing(room)
+            if self._channel_guest_at(room) is None:
+                return room
+            room += 1
+
+    def previous_free(self, before):
+        self._apply_relocations()
+        room = int(before) - 1
+        while room >= 1:
+            room = self.blocked_rooms.previous_missing(room)
+            if room < 1:
+                break
+            if self._channel_guest_at(room) is None:
+                return room
+            room -= 1
+        return None
 
-    def suggest_rooms(self, count):
+    def suggest_rooms(self, count, near=None):
         count = int(count)
+        if near is None:
+            suggested = []
+            room = 0
+            while len(suggested) < count:
+                room = self.next_free(room)
+                suggested.append(room)
+            return suggested
+        # เลือกห้องว่างที่ใกล้ near ที่สุดทั้งสองฝั่ง
+        near = int(near)
+        above = self.next_free(near - 1)
+        below = self.previous_free(near)
         suggested = []
-        room = 1
         while len(suggested) < count:
-            if room not in self.rooms and room not in self.removed_rooms:
-                suggested.append(room)
-            room += 1
-        return suggested
+            if below is not None and near - below <= above - near:
+                suggested.append(below)
+                below = self.previous_free(below)
+            else:
+                suggested.append(above)
+                above = self.next_free(above)
+        return sorted(suggested)
+
+    def free_in_range(self, lo, hi):
+        # จำนวนห้องว่าง (ไม่มีแขกและไม่ถูกลบ) ใน [lo, hi]
+        return self.count_empty_rooms(lo, hi)
+
+    def iter_query(self, channel=None, room_range=None, guest_prefix=None, manual_channel=None):
+        # แขกที่ตรงทุกเงื่อนไข เรียงตามห้อง: (room, {"channel", "guest_info"[, "manual_channel"]})
+        # guest_prefix ตรงเมื่อทุกคำใน prefix เป็นคำขึ้นต้นของบางคำใน guest_info (ไม่สนตัวพิมพ์)
+        # ห้อง materialized อ่านจากดัชนีรองที่เล็กที่สุดของเงื่อนไข ส่วนแขกของช่องทางคำนวณจากช่วง exponent
+        # จึงใช้เวลาตามจำนวนผลลัพธ์ ไม่ใช่จำนวนห้องทั้งหมด
+        self._apply_relocations()
+        if channel is not None and channel not in self.channels and channel != "Manual":
+            raise ValueError(f"Invalid channel name {channel}")
+        if manual_channel is not None:
+            if channel not in (None, "Manual"):
+                return iter(())
+            channel = "Manual"
+        if room_range is None:
+            lo, hi = None, None
+        else:
+            lo, hi = room_range
+        lo, hi = self._range_bounds(lo, hi)
+        if lo > hi:
+            return iter(())
+        words = sorted(guest_tokens(guest_prefix)) if guest_prefix else []
+        sequences = [self._query_materialized(channel, manual_channel, words, lo, hi)]
+        if channel != "Manual":
+            for name in self._active_channels(hi) if channel is None else [channel]:
+                sequences.append(self._query_channel(name, words, lo, hi))
+        return heapq.merge(*sequences, key=_query_room)
+
+    def _query_materialized(self, channel, manual_channel, words, lo, hi):
+        rooms = self.rooms
+        # ตัวเลือกของแต่ละเงื่อนไขคือ union ของ posting list; ใช้ตัวที่มีห้องน้อยที่สุด แล้วตรวจเงื่อนไขที่เหลือทีละห้อง
+        candidates = [rooms.token_postings(word) for word in words]
+        if channel is not None:
+            candidates.append([rooms.with_channel(channel)])
+        if manual_channel is not None:
+            candidates.append([rooms.with_manual_channel(manual_channel)])
+        if candidates:
+            postings = min(candidates, key=lambda option: sum(map(len, option)))
+            merged = heapq.merge(*(posting.irange(lo) for posting in postings))
+            entries = ((room, rooms[room]) for room, _ in itertools.groupby(merged))
+        else:
+            entries = rooms.items(lo)
+        for room, info in entries:
+            if room > hi:
+                return
+            if channel is not None and info.channel != channel:
+                continue
+            if manual_channel is not None and info.manual_channel != manual_channel:
+                continue
+            if words and not _words_match(guest_tokens(info.guest_info), words):
+                continue
+            yield room, info.as_dict()
+
+    def _query_channel(self, channel, words, lo, hi):
+        exponents = self._channel_exponents(channel, lo, hi)
+        first, last = exponents.start, min(exponents.stop - 1, self.guests_per_channel[channel])
+        # แขก initial (Original 1..initial_guests) ชื่อ "Initial Guest k" ที่เหลือชื่อ "Guest from <channel>" (ดู _channel_guest_info)
+        initial = min(self.initial_guests, last) if channel == "Original" else 0
+        sequences = []
+        if first <= initial:
+            fixed = {"initial", "guest"}
+            numbers = [word for word in words if not _words_match(fixed, [word])]
+            if not numbers:
+                sequences.append(range(first, initial + 1))
+            else:
+                # ทุกคำที่เหลือต้องเป็นคำขึ้นต้นของเลข k จึงใช้คำที่ยาวที่สุดสร้างเลขที่ตรงโดยตรง
+                longest = max(numbers, key=len)
+                if all(longest.startswith(word) for word in numbers):
+                    sequences.append(_numbers_with_prefix(longest, first, initial))
+        if last > initial and _words_match(guest_tokens(f"Guest from {channel}"), words):
+            sequences.append(range(max(first, initial + 1), last + 1))
+        vacated = self.vacated_exponents[channel]
+        removed_rooms = self.removed_rooms
+        for exponent in itertools.chain(*sequences):
+            if exponent in vacated:
+                continue
+            room = self._channel_room(channel, exponent)
+            if removed_rooms and room in removed_rooms:
+                continue
+            yield room, {"channel": channel, "guest_info": self._channel_guest_info(channel, exponent)}
+
+    @track_time
+    @cached
+    def query(self, channel=None, room_range=None, guest_prefix=None, manual_channel=None, offset=0, limit=DEFAULT_QUERY_LIMIT):
+        # หน้าหนึ่งของผลลัพธ์ iter_query (offset, limit) สำหรับแสดงทีละหน้า
+        offset, limit = max(int(offset), 0), max(int(limit), 0)
+        try:
+            results = self.iter_query(channel, room_range, guest_prefix, manual_channel)
+            page = list(itertools.islice(results, offset, offset + limit))
+        except ValueError as e:
+            return f"Error: {e}"
+        self.metrics.add_items(len(page))
+        return page
 
     def memory_usage(self):
-        return sum(sys.getsizeof(obj) for obj in vars(self).values())
+        return self.memory_report()["total"]
+
+    def memory_report(self, mode="sampled", sample_size=1000):
+        # แยกหน่วยความจำตามโครงสร้าง: "sampled" ประมาณจากตัวอย่าง (เร็ว), "exact" วัดด้วย tracemalloc
+        if mode not in ("sampled", "exact"):
+            raise ValueError(f"Unknown memory report mode: {mode}")
+        exact = mode == "exact"
+        # ห้อง materialized เก็บเป็นคอลัมน์ array ซึ่ง getsizeof นับได้ตรงทุกไบต์ในทั้งสองโหมด
+        report = self.rooms.memory_breakdown()
+        report["removed_rooms"] = sys.getsizeof(self.removed_rooms)
+        if exact:
+            report["channel_ranges"] = traced_size((self.guests_per_channel, self.vacated_exponents, self.vacated_index,
+                                                    self.removed_powers, self.materialized_powers))
+        else:
+            report["channel_ranges"] = self._sampled_channel_ranges(int(sample_size))
+        report["indexes"] = sys.getsizeof(self.blocked_rooms)
+        report["timing_table"] = traced_size(self.metrics.stats) if exact else deep_sizeof(self.metrics.stats)
+        report["result_cache"] = sys.getsizeof(self.result_cache)
+        report["total"] = sum(report.values())
+        return report
+
+    def _sampled_channel_ranges(self, sample_size):
+        # โครงสร้างรายช่องทางที่โตตามจำนวนแขกที่ย้ายออกหรือห้องที่ถูกลบ: วัดตัวภาชนะตรงๆ ส่วนสมาชิกประมาณจากตัวอย่าง
+        # ไม่เกิน sample_size ตัวต่อโครงสร้าง แล้วขยายผลตามจำนวนทั้งหมด
+        mappings = (self.guests_per_channel, self.vacated_exponents, self.vacated_index, self.removed_powers, self.materialized_powers)
+        total = sum(map(sys.getsizeof, mappings)) + sum(map(sys.getsizeof, self.channels))
+        for channel in self.channels:
+            total += sys.getsizeof(self.guests_per_channel[channel])
+            vacated = self.vacated_exponents[channel]
+            total += sys.getsizeof(vacated) + _scaled_size(list(itertools.islice(vacated, sample_size)), len(vacated))
+            for index in (self.vacated_index[channel], self.removed_powers[channel]):
+                total += sys.getsizeof(index) + _scaled_size(index.sample(sample_size), len(index))
+            materialized = self.materialized_powers[channel]
+            key_bytes, value_bytes = sampled_size(materialized, list(itertools.islice(materialized, sample_size)), len(materialized))
+            total += sys.getsizeof(materialized) + key_bytes + value_bytes
+        return total
+
+    @track_time
+    def save_snapshot(self, path):
+        size = write_snapshot(self, path)
+        return f"Snapshot saved to {path} ({size} bytes)"
+
+    @classmethod
+    def load_snapshot(cls, path):
+        # คืนค่าโรงแรมใหม่จากไฟล์ snapshot (SnapshotError ถ้าไฟล์เสียหรือคนละเวอร์ชัน)
+        return read_snapshot(path, cls)
+
+    @classmethod
+    def open_durable(cls, directory, compact_room_ids=False, **journal_options):
+        # เปิดโรงแรมจากไดเรกทอรีข้อมูล: snapshot ล่าสุด + replay journal แล้วบันทึกการแก้ไขต่อจากนั้น
+        return open_hotel(directory, cls, compact_room_ids=compact_room_ids, **journal_options)
+
+    @track_time
+    def compact_journal(self):
+        if self.journal is None:
+            return "Error: Journal is not enabled"
+        sequence = self.journal.compact(self, background=False)
+        return f"Journal compacted into a snapshot at operation {sequence}"
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
 
     def get_function_times(self):
-        return {func: f"{time:.6f}" for func, time in self.function_times.items()}
+        return {func: f"{stats.inclusive:.6f}" for func, stats in self.metrics.stats.items()}
+
+    def get_function_stats(self):
+        return self.metrics.as_dict()
+
+    def get_cache_stats(self):
+        return self.result_cache.stats()
+
+    def export_metrics(self, path, fmt="json"):
+        return self.metrics.export(path, fmt)
 
     # @track_time
     # def write_to_file(self, filename):
@@ -283,49 +1178,101 @@ class Hilberts:
     #     return f"Data written to {filename}"
 
     def channel_to_vehicle_numbers(self, channel):
-        # แปลงช่องทางเป็นรหัสยานพาหนะ
-        channel_order = ["Original", "Bus", "Train", "Plane", "Ship"]
-        vehicle_numbers = [1] * 5  # เริ่มต้นด้วย [1, 1, 1, 1, 1]
-        if channel in channel_order:
-            index = channel_order.index(channel)
-            vehicle_numbers[index] = index + 1
-        return f"no_{'_'.join(map(str, vehicle_numbers))}"
-    @track_time
-    def write_to_file(self):
-        print("Preparing data for file writing")
-        sorted_rooms = self.sort_rooms()
-        print(f"Total rooms to write: {len(sorted_rooms)}")
+        # แปลงช่องทางเป็นรหัสยานพาหนะ (สร้างไว้ตอนลงทะเบียนช่องทาง)
+        return self._channel_labels.get(channel, DEFAULT_VEHICLE_LABEL)
+    def _iter_sorted_entries(self):
+        # เหมือน iter_sorted_rooms แต่คืน (room, channel) โดยห้อง materialized คืน (room, GuestRecord) แทน
+        sequences = [zip(self._iter_channel_rooms(channel), itertools.repeat(channel)) for channel in self._active_channels()]
+        sequences.append(self.rooms.items())
+        removed_rooms = self.removed_rooms
+        merged = heapq.merge(*sequences)
+        if removed_rooms:
+            merged = (entry for entry in merged if entry[0] not in removed_rooms)
+        return merged
 
+    def iter_csv_chunks(self, batch_rows=10000):
+        labels = self._channel_labels
         output = io.StringIO()
         writer = csv.writer(output)
         writer.writerow(["Room Number", "Channel Info"])
-        
-        for room in sorted_rooms:
-            if room not in self.removed_rooms:
-                info = self.rooms[room]
+        batch = []
+        # ห้องที่เก็บอยู่ถูกแสดงเป็นหมายเลขหลังย้ายตาม transform ที่ยังรออยู่
+        relocate = self._relocate if self._pending_relocation is not None else None
+        for room, channel in self._iter_sorted_entries():
+            if isinstance(channel, GuestRecord):
+                info = channel
                 if info['channel'] == "Manual":
-                    channel_info = f"Manual - {info['manual_channel']}"
+                    label = f"Manual - {info['manual_channel']}"
                 else:
-                    channel_info = self.channel_to_vehicle_numbers(info['channel'])
-                writer.writerow([room, channel_info])
+                    label = labels[info['channel']]
+            else:
+                label = labels[channel]
+            batch.append((room if relocate is None else relocate(room), label))
+            if len(batch) >= batch_rows:
+                writer.writerows(batch)
+                self.metrics.add_items(len(batch))
+                batch = []
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        writer.writerows(batch)
+        self.metrics.add_items(len(batch))
+        yield output.getvalue()
+
+    @track_time
+    def export_csv(self, fileobj, batch_rows=10000):
+        # เขียน CSV ทีละ batch ลงไฟล์หรือ socket โดยตรง (ไฟล์ binary/socket จะได้รับเป็น UTF-8)
+        binary = not isinstance(fileobj, io.TextIOBase)
+        write = getattr(fileobj, "sendall", None) or fileobj.write
+        for chunk in self.iter_csv_chunks(batch_rows):
+            write(chunk.encode("utf-8") if binary else chunk)
+        return f"Data written to {getattr(fileobj, 'name', 'stream')}"
+
+    @track_time
+    @cached
+    def export_csv_blob(self):
+        # CSV ทั้งไฟล์เป็น bytes (UTF-8) สำหรับปุ่มดาวน์โหลด ถูกแคชไว้จนกว่าโรงแรมจะเปลี่ยน
+        return "".join(self.iter_csv_chunks()).encode("utf-8")
+
+    @track_time
+    @cached
+    def write_to_file(self):
+        self._log("Preparing data for file writing")
+        content = "".join(self.iter_csv_chunks())
+        self._log("Data preparation complete")
+        return content
 
-        print("Data preparation complete")
-        return output.getvalue()
 
+    def _count_empty_up_to_highest(self):
+        # เท่ากับ count_empty_rooms() แต่ใช้เพียงตัวนับของแต่ละช่องทางที่มีแขก ไม่ต้องนับผ่านดัชนีช่วง
+        # ได้เพราะทุกห้องที่มีแขกหรือถูกลบไม่เกินห้องสูงสุดเสมอ และห้องที่ถูกลบไม่เคยเป็นห้อง materialized
+        highest = self.highest_occupied_room
+        if self._is_huge(highest):
+            return self.count_empty_rooms()
+        occupied = len(self.rooms)
+        for channel in self._active_channels():
+            guests = self.guests_per_channel[channel]
+            occupied += guests - len(self.vacated_exponents[channel]) - self.removed_powers[channel].count_range(1, guests)
+        return int(highest) - occupied - len(self.removed_rooms)
 
     @track_time
-    def get_hotel_status(self):
-        total_guests = sum(self.guests_per_channel.values())
-        occupied_channels = sum(1 for guests in self.guests_per_channel.values() if guests > 0)
-        empty_rooms = self.count_empty_rooms()
+    @cached
+    def get_hotel_status(self, manual_page=1, manual_page_size=DEFAULT_STATUS_PAGE_SIZE):
+        # ใช้เวลา O(จำนวนช่องทางที่มีแขก + ขนาดหน้า) ไม่ว่าจะมีแขกกี่คน: ห้อง manual แสดงทีละหน้าจากดัชนี channel ของ self.rooms
+        self._apply_relocations()
+        manual_page, manual_page_size = max(int(manual_page), 1), max(int(manual_page_size), 1)
+        active_channels = self._active_channels()
+        total_guests = sum(self.guests_per_channel[channel] for channel in active_channels)
+        occupied_channels = len(active_channels)
+        empty_rooms = self._count_empty_up_to_highest()
 
-        status = f"""
+        parts = [f"""
 # Hilbert's Infinite Hotel Status
 
 ## Overview
 - **Total Guests:** {total_guests}
 - **Occupied Channels:** {occupied_channels} out of {len(self.channels)}
-- **Total Occupied Rooms:** {len(self.rooms)}
+- **Total Occupied Rooms:** {self._occupied_count()}
 - **Highest Occupied Room:** {self.highest_occupied_room}
 - **Empty Rooms** (up to highest occupied): {empty_rooms}
 - **Removed Rooms:** {len(self.removed_rooms)}\n
@@ -333,21 +1280,25 @@ class Hilberts:
 
 | Channel | Guests |
 |---------|--------|
-"""
-        
-        for channel, guests in self.guests_per_channel.items():
-            if guests > 0:
-                status += f"| {channel:<7} | {guests:<6} |\n"
-
-        status += "\n## Manual Rooms\n\n"
-        manual_rooms = [room for room, info in self.rooms.items() if info['channel'] == "Manual"]
-        if manual_rooms:
-            status += "| Room Number | Guest Info | Channel |\n"
-            status += "|-------------|------------|--------|\n"
-            for room in manual_rooms:
-                info = self.rooms[room]
-                status += f"| {room:<11} | {info['guest_info']:<10} | {info['manual_channel']:<7} |\n"
+"""]
+        for channel in active_channels:
+            parts.append(f"| {channel:<7} | {self.guests_per_channel[channel]:<6} |\n")
+
+        parts.append("\n## Manual Rooms\n\n")
+        manual_count = self.rooms.count_channel("Manual")
+        if manual_count:
+            page_count = -(-manual_count // manual_page_size)
+            manual_page = min(manual_page, page_count)
+            first = (manual_page - 1) * manual_page_size
+            page = list(itertools.islice(self.rooms.channel_rooms("Manual"), first, first + manual_page_size))
+            parts.append(f"Showing rooms {first + 1}-{first + len(page)} of {manual_count} (page {manual_page} of {page_count})\n\n")
+            parts.append("| Room Number | Guest Info | Channel |\n")
+            parts.append("|-------------|------------|--------|\n")
+            rooms = self.rooms
+            for room in page:
+                info = rooms[room]
+                parts.append(f"| {room:<11} | {info['guest_info']:<10} | {info['manual_channel']:<7} |\n")
         else:
-            status += "No manually added rooms.\n"
+            parts.append("No manually added rooms.\n")
 
-        return status
+        return "".join(parts)
@@ -0,0 +1,434 @@
+import os
+import struct
+import threading
+import zlib
+
+from external_sort import decode_room, decode_varint, encode_room, encode_varint
+from room_id import RoomId
+from snapshot import encode_snapshot, read_snapshot_with_sequence, snapshot_flags, write_snapshot_payload
+
+# ไฟล์ในไดเรกทอรีข้อมูล: snapshot.bin + journal.<ลำดับแรกของ segment>.log
+SNAPSHOT_FILE = "snapshot.bin"
+SEGMENT_PREFIX = "journal."
+SEGMENT_SUFFIX = ".log"
+# แต่ละ record: ความยาว payload + CRC32 ของ payload แล้วตามด้วย payload (varint)
+_RECORD = struct.Struct("<II")
+_FLOAT = struct.Struct("<d")
+_EMPTY_RECORD_HEADER = bytes(_RECORD.size)
+DEFAULT_COMPACT_BYTES = 64 * 1024 * 1024
+DEFAULT_GROUP_BYTES = 1024 * 1024
+# โหมด durability (ดู Journal) เรียงจากปลอดภัยที่สุดไปเร็วที่สุด
+DURABILITY_MODES = ("sync", "group", "async")
+# โหมดของโปรแกรมแบบโต้ตอบที่มีผู้เขียนคนเดียว (CLI): "group" รวม fsync ได้เฉพาะเมื่อมีหลายเธรดเขียนพร้อมกัน
+# ผู้เขียนคนเดียวจึงรอ fsync ทุกคำสั่งเหมือน "sync" ส่วน "async" ให้เธรด flusher fsync รวมทุก flush_interval
+# แลกกับการที่คำสั่งช่วงสุดท้ายไม่เกิน flush_interval อาจหายถ้าโปรเซสหรือเครื่องล่ม (journal ที่ค้างครึ่ง record ยังกู้ได้)
+INTERACTIVE_DURABILITY = "async"
+
+# รหัสของเมธอดที่แก้ไขสถานะ (1 ไบต์) ห้ามเปลี่ยนค่าที่มีอยู่แล้ว (journal เก่าต้อง replay ได้)
+OP_CODES = {
+    "add_initial_guests": 1,
+    "add_new_guests": 2,
+    "add_room_manual": 3,
+    "remove_room": 4,
+    "move_guest": 5,
+    "add_rooms_manual_bulk": 6,
+    "remove_rooms_bulk": 7,
+    "move_guests_bulk": 8,
+    "relocate": 9,
+    "remove_range": 10,
+    "restore_range": 11,
+    "register_channel": 12,
+    "hand_off_guest": 13,
+    "receive_guest": 14,
+}
+OP_NAMES = {code: name for name, code in OP_CODES.items()}
+
+_NONE, _ROOM, _NEGATIVE, _STRING, _LIST, _TUPLE, _FLOAT_TAG, _DICT, _BOOL = range(9)
+
+
+class JournalError(ValueError):
+    pass
+
+
+def encode_value(value, out):
+    # ค่าที่รองรับ: None, bool, int, RoomId, str, float, list, tuple, dict
+    kind = type(value)
+    if kind is int and value >= 0:
+        # เส้นทางลัดของหมายเลขห้อง (เหมือน encode_room แต่ไม่ต้องเรียกฟังก์ชันซ้อน)
+        length = (value.bit_length() + 7) >> 3
+        out.append(_ROOM)
+        encode_varint(length << 1, out)
+        out += value.to_bytes(length, "little")
+    elif kind is str:
+        data = value.encode("utf-8")
+        out.append(_STRING)
+        encode_varint(len(data), out)
+        out += data
+    elif value is None:
+        out.append(_NONE)
+    elif kind is bool:
+        out.append(_BOOL)
+        out.append(int(value))
+    elif isinstance(value, RoomId) or (isinstance(value, int) and value >= 0):
+        out.append(_ROOM)
+        encode_room(value, out)
+    elif isinstance(value, int):
+        out.append(_NEGATIVE)
+        encode_varint(-value, out)
+    elif isinstance(value, str):
+        encode_value(str(value), out)
+    elif isinstance(value, float):
+        out.append(_FLOAT_TAG)
+        out += _FLOAT.pack(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST if isinstance(value, list) else _TUPLE)
+        encode_varint(len(value), out)
+        for item in value:
+            encode_value(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        encode_varint(len(value), out)
+        for key, item in value.items():
+            encode_value(key, out)
+            encode_value(item, out)
+    elif hasattr(value, "tolist"):
+        # NumPy array หรือ scalar
+        encode_value(value.tolist(), out)
+    else:
+        raise JournalError(f"Cannot journal value of type {type(value).__name__}")
+
+
+def decode_value(buffer, position):
+    tag = buffer[position]
+    position += 1
+    if tag == _NONE:
+        return None, position
+    if tag == _BOOL:
+        return bool(buffer[position]), position + 1
+    if tag == _ROOM:
+        return decode_room(buffer, position)
+    if tag == _NEGATIVE:
+        value, position = decode_varint(buffer, position)
+        return -value, position
+    if tag == _STRING:
+        length, position = decode_varint(buffer, position)
+        end = position + length
+        return bytes(buffer[position:end]).decode("utf-8"), end
+    if tag == _FLOAT_TAG:
+        return _FLOAT.unpack_from(buffer, position)[0], position + _FLOAT.size
+    if tag in (_LIST, _TUPLE):
+        count, position = decode_varint(buffer, position)
+        items = []
+        for _ in range(count):
+            item, position = decode_value(buffer, position)
+            items.append(item)
+        return (items if tag == _LIST else tuple(items)), position
+    if tag == _DICT:
+        count, position = decode_varint(buffer, position)
+        items = {}
+        for _ in range(count):
+            key, position = decode_value(buffer, position)
+            items[key], position = decode_value(buffer, position)
+        return items, position
+    raise JournalError(f"Unknown value tag {tag}")
+
+
+def encode_arguments(args, kwargs):
+    # encode อาร์กิวเมนต์ลง buffer ชั่วคราวก่อนเรียกเมธอด: ค่าที่บันทึกไม่ได้จะถูกปฏิเสธโดยไม่มีครึ่ง record ค้างใน journal
+    out = bytearray()
+    out.append(_LIST)
+    encode_varint(len(args), out)
+    for value in args:
+        encode_value(value, out)
+    if kwargs:
+        encode_value(kwargs, out)
+    else:
+        out.append(_DICT)
+        out.append(0)
+    return out
+
+
+def encode_record(sequence, name, arguments, out):
+    # เขียน payload ต่อท้าย buffer โดยตรงแล้วค่อยเติม header ที่จองที่ไว้
+    code = OP_CODES[name]
+    start = len(out)
+    out += _EMPTY_RECORD_HEADER
+    encode_varint(sequence, out)
+    out.append(code)
+    out += arguments
+    payload = memoryview(out)[start + _RECORD.size:]
+    try:
+        _RECORD.pack_into(out, start, len(payload), zlib.crc32(payload))
+    finally:
+        payload.release()
+
+
+def read_records(path):
+    # คืน (รายการ record ที่สมบูรณ์, ตำแหน่งสิ้นสุดของ record สุดท้ายที่สมบูรณ์, ขนาดไฟล์)
+    with open(path, "rb") as file:
+        data = file.read()
+    records = []
+    position = 0
+    while position + _RECORD.size <= len(data):
+        length, checksum = _RECORD.unpack_from(data, position)
+        start = position + _RECORD.size
+        end = start + length
+        if end > len(data) or zlib.crc32(data[start:end]) != checksum:
+            break
+        sequence, offset = decode_varint(data, start)
+        code = data[offset]
+        offset += 1
+        if code not in OP_NAMES:
+            raise JournalError(f"Unknown journal operation {code} in {path}")
+        args, offset = decode_value(data, offset)
+        kwargs, offset = decode_value(data, offset)
+        records.append((sequence, OP_NAMES[code], args, kwargs))
+        position = end
+    return records, position, len(data)
+
+
+def segment_paths(directory):
+    # รายชื่อไฟล์ segment เรียงตามลำดับ record แรก
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            first = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+            if first.isdigit():
+                segments.append((int(first), os.path.join(directory, name)))
+    segments.sort()
+    return segments
+
+
+def segment_path(directory, first_sequence):
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{first_sequence:020d}{SEGMENT_SUFFIX}")
+
+
+def replay(directory, hotel, after_sequence=0):
+    # เล่น record ที่ลำดับมากกว่า after_sequence ซ้ำบนโรงแรม แล้วคืนลำดับสุดท้ายที่เล่น
+    last_sequence = after_sequence
+    segments = segment_paths(directory)
+    for index, (_, path) in enumerate(segments):
+        records, valid_end, size = read_records(path)
+        for sequence, name, args, kwargs in records:
+            if sequence <= last_sequence:
+                continue
+            if sequence != last_sequence + 1:
+                raise JournalError(f"Journal is missing operations {last_sequence + 1}..{sequence - 1}")
+            getattr(hotel, name)(*args, **kwargs)
+            last_sequence = sequence
+        if valid_end < size:
+            if index != len(segments) - 1:
+                raise JournalError(f"Journal segment {path} is corrupt")
+            # record สุดท้ายเขียนไม่ครบตอนเครื่องล่ม: ตัดทิ้ง (ยังไม่เคยถูกยืนยันกับผู้เรียก)
+            with open(path, "r+b") as file:
+                file.truncate(valid_end)
+                os.fsync(file.fileno())
+    return last_sequence
+
+
+class Journal:
+    # journal แบบ append-only พร้อม group commit
+    # durability: "sync" = fsync ทุก record, "group" = ผู้เรียกรอ fsync รอบถัดไปที่รวมหลาย record,
+    # "async" = ไม่รอ (เรียก wait_durable เองเมื่อต้องการยืนยัน)
+    # "group" ไม่เสียข้อมูลที่ตอบกลับไปแล้ว แต่รวม fsync ได้เฉพาะเมื่อมีผู้เขียนหลายราย (server, HotelEngine หลายเธรด)
+    # หรือผู้เรียกเลื่อนการรอด้วย defer_acknowledgements; ผู้เขียนคนเดียวได้ fsync ทุกคำสั่ง (ดู INTERACTIVE_DURABILITY)
+    def __init__(self, directory, next_sequence=1, durability="group", flush_interval=0.005,
+                 group_bytes=DEFAULT_GROUP_BYTES, compact_bytes=DEFAULT_COMPACT_BYTES):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.directory = directory
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.group_bytes = group_bytes
+        self.compact_bytes = compact_bytes
+        self.next_sequence = next_sequence
+        self.buffered_sequence = next_sequence - 1
+        self.durable_sequence = next_sequence - 1
+        self.fsync_count = 0
+        self._buffer = bytearray()
+        self._waiters = 0
+        self._closing = False
+        self._error = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # ลำดับการเขียนไฟล์ (flush และการเปลี่ยน segment) แยกจาก lock ของ buffer เพื่อให้ append ทำงานระหว่าง fsync ได้
+        self._io_lock = threading.Lock()
+        self._compaction = None
+        # เธรดที่เลื่อนการรอ fsync ออกไป (เช่น HotelEngine ที่รอหลังปล่อย write lock)
+        self._deferred = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        segments = segment_paths(directory)
+        path = segments[-1][1] if segments else segment_path(directory, next_sequence)
+        self._file = open(path, "ab")
+        self.segment_bytes = self._file.tell()
+        self._flusher = None
+        if durability != "sync":
+            self._flusher = threading.Thread(target=self._flush_loop, name="journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def append(self, name, arguments):
+        # arguments คือผลของ encode_arguments
+        with self._lock:
+            if self._error is not None:
+                raise JournalError(f"Journal write failed: {self._error}")
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            encode_record(sequence, name, arguments, self._buffer)
+            self.buffered_sequence = sequence
+            if len(self._buffer) >= self.group_bytes:
+                self._changed.notify_all()
+        if self.durability == "sync":
+            self._flush()
+        return sequence
+
+    def acknowledge(self, sequence):
+        # เรียกหลังจากเมธอดทำงานเสร็จ: คืนค่าเมื่อ record ถึงดิสก์แล้วตามโหมด durability
+        if self.durability == "group":
+            if getattr(self._deferred, "active", False):
+                self._deferred.sequence = sequence
+            else:
+                self.wait_durable(sequence)
+
+    def defer_acknowledgements(self):
+        # acknowledge ในเธรดนี้จะจำลำดับไว้แทนการรอ จนกว่าจะเรียก take_deferred_acknowledgement
+        self._deferred.active = True
+        self._deferred.sequence = 0
+
+    def take_deferred_acknowledgement(self):
+        sequence = getattr(self._deferred, "sequence", 0)
+        self._deferred.active = False
+        self._deferred.sequence = 0
+        return sequence
+
+    def wait_durable(self, sequence=None):
+        with self._lock:
+            if sequence is None:
+                sequence = self.buffered_sequence
+            if self._flusher is None:
+                pending = self.durable_sequence < sequence
+            else:
+                self._waiters += 1
+                try:
+                    while self.durable_sequence < sequence and self._error is None:
+                        self._changed.notify_all()
+                        self._changed.wait()
+                finally:
+                    self._waiters -= 1
+                pending = False
+            if self._error is not None:
+                raise JournalError(f"Journal write failed: {self._error}")
+        if pending:
+            self._flush()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                # รอจนมีผู้รอ fsync, buffer เต็ม หรือครบรอบเวลา
+                while not self._closing and not (self._waiters and self._buffer) and len(self._buffer) < self.group_bytes:
+                    if not self._changed.wait(self.flush_interval):
+                        break
+                if self._closing:
+                    return
+            try:
+                self._flush()
+            except OSError:
+                return
+
+    def _flush(self):
+        with self._io_lock:
+            with self._lock:
+                data = self._buffer
+                sequence = self.buffered_sequence
+                self._buffer = bytearray()
+            if data:
+                try:
+                    self._file.write(data)
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except OSError as error:
+                    with self._lock:
+                        self._error = error
+                        self._changed.notify_all()
+                    raise
+                self.fsync_count += 1
+                self.segment_bytes += len(data)
+            with self._lock:
+                if sequence > self.durable_sequence:
+                    self.durable_sequence = sequence
+                self._changed.notify_all()
+
+    def rotate(self):
+        # ปิด segment ปัจจุบันแล้วเริ่ม segment ใหม่ คืนลำดับสุดท้ายที่อยู่ใน segment เก่า
+        with self._io_lock:
+            with self._lock:
+                boundary = self.next_sequence - 1
+                data = self._buffer
+                self._buffer = bytearray()
+                sequence = self.buffered_sequence
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = open(segment_path(self.directory, boundary + 1), "ab")
+            self.segment_bytes = 0
+            with self._lock:
+                self.durable_sequence = max(self.durable_sequence, sequence)
+                self._changed.notify_all()
+        return boundary
+
+    def needs_compaction(self):
+        return self.segment_bytes + len(self._buffer) >= self.compact_bytes and not self.compacting()
+
+    def compacting(self):
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def compact(self, hotel, background=True):
+        # encode สถานะปัจจุบันเป็น snapshot (ต้องทำในเธรดที่แก้ไขโรงแรม) แล้วเขียนไฟล์และลบ segment เก่าในเบื้องหลัง
+        if self.compacting():
+            self._compaction.join()
+        boundary = self.rotate()
+        payload = encode_snapshot(hotel, boundary)
+        flags = snapshot_flags(hotel)
+        if not background:
+            self._write_compaction(payload, flags, boundary)
+            return boundary
+        self._compaction = threading.Thread(target=self._write_compaction, args=(payload, flags, boundary),
+                                            name="journal-compaction", daemon=True)
+        self._compaction.start()
+        return boundary
+
+    def _write_compaction(self, payload, flags, boundary):
+        write_snapshot_payload(os.path.join(self.directory, SNAPSHOT_FILE), payload, flags)
+        for first_sequence, path in segment_paths(self.directory):
+            if first_sequence <= boundary:
+                os.unlink(path)
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._changed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._flush()
+        if self._compaction is not None:
+            self._compaction.join()
+        self._file.close()
+
+
+def open_hotel(directory, hotel_factory, compact_room_ids=False, **journal_options):
+    # โหลด snapshot ล่าสุด (ถ้ามี) เล่น journal ซ้ำ แล้วผูก journal ใหม่เข้ากับโรงแรม
+    os.makedirs(directory, exist_ok=True)
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        hotel, sequence = read_snapshot_with_sequence(snapshot_path, hotel_factory)
+    else:
+        hotel, sequence = hotel_factory(compact_room_ids=compact_room_ids), 0
+    # replay แบบเงียบ: ข้อความ log ของการดำเนินการเก่าถูกแสดงไปแล้วตอนที่ทำจริง
+    verbose = hotel.verbose
+    hotel.verbose = False
+    try:
+        sequence = replay(directory, hotel, sequence)
+    finally:
+        hotel.verbose = verbose
+    hotel.journal = Journal(directory, next_sequence=sequence + 1, **journal_options)
+    return hotel
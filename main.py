@@ -1,51 +1,194 @@
 from hilbert import *
+from journal import DURABILITY_MODES, INTERACTIVE_DURABILITY
+from metrics import FunctionStats
+import argparse
+import collections
+import itertools
+import sys
 import time as time_module
 
+# ตารางคำสั่งสร้างครั้งเดียว (ชื่อเมธอด) แล้วค่อย getattr ตอนเรียก เพื่อให้รันหลายล้านคำสั่งได้เร็ว
+OPERATIONS = {
+    'A': 'add_new_guests',
+    'I': 'add_initial_guests',
+    'M': 'add_room_manual',
+    'R': 'remove_room',
+    'F': 'find_room',
+    'S': 'sort_rooms',
+    'C': 'count_empty_rooms',
+    'W': 'write_to_file',
+    'U': 'memory_usage',
+    'V': 'move_guest',
+    'T': 'relocate',
+    'D': 'remove_range',
+    'X': 'restore_range',
+    'Q': 'query',
+    'N': 'register_channel',
+}
+# ตัวเลือกของคำสั่ง Q (key=value) -> ชื่ออาร์กิวเมนต์ของ query
+QUERY_OPTIONS = {'channel': 'channel', 'manual': 'manual_channel', 'prefix': 'guest_prefix', 'range': 'room_range',
+                 'offset': 'offset', 'limit': 'limit'}
+PRINT_CHUNK_ROWS = 4096
+
 def process_command(hotel, command, args):
-    operations = {
-        'A': hotel.add_new_guests,
-        'I': hotel.add_initial_guests, 
-        'M': hotel.add_room_manual,
-        'R': hotel.remove_room,
-        'F': hotel.find_room,
-        'S': hotel.sort_rooms,
-        'C': hotel.count_empty_rooms,
-        'W': hotel.write_to_file,
-        'U': hotel.memory_usage,
-        'V': hotel.move_guest,  
-    }
-    
     op = command[0]
-    if op not in operations:
+    if op not in OPERATIONS:
         return f"Invalid command: {op}"
+    operation = getattr(hotel, OPERATIONS[op])
 
     if op == 'A':
         if len(args) != 2:
             return "Error: Add new guests command requires channel name and number of guests"
         channel, num_guests = args
-        return operations[op](channel, int(num_guests))
+        return operation(channel, int(num_guests))
     elif op == 'I': 
         if len(args) != 1:
             return "Error: Initialize guests command requires number of guests"
-        return operations[op](int(args[0]))
+        return operation(int(args[0]))
     elif op in ['M', 'R', 'F']:
-        return operations[op](*args)
+        return operation(*args)
     elif op == 'W':
-        return operations[op]()
+        return operation()
     elif op == 'S':
-        if len(args) != 1:
-            return "Error: Sort rooms command requires chunk_size"
-        return operations[op](int(args[0]))
+        if args:
+            return "Error: Sort rooms command takes no arguments"
+        # คืน iterator ของห้องที่เรียงแล้ว ผู้เรียกอ่านทีละชิ้น (print_result) หน่วยความจำจึงคงที่ไม่ขึ้นกับจำนวนห้อง
+        return operation()
+    elif op == 'C':
+        if len(args) not in (0, 2):
+            return "Error: Count empty rooms command takes no arguments or lo and hi"
+        return operation(*args)
     elif op == 'V':
         if len(args) != 2:
             return "Error: Move guest command requires from_room and to_room"
-        return operations[op](int(args[0]), int(args[1]))
+        return operation(int(args[0]), int(args[1]))
+    elif op == 'T':
+        if len(args) not in (1, 2):
+            return "Error: Relocate command requires multiplier and optionally offset"
+        return operation(*args)
+    elif op in ['D', 'X']:
+        if len(args) != 2:
+            return "Error: Room range commands require lo and hi"
+        return operation(*args)
+    elif op == 'N':
+        if len(args) != 1:
+            return "Error: Register channel command requires a channel name"
+        return operation(args[0])
+    elif op == 'Q':
+        # เช่น "Q channel=Manual manual=web prefix=alice,smith range=100-500 limit=20"
+        options = {}
+        for arg in args:
+            key, _, value = arg.partition('=')
+            if key not in QUERY_OPTIONS or not value:
+                return f"Error: Query options are {', '.join(f'{name}=...' for name in QUERY_OPTIONS)}"
+            if key == 'range':
+                lo, _, hi = value.partition('-')
+                value = (lo, hi)
+            elif key == 'prefix':
+                value = value.replace(',', ' ')
+            options[QUERY_OPTIONS[key]] = value
+        return operation(**options)
     else:
-        return operations[op]()
-    
-def main():
-    hotel = Hilberts()
+        return operation()
+
+
+def print_result(result, file=sys.stdout):
+    # ผลลัพธ์แบบ iterator พิมพ์ทีละชิ้นตามที่ได้มา (บรรทัดละห้อง) ไม่สร้างผลลัพธ์ทั้งก้อน
+    if not hasattr(result, "__next__"):
+        print(result, file=file)
+        return
+    while True:
+        chunk = list(itertools.islice(result, PRINT_CHUNK_ROWS))
+        if not chunk:
+            return
+        print("\n".join(map(str, chunk)), file=file)
+
     
+def run_script(hotel, lines, echo=False):
+    # รันบรรทัดคำสั่ง (เช่น "I 1000", "A Bus 500", "V 4 6") ผ่าน process_command แล้วเก็บ latency แยกตามคำสั่ง
+    stats = {}
+    errors = 0
+    started = time_module.perf_counter()
+    for line_number, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+        command = parts[0].upper()
+        op_start = time_module.perf_counter()
+        try:
+            result = process_command(hotel, command, parts[1:])
+            if hasattr(result, "__next__"):
+                # stream ถูกอ่านจนจบภายในเวลาของคำสั่ง: พิมพ์ทีละชิ้นถ้า echo มิฉะนั้นอ่านทิ้ง
+                if echo:
+                    print_result(result)
+                else:
+                    collections.deque(result, maxlen=0)
+                result = None
+        except (ValueError, TypeError) as e:
+            result = f"Error: line {line_number}: {e}"
+        elapsed = time_module.perf_counter() - op_start
+        op_stats = stats.get(command[0])
+        if op_stats is None:
+            op_stats = stats[command[0]] = FunctionStats()
+        op_stats.record(elapsed)
+        if isinstance(result, str) and result.startswith(("Error", "Invalid command")):
+            errors += 1
+            if not echo and hotel.verbose:
+                print(result, file=sys.stderr)
+        if echo and result is not None:
+            print(result)
+    return stats, errors, time_module.perf_counter() - started
+
+
+def print_script_summary(stats, errors, wall_time, file=sys.stdout):
+    total = sum(op_stats.calls for op_stats in stats.values())
+    print(f"\n{total} operations in {wall_time:.3f} seconds ({total / wall_time if wall_time else 0:.0f} ops/sec), {errors} errors", file=file)
+    for op in sorted(stats):
+        op_stats = stats[op]
+        print(f"{op} ({OPERATIONS.get(op, 'invalid')}): {op_stats.calls} ops, {op_stats.calls / op_stats.inclusive if op_stats.inclusive else 0:.0f} ops/sec, "
+              f"p50 {op_stats.percentile(0.50) * 1e6:.1f}us, p95 {op_stats.percentile(0.95) * 1e6:.1f}us, "
+              f"p99 {op_stats.percentile(0.99) * 1e6:.1f}us, max {op_stats.max * 1e6:.1f}us", file=file)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Hilbert's Infinite Hotel Management System")
+    parser.add_argument("--script", metavar="FILE", help="run one command per line from FILE ('-' for stdin) instead of the menu")
+    parser.add_argument("--quiet", action="store_true", help="silence the hotel's log messages")
+    parser.add_argument("--echo", action="store_true", help="print the result of every script command")
+    parser.add_argument("--no-metrics", action="store_true", help="disable per-function metrics while running")
+    parser.add_argument("--data-dir", help="open a journaled hotel from this data directory")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default=INTERACTIVE_DURABILITY,
+                        help="when journaled commands reach disk: 'sync' and 'group' wait for an fsync per command "
+                             "(a single writer never shares one), 'async' (default) fsyncs in the background every few "
+                             "milliseconds and can lose the last few milliseconds of commands in a crash")
+    parser.add_argument("--compact-room-ids", action="store_true", help="store channel rooms as base^exponent ids")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_arguments(argv)
+    # โหมด durability ของ journal ที่เปิดจาก --data-dir และจากเมนู (CLI มีผู้เขียนคนเดียว ค่าเริ่มต้นจึงเป็น "async")
+    durability = options.durability
+    if options.data_dir:
+        hotel = Hilberts.open_durable(options.data_dir, compact_room_ids=options.compact_room_ids, durability=durability)
+    else:
+        hotel = Hilberts(compact_room_ids=options.compact_room_ids)
+    hotel.verbose = not options.quiet
+    if options.no_metrics:
+        hotel.set_metrics_enabled(False)
+
+    if options.script:
+        try:
+            if options.script == '-':
+                stats, errors, wall_time = run_script(hotel, sys.stdin, options.echo)
+            else:
+                with open(options.script) as script:
+                    stats, errors, wall_time = run_script(hotel, script, options.echo)
+        finally:
+            hotel.close_journal()
+        print_script_summary(stats, errors, wall_time)
+        return 0
+
     while True:
         print("\n*** Hilbert's Infinite Hotel Management System ***")
         print("1. Initialize hotel with guests (I)")
@@ -60,21 +203,31 @@ def main():
         print("10. Show function execution times")
         print("11. Show hotel status")
         print("12. Move guest (V)")
+        print("13. Save snapshot")
+        print("14. Load snapshot")
+        print("15. Open journaled hotel (data directory)")
+        print("16. Compact journal")
+        print("17. Relocate all guests (T)")
+        print("18. Remove a range of rooms (D)")
+        print("19. Restore removed rooms (X)")
+        print("20. Find guests (Q)")
+        print("21. Register a new channel (N)")
         print("0. Exit")
         
-        choice = input("Enter your choice (0-12): ")
+        choice = input("Enter your choice (0-21): ")
         start_time = time_module.perf_counter()
 
         if choice == '0':
+            hotel.close_journal()
             print("Thank you for using Hilbert's Infinite Hotel Management System. Goodbye!")
-            break
+            return 0
             
         elif choice == '1':
             num_guests = input("Enter the number of initial guests: ")
             print(process_command(hotel, "I", [num_guests]))
             
         elif choice == '2':
-            channel = input("Enter one of these channels (Bus/Train/Plane/Ship): ")
+            channel = input(f"Enter one of these channels ({'/'.join(channel for channel in hotel.channels if channel != 'Original')}): ")
             num_guests = input(f"Enter number of guests for {channel} channel: ")
             print(process_command(hotel, "A", [channel, num_guests]))
                 
@@ -95,41 +248,104 @@ def main():
             print(process_command(hotel, "F", [room_number]))
             
         elif choice == '6':
-            chunk_size = input("Enter chunk size for sorting: ")
-            print(process_command(hotel, "S", [chunk_size]))
+            print_result(process_command(hotel, "S", []))
             
         elif choice == '7':
             print(process_command(hotel, "C", []))
             
         elif choice == '8':
             filename = input("Enter filename to save room data: ")
-            content = process_command(hotel, "W", [])
-            if content:
-                try:
-                    with open(filename, 'w', newline='') as file:
-                        file.write(content)
-                    print(f"Data successfully written to {filename}")
-                except IOError as e:
-                    print(f"Error writing to file: {e}")
-            else:
-                print("No data to write.")
+            try:
+                # เขียนลงไฟล์แบบ streaming ไม่ต้องสร้าง string ของทั้งไฟล์ในหน่วยความจำ
+                with open(filename, 'w', newline='') as file:
+                    hotel.export_csv(file)
+                print(f"Data successfully written to {filename}")
+            except IOError as e:
+                print(f"Error writing to file: {e}")
 
             
         elif choice == '9':
-            print(f"Current memory usage: {process_command(hotel, 'U', [])} bytes")
+            mode = input("Report mode (sampled/exact) [sampled]: ").strip() or "sampled"
+            try:
+                report = hotel.memory_report(mode)
+            except ValueError as e:
+                print(f"Error: {e}")
+            else:
+                for structure, size in report.items():
+                    print(f"{structure}: {size} bytes")
             
         elif choice == '10':
-            function_times = hotel.get_function_times()
-            for func, time in function_times.items():
-                print(f"{func}: {time} seconds")
+            for func, stats in hotel.get_function_stats().items():
+                print(f"{func}: {stats['inclusive_seconds']:.6f} seconds ({stats['calls']} calls, self {stats['self_seconds']:.6f}s, "
+                      f"p50 {stats['p50_seconds']:.6f}s, p95 {stats['p95_seconds']:.6f}s, p99 {stats['p99_seconds']:.6f}s, max {stats['max_seconds']:.6f}s, "
+                      f"{stats['items']} items)")
+            cache_stats = hotel.get_cache_stats()
+            print(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.1%} hit rate), "
+                  f"{cache_stats['entries']} entries, {cache_stats['bytes']} bytes")
  
         elif choice == '11':
-            print(hotel.get_hotel_status())
+            manual_page = input("Manual rooms page [1]: ").strip() or 1
+            print(hotel.get_hotel_status(manual_page))
 
         elif choice == '12':
             from_room = input("Enter the room number to move from: ")
             to_room = input("Enter the room number to move to: ")
             print(process_command(hotel, "V", [from_room, to_room]))
+
+        elif choice == '13':
+            path = input("Enter snapshot filename: ")
+            print(hotel.save_snapshot(path))
+
+        elif choice == '14':
+            path = input("Enter snapshot filename: ")
+            try:
+                restored = Hilberts.load_snapshot(path)
+                hotel.close_journal()
+                hotel = restored
+                print(f"Hotel restored from {path}")
+            except (OSError, ValueError) as e:
+                print(f"Error loading snapshot: {e}")
+
+        elif choice == '15':
+            directory = input("Enter data directory: ")
+            try:
+                restored = Hilberts.open_durable(directory, durability=durability)
+                hotel.close_journal()
+                hotel = restored
+                print(f"Hotel recovered from {directory} (journal at operation {hotel.journal.durable_sequence})")
+            except (OSError, ValueError) as e:
+                print(f"Error opening data directory: {e}")
+
+        elif choice == '16':
+            print(hotel.compact_journal())
+
+        elif choice == '17':
+            multiplier = input("Move every guest from room n to room multiplier * n + offset. Multiplier: ")
+            offset = input("Offset: ")
+            print(process_command(hotel, "T", [multiplier, offset]))
+
+        elif choice == '18':
+            lo = input("Enter the first room to remove: ")
+            hi = input("Enter the last room to remove: ")
+            print(process_command(hotel, "D", [lo, hi]))
+
+        elif choice == '19':
+            lo = input("Enter the first room to restore: ")
+            hi = input("Enter the last room to restore: ")
+            print(process_command(hotel, "X", [lo, hi]))
+
+        elif choice == '20':
+            options = input("Query options (channel=, manual=, prefix=, range=lo-hi, offset=, limit=): ").split()
+            result = process_command(hotel, "Q", options)
+            if isinstance(result, str):
+                print(result)
+            else:
+                for room, info in result:
+                    print(f"{room}: {info}")
+
+        elif choice == '21':
+            name = input("Enter the new channel name: ")
+            print(process_command(hotel, "N", [name]))
             
         else:
             print("Invalid choice. Please try again.")
@@ -139,4 +355,4 @@ def main():
         print(f"Current memory usage: {hotel.memory_usage()} bytes")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
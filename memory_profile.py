@@ -0,0 +1,61 @@
+import gc
+import pickle
+import sys
+import tracemalloc
+
+
+def deep_sizeof(obj, seen=None):
+    # ขนาดจริงของวัตถุรวมทุกอย่างที่อ้างถึง (นับวัตถุที่ใช้ร่วมกันครั้งเดียว)
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(vars(current))
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def traced_size(obj):
+    # สร้างสำเนาของโครงสร้างขึ้นมาใหม่ภายใต้ tracemalloc แล้ววัดหน่วยความจำที่จองจริง
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    gc.collect()
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        copy = pickle.loads(payload)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if started:
+            tracemalloc.stop()
+    del copy
+    return after - before
+
+
+def sampled_size(container, keys, total_count, seen=None):
+    # ประมาณขนาดของ key และ value ใน dict จากตัวอย่าง แล้วขยายผลตามจำนวนทั้งหมด
+    if not keys:
+        return 0, 0
+    seen = set() if seen is None else seen
+    key_bytes = sum(sys.getsizeof(key) for key in keys)
+    value_bytes = sum(deep_sizeof(container[key], seen) for key in keys)
+    scale = total_count / len(keys)
+    return int(key_bytes * scale), int(value_bytes * scale)
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+# ฮิสโตแกรมแบบ log: แบ่งแต่ละช่วงกำลังสองของนาโนวินาทีออกเป็น 8 ช่องย่อย (ความละเอียดราว 9%)
+_SUB_BUCKET_BITS = 3
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+
+
+def _bucket_index(nanoseconds):
+    if nanoseconds < _SUB_BUCKETS:
+        return nanoseconds
+    shift = nanoseconds.bit_length() - _SUB_BUCKET_BITS - 1
+    return ((shift + 1) << _SUB_BUCKET_BITS) + ((nanoseconds >> shift) & (_SUB_BUCKETS - 1))
+
+
+def _bucket_upper_bound(index):
+    if index < _SUB_BUCKETS:
+        return index
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    mantissa = (index & (_SUB_BUCKETS - 1)) | _SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class FunctionStats:
+    __slots__ = ("calls", "inclusive", "self_time", "max", "items", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.self_time = 0.0
+        self.max = 0.0
+        self.items = 0
+        self.histogram = {}
+
+    def record(self, elapsed, self_time=None):
+        self.calls += 1
+        self.inclusive += elapsed
+        self.self_time += elapsed if self_time is None else self_time
+        if elapsed > self.max:
+            self.max = elapsed
+        bucket = _bucket_index(int(elapsed * 1e9))
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.inclusive += other.inclusive
+        self.self_time += other.self_time
+        self.max = max(self.max, other.max)
+        self.items += other.items
+        for bucket, count in other.histogram.items():
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + count
+
+    def percentile(self, fraction):
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        seen = 0
+        for index in sorted(self.histogram):
+            seen += self.histogram[index]
+            if seen >= target:
+                return min(_bucket_upper_bound(index) / 1e9, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "inclusive_seconds": self.inclusive,
+            "self_seconds": self.self_time,
+            "p50_seconds": self.percentile(0.50),
+            "p95_seconds": self.percentile(0.95),
+            "p99_seconds": self.percentile(0.99),
+            "max_seconds": self.max,
+            "items": self.items,
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stats = {}
+        # stack ของ [เวลาที่ฟังก์ชันลูกใช้, จำนวน item] สำหรับแยก self time ออกจาก inclusive time (แยกต่อเธรด)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _frames(self):
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def enter(self):
+        frame = [0.0, 0]
+        self._frames.append(frame)
+        return frame
+
+    def exit(self, name, frame, elapsed):
+        frames = self._frames
+        frames.pop()
+        if frames:
+            frames[-1][0] += elapsed
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = FunctionStats()
+            stats.record(elapsed, elapsed - frame[0])
+            stats.items += frame[1]
+
+    def add_items(self, count):
+        # บันทึกจำนวน item ที่ฟังก์ชันที่กำลังทำงานอยู่ประมวลผล
+        frames = self._frames
+        if frames:
+            frames[-1][1] += count
+
+    def reset(self):
+        self.stats = {}
+
+    def as_dict(self):
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix="hilbert"):
+        names = sorted(self.stats)
+        families = [
+            ("function_calls_total", "counter", lambda stats: stats.calls),
+            ("function_seconds_total", "counter", lambda stats: f"{stats.inclusive:.9f}"),
+            ("function_self_seconds_total", "counter", lambda stats: f"{stats.self_time:.9f}"),
+            ("function_items_total", "counter", lambda stats: stats.items),
+        ]
+        lines = []
+        for family, kind, value in families:
+            lines.append(f"# TYPE {prefix}_{family} {kind}")
+            lines.extend(f'{prefix}_{family}{{function="{name}"}} {value(self.stats[name])}' for name in names)
+        lines.append(f"# TYPE {prefix}_function_latency_seconds summary")
+        for name in names:
+            stats = self.stats[name]
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'{prefix}_function_latency_seconds{{function="{name}",quantile="{quantile}"}} {stats.percentile(quantile):.9f}')
+            lines.append(f'{prefix}_function_latency_seconds{{function="{name}",quantile="1"}} {stats.max:.9f}')
+            lines.append(f'{prefix}_function_latency_seconds_sum{{function="{name}"}} {stats.inclusive:.9f}')
+            lines.append(f'{prefix}_function_latency_seconds_count{{function="{name}"}} {stats.calls}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, fmt="json"):
+        if fmt not in ("json", "prometheus"):
+            raise ValueError(f"Unknown metrics format: {fmt}")
+        content = self.to_json() if fmt == "json" else self.to_prometheus()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(content)
+        os.replace(temp_path, path)
+        return path
+
@@ -0,0 +1,74 @@
+import bisect
+import itertools
+import math
+import threading
+
+# ขนาดช่วงขั้นต่ำที่ตะแกรงขยายเพิ่มในแต่ละครั้ง
+SIEVE_SEGMENT = 1 << 16
+
+
+def integer_log(n, base):
+    # floor(log_base(n)) แบบไม่ใช้ทศนิยมในการตัดสินผลลัพธ์
+    if n < 1 or base < 2:
+        raise ValueError("integer_log requires n >= 1 and base >= 2")
+    if base == 2:
+        return n.bit_length() - 1
+    # ประมาณค่าจากจำนวนบิต แล้วแก้ให้ถูกต้องด้วย pow (ยกกำลังแบบ repeated squaring)
+    exponent = int((n.bit_length() - 1) / math.log2(base))
+    power = base ** exponent
+    while power > n:
+        power //= base
+        exponent -= 1
+    while power * base <= n:
+        power *= base
+        exponent += 1
+    return exponent
+
+
+def prime_power_exponent(n, base):
+    # คืนค่า k ถ้า n == base ** k (k >= 1) ไม่เช่นนั้นคืนค่า None
+    if n < base:
+        return None
+    if base == 2:
+        return n.bit_length() - 1 if n & (n - 1) == 0 else None
+    if n % base:
+        return None
+    exponent = integer_log(n, base)
+    return exponent if base ** exponent == n else None
+
+
+
+class PrimeSieve:
+    # จำนวนเฉพาะเรียงจากน้อยไปมาก คำนวณด้วยตะแกรงแบบแบ่งช่วง (segmented sieve) ที่ขยายเมื่อถูกขอจำนวนเฉพาะที่เกินที่มีอยู่
+    # ช่วงใหม่ [lo, hi) มี hi <= lo * lo จึงกรองด้วยจำนวนเฉพาะที่หาได้แล้วเท่านั้น
+    def __init__(self):
+        self.primes = []
+        self._limit = 2
+        self._lock = threading.Lock()
+
+    def _extend(self):
+        lo = self._limit
+        hi = min(lo * lo, 2 * lo + SIEVE_SEGMENT)
+        candidates = bytearray(b"\x01") * (hi - lo)
+        for prime in self.primes:
+            if prime * prime >= hi:
+                break
+            start = max(prime * prime, -(-lo // prime) * prime) - lo
+            candidates[start::prime] = bytes(len(range(start, hi - lo, prime)))
+        self.primes.extend(itertools.compress(range(lo, hi), candidates))
+        self._limit = hi
+
+    def prime_after(self, n):
+        # จำนวนเฉพาะตัวแรกที่มากกว่า n
+        with self._lock:
+            while not self.primes or self.primes[-1] <= n:
+                self._extend()
+            return self.primes[bisect.bisect_right(self.primes, n)]
+
+
+_SIEVE = PrimeSieve()
+
+
+def prime_after(n):
+    # ใช้ตะแกรงร่วมของทั้งโปรแกรม จำนวนเฉพาะที่เคยหาได้แล้วไม่ต้องคำนวณใหม่
+    return _SIEVE.prime_after(n)
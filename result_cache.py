@@ -0,0 +1,84 @@
+import sys
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def result_size(value):
+    # ขนาดโดยประมาณของผลลัพธ์: ตัว container รวมกับสมาชิก (หน้าห้องที่เรียงแล้วเป็น list ของ int/RoomId)
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class ResultCache:
+    # แคช LRU ของผลลัพธ์การอ่าน key = (operation, args, version) จำกัดทั้งจำนวนรายการและจำนวนไบต์
+    # เมื่อ version ของโรงแรมเปลี่ยน (มีการแก้ไข) รายการของ version เก่าจะถูกล้างทั้งหมดในการค้นครั้งถัดไป
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._version = None
+        # ผู้อ่านหลายเธรด (HotelEngine) ใช้แคชเดียวกันพร้อมกันได้
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._entries) + self.bytes
+
+    def get(self, key, version):
+        # คืนค่า (พบหรือไม่, ผลลัพธ์)
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, version, value):
+        size = result_size(value)
+        with self._lock:
+            if version != self._version or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,208 @@
+import decimal
+import math
+import sys
+from functools import total_ordering
+
+from prime_powers import integer_log, prime_power_exponent
+
+_HASH_MODULUS = sys.hash_info.modulus
+# ความคลาดเคลื่อนสัมพัทธ์ของ exponent * log(base) แบบ float อยู่ที่ไม่กี่ ulp จึงเผื่อไว้ประมาณ 20 ulp
+_LOG_TOLERANCE = 4e-15
+
+
+@total_ordering
+class RoomId:
+    # หมายเลขห้องแบบย่อ base ** exponent โดยไม่ต้องสร้างจำนวนเต็มขนาดใหญ่
+    __slots__ = ("base", "exponent")
+
+    def __init__(self, base, exponent):
+        self.base = int(base)
+        self.exponent = int(exponent)
+
+    def __int__(self):
+        return self.base ** self.exponent
+
+    def log(self):
+        return self.exponent * math.log(self.base)
+
+    def _compare(self, other):
+        if isinstance(other, RoomId):
+            if self.base == other.base:
+                return (self.exponent > other.exponent) - (self.exponent < other.exponent)
+            other_log = other.log()
+        elif isinstance(other, int):
+            if other < 1:
+                return 1
+            other_log = math.log(other)
+        else:
+            return NotImplemented
+        own_log = self.log()
+        if abs(own_log - other_log) > _LOG_TOLERANCE * max(own_log, other_log, 1.0):
+            return 1 if own_log > other_log else -1
+        if isinstance(other, RoomId):
+            # ทั้งสองฝั่งเป็น RoomId: เทียบ log ด้วยความละเอียดสูงแทนการสร้างจำนวนเต็มขนาดใหญ่
+            result = _compare_logs_precisely(self, other)
+            if result is not None:
+                return result
+        # ค่า log ใกล้กันเกินไป ต้องเทียบแบบจำนวนเต็มจริง
+        own, other = int(self), int(other)
+        return (own > other) - (own < other)
+
+    def __eq__(self, other):
+        if isinstance(other, RoomId):
+            if self.base == other.base:
+                return self.exponent == other.exponent
+            return self._compare(other) == 0
+        if isinstance(other, int):
+            return prime_power_exponent(other, self.base) == self.exponent if self.exponent > 0 else other == 1
+        return NotImplemented
+
+    def __lt__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result < 0
+
+    def __hash__(self):
+        # ให้ค่า hash ตรงกับ hash(int(self)) เพื่อใช้ปนกับ int ใน dict/set ได้
+        return pow(self.base, self.exponent, _HASH_MODULUS)
+
+    def __str__(self):
+        return f"{self.base}^{self.exponent}"
+
+    def __repr__(self):
+        return f"RoomId({self.base}, {self.exponent})"
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+
+@total_ordering
+class RoomCount:
+    # จำนวนห้อง int(high) - int(low) + constant ที่ใหญ่เกินกว่าจะสร้างเป็น int ได้ (high และ low เป็น RoomId, low อาจเป็น None)
+    # ใช้เป็นตัวเลขได้: บวกลบกับ int, เปรียบเทียบ และ int() เมื่อจำเป็น ส่วน str() แสดงเป็นนิพจน์ เช่น "2^1000000 - 17"
+    __slots__ = ("high", "low", "constant")
+
+    def __init__(self, high, low=None, constant=0):
+        self.high = high
+        self.low = low
+        self.constant = int(constant)
+
+    def __int__(self):
+        return int(self.high) - (0 if self.low is None else int(self.low)) + self.constant
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return RoomCount(self.high, self.low, self.constant + other)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, int):
+            return RoomCount(self.high, self.low, self.constant - other)
+        return NotImplemented
+
+    def _compare(self, other):
+        if isinstance(other, RoomCount):
+            if self.high == other.high and (self.low is None) == (other.low is None) and (self.low is None or self.low == other.low):
+                return (self.constant > other.constant) - (self.constant < other.constant)
+        elif isinstance(other, int):
+            if self.low is None:
+                # เทียบ high กับ other - constant แบบ RoomId โดยไม่สร้างจำนวนเต็มขนาดใหญ่
+                target = other - self.constant
+                return (self.high > target) - (self.high < target)
+        else:
+            return NotImplemented
+        own, other = int(self), int(other)
+        return (own > other) - (own < other)
+
+    def __eq__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result == 0
+
+    def __lt__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result < 0
+
+    def __hash__(self):
+        # ตรงกับ hash(int(self)) เหมือน RoomId
+        low = 0 if self.low is None else hash(self.low)
+        return (hash(self.high) - low + self.constant) % _HASH_MODULUS
+
+    def __bool__(self):
+        return self != 0
+
+    def __str__(self):
+        text = str(self.high) if self.low is None else f"{self.high} - {self.low}"
+        if self.constant:
+            text += f" {'+' if self.constant > 0 else '-'} {abs(self.constant)}"
+        return text
+
+    def __repr__(self):
+        return f"RoomCount({self.high!r}, {self.low!r}, {self.constant})"
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+def room_count(lo, hi, taken=0):
+    # จำนวนห้องใน [lo, hi] หลังหัก taken ห้อง: int เมื่อขอบเขตเป็น int และ RoomCount เมื่อขอบเขตเป็น RoomId
+    if not isinstance(hi, RoomId):
+        return int(hi) - int(lo) + 1 - taken
+    if not isinstance(lo, RoomId):
+        return RoomCount(hi, None, 1 - int(lo) - taken)
+    if lo == hi:
+        return 1 - taken
+    return RoomCount(hi, lo, 1 - taken)
+
+def _compare_logs_precisely(left, right):
+    for precision in (40, 80, 160):
+        with decimal.localcontext() as context:
+            context.prec = precision + len(str(max(left.exponent, right.exponent)))
+            difference = left.exponent * decimal.Decimal(left.base).ln() - right.exponent * decimal.Decimal(right.base).ln()
+            if abs(difference) > decimal.Decimal(10) ** -precision:
+                return 1 if difference > 0 else -1
+    return None
+
+
+def room_log(room):
+    if isinstance(room, RoomId):
+        return room.log()
+    return math.log(room) if room > 0 else float("-inf")
+
+
+def sort_rooms(rooms):
+    # เรียงด้วย log ก่อน (เร็ว) แล้วเก็บงานคู่ที่ค่าใกล้กันด้วยการเปรียบเทียบจริง ซึ่ง timsort ใช้แค่ O(n)
+    return sorted(sorted(rooms, key=room_log))
+
+
+def floor_log(room, base):
+    # k ที่มากที่สุดที่ base ** k <= room รองรับ RoomId โดยไม่สร้างจำนวนเต็มขนาดใหญ่
+    if not isinstance(room, RoomId):
+        return integer_log(room, base)
+    if room.base == base:
+        return room.exponent
+    exponent = int(room.log() / math.log(base))
+    while exponent > 0 and RoomId(base, exponent) > room:
+        exponent -= 1
+    while RoomId(base, exponent + 1) <= room:
+        exponent += 1
+    return exponent
+
+
+def ceil_log(room, base):
+    # k ที่น้อยที่สุดที่ base ** k >= room
+    if room <= 1:
+        return 0
+    exponent = floor_log(room, base)
+    return exponent if RoomId(base, exponent) == room else exponent + 1
+
+
+def parse_room(value):
+    # รับได้ทั้ง int, RoomId และข้อความเช่น "2^1000000"
+    if isinstance(value, RoomId):
+        return value
+    if isinstance(value, str) and "^" in value:
+        base, exponent = value.split("^", 1)
+        return RoomId(int(base), int(exponent))
+    return int(value)
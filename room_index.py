@@ -0,0 +1,427 @@
+import bisect
+import heapq
+import itertools
+import operator
+import random
+import sys
+import threading
+from array import array
+
+from room_id import RoomId, sort_rooms as sort_room_ids
+
+_KEY_LIMIT = 1 << 64
+POSTINGS_MIN_PENDING = 16
+
+
+class SortedRoomIndex:
+    # ดัชนีหมายเลขห้องแบบเรียงลำดับ: การเพิ่มเก็บไว้ใน buffer ก่อน แล้วค่อยรวมตอนอ่าน
+    # ผู้อ่านหลายเธรดอาจรวม buffer พร้อมกัน (การเขียนถูกกันด้วย lock ของผู้เรียกอยู่แล้ว)
+    # lock เป็นของคลาสเหมือน RoomPostings: ดัชนีจึง pickle ได้ (memory_report แบบ exact) และไม่มี lock ต่อดัชนี
+    _flush_lock = threading.Lock()
+
+    def __init__(self, rooms=()):
+        self._keys = self._sort(rooms)
+        self._pending = []
+
+    @staticmethod
+    def _sort(rooms):
+        rooms = list(rooms)
+        if any(isinstance(room, RoomId) for room in rooms):
+            return sort_room_ids(rooms)
+        rooms.sort()
+        return rooms
+
+    def _flush(self):
+        if self._pending:
+            with self._flush_lock:
+                if self._pending:
+                    # timsort รวมสอง run ที่เรียงแล้วได้ในเวลาเชิงเส้น
+                    self._keys.extend(self._sort(self._pending))
+                    self._keys.sort()
+                    self._pending = []
+
+    def add(self, room):
+        self._pending.append(room)
+
+    def add_many(self, rooms):
+        self._pending.extend(rooms)
+
+    def discard(self, room):
+        if self._pending:
+            try:
+                self._pending.remove(room)
+                return
+            except ValueError:
+                pass
+        index = bisect.bisect_left(self._keys, room)
+        if index < len(self._keys) and self._keys[index] == room:
+            del self._keys[index]
+
+    def __len__(self):
+        return len(self._keys) + len(self._pending)
+
+    def __iter__(self):
+        self._flush()
+        return iter(self._keys)
+
+    def __sizeof__(self):
+        # key เป็นวัตถุเดียวกับ key ของ dict ห้อง จึงนับเฉพาะตัว list
+        return object.__sizeof__(self) + sys.getsizeof(self._keys) + sys.getsizeof(self._pending)
+
+    def sample(self, count):
+        self._flush()
+        return random.sample(self._keys, min(count, len(self._keys)))
+
+    def count_range(self, lo, hi):
+        # จำนวนห้องใน [lo, hi] ด้วย bisect
+        self._flush()
+        return max(0, bisect.bisect_right(self._keys, hi) - bisect.bisect_left(self._keys, lo))
+
+    def irange(self, lo=None):
+        self._flush()
+        start = 0 if lo is None else bisect.bisect_left(self._keys, lo)
+        for index in range(start, len(self._keys)):
+            yield self._keys[index]
+
+
+class RoomPostings:
+    # ดัชนีเรียงของห้องแบบประหยัดหน่วยความจำ (ใช้เป็น posting list ของดัชนีรอง): int 64 บิตเก็บใน array("Q") 8 ไบต์ต่อห้อง
+    # ส่วน key อื่น (RoomId, int ใหญ่) เก็บใน SortedRoomIndex ที่สร้างเมื่อจำเป็น; การเพิ่มเก็บใน buffer แล้วค่อยรวม
+    # ดัชนีรองมี posting list จำนวนมาก จึงใช้ lock ร่วมกันตัวเดียวสำหรับการรวม buffer
+    _flush_lock = threading.Lock()
+
+    def __init__(self, rooms=()):
+        self._keys = array("Q")
+        self._pending = []
+        self._other = None
+        for room in rooms:
+            self.add(room)
+
+    def _flush(self):
+        if self._pending:
+            with self._flush_lock:
+                pending = self._pending
+                if pending:
+                    pending.sort()
+                    keys = self._keys
+                    if len(pending) * 8 > len(keys):
+                        merged = list(keys)
+                        merged += pending
+                        merged.sort()
+                        keys = array("Q", merged)
+                    else:
+                        # แทรกทีละช่วงด้วย bisect แล้วคัดลอกส่วนที่อยู่ระหว่างกันทั้งก้อน
+                        merged = array("Q")
+                        previous = 0
+                        for room in pending:
+                            position = bisect.bisect_left(keys, room, previous)
+                            merged += keys[previous:position]
+                            merged.append(room)
+                            previous = position
+                        merged += keys[previous:]
+                        keys = merged
+                    self._keys = keys
+                    self._pending = []
+
+    def add(self, room):
+        if type(room) is int and 0 <= room < _KEY_LIMIT:
+            self._pending.append(room)
+            # รวม buffer เข้า array เมื่อโตเกิน 1/8 ของ array เพื่อไม่ให้ int ที่ค้างอยู่ใช้หน่วยความจำมาก
+            if len(self._pending) > max(POSTINGS_MIN_PENDING, len(self._keys) >> 3):
+                self._flush()
+        else:
+            if self._other is None:
+                self._other = SortedRoomIndex()
+            self._other.add(room)
+
+    def discard(self, room):
+        if self._other:
+            before = len(self._other)
+            self._other.discard(room)
+            if len(self._other) != before:
+                return
+        if self._pending:
+            try:
+                self._pending.remove(room)
+                return
+            except ValueError:
+                pass
+        index = bisect.bisect_left(self._keys, room)
+        if index < len(self._keys) and self._keys[index] == room:
+            del self._keys[index]
+
+    def __len__(self):
+        return len(self._keys) + len(self._pending) + (len(self._other) if self._other else 0)
+
+    def count_range(self, lo, hi):
+        self._flush()
+        count = max(0, bisect.bisect_right(self._keys, hi) - bisect.bisect_left(self._keys, lo))
+        return count + (self._other.count_range(lo, hi) if self._other else 0)
+
+    def __iter__(self):
+        return self.irange()
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) + sys.getsizeof(self._keys) + sys.getsizeof(self._pending)
+                + sum(sys.getsizeof(room) for room in self._pending) + (sys.getsizeof(self._other) if self._other else 0))
+
+    def irange(self, lo=None):
+        self._flush()
+        keys = self._keys
+        start = 0 if lo is None else bisect.bisect_left(keys, lo)
+        column = map(keys.__getitem__, range(start, len(keys)))
+        if not self._other:
+            return column
+        return heapq.merge(column, self._other.irange(lo))
+
+
+class IntervalSet:
+    # เซตของจำนวนเต็มที่เก็บเป็นช่วงต่อเนื่อง [start, end] เรียงตาม start
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._size = 0
+        # ผลรวมสะสมของขนาดช่วง สร้างใหม่เมื่อมีการแก้ไขแล้วถูกนับครั้งถัดไป
+        self._prefix = None
+
+    def _find(self, room):
+        # ตำแหน่งของช่วงที่ start <= room (หรือ -1)
+        return bisect.bisect_right(self._starts, room) - 1
+
+    def __sizeof__(self):
+        size = object.__sizeof__(self) + sys.getsizeof(self._starts) + sys.getsizeof(self._ends)
+        size += sum(sys.getsizeof(value) for value in self._starts) + sum(sys.getsizeof(value) for value in self._ends)
+        return size + (sys.getsizeof(self._prefix) if self._prefix is not None else 0)
+
+    def run_containing(self, room):
+        index = self._find(room)
+        if index >= 0 and room <= self._ends[index]:
+            return self._starts[index], self._ends[index]
+        return None
+
+    def __contains__(self, room):
+        index = self._find(room)
+        return index >= 0 and room <= self._ends[index]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def runs(self, lo=None, hi=None):
+        # ช่วงทั้งหมด หรือเฉพาะส่วนที่อยู่ใน [lo, hi] (ตัดปลายช่วงให้อยู่ในขอบเขต)
+        if lo is None:
+            return zip(self._starts, self._ends)
+        first = bisect.bisect_left(self._ends, lo)
+        last = bisect.bisect_right(self._starts, hi)
+        return [(max(start, lo), min(end, hi)) for start, end in zip(self._starts[first:last], self._ends[first:last])]
+
+    def last(self):
+        return self._ends[-1] if self._ends else None
+
+    def columns(self):
+        # รายการ start และ end ของทุกช่วง (เรียงแล้ว) สำหรับเขียน snapshot
+        return self._starts, self._ends
+
+    @classmethod
+    def from_runs(cls, starts, ends):
+        # สร้างจากช่วงที่เรียงแล้วและไม่ทับหรือติดกัน (เช่นอ่านจาก snapshot) โดยไม่ merge ทีละช่วง
+        result = cls()
+        result._starts = list(starts)
+        result._ends = list(ends)
+        result._size = sum(map(operator.sub, result._ends, result._starts)) + len(result._starts)
+        return result
+
+    def transformed(self, multiplier, offset):
+        # เซตของ multiplier * x + offset: ถ้า multiplier = 1 เลื่อนทั้งช่วง ไม่อย่างนั้นทุกค่าแยกเป็นช่วงเดี่ยว (ห่างกันเกิน 1)
+        result = IntervalSet()
+        if multiplier == 1:
+            result._starts = [start + offset for start in self._starts]
+            result._ends = [end + offset for end in self._ends]
+        else:
+            result._starts = [multiplier * value + offset for value in self]
+            result._ends = list(result._starts)
+        result._size = self._size
+        return result
+
+    def add(self, room):
+        self.add_range(room, room)
+
+    def discard(self, room):
+        self.remove_range(room, room)
+
+    def add_range(self, lo, hi):
+        if lo > hi:
+            return
+        # รวมทุกช่วงที่ทับหรือติดกับ [lo, hi]
+        first = bisect.bisect_left(self._ends, lo - 1)
+        last = bisect.bisect_right(self._starts, hi + 1)
+        if first < last:
+            lo = min(lo, self._starts[first])
+            hi = max(hi, self._ends[last - 1])
+            self._size -= sum(end - start + 1 for start, end in zip(self._starts[first:last], self._ends[first:last]))
+        self._starts[first:last] = [lo]
+        self._ends[first:last] = [hi]
+        self._size += hi - lo + 1
+        self._prefix = None
+
+    def remove_range(self, lo, hi):
+        if lo > hi:
+            return
+        first = bisect.bisect_left(self._ends, lo)
+        last = bisect.bisect_right(self._starts, hi)
+        if first >= last:
+            return
+        new_starts = []
+        new_ends = []
+        if self._starts[first] < lo:
+            new_starts.append(self._starts[first])
+            new_ends.append(lo - 1)
+        if self._ends[last - 1] > hi:
+            new_starts.append(hi + 1)
+            new_ends.append(self._ends[last - 1])
+        self._size -= sum(end - start + 1 for start, end in zip(self._starts[first:last], self._ends[first:last]))
+        self._size += sum(end - start + 1 for start, end in zip(new_starts, new_ends))
+        self._starts[first:last] = new_starts
+        self._ends[first:last] = new_ends
+        self._prefix = None
+
+    def add_many(self, rooms):
+        # เพิ่มหลายค่าในรอบเดียว: สร้างช่วงจากค่าที่เรียงแล้ว แล้ว merge กับช่วงเดิมแบบเชิงเส้น
+        starts, ends = _runs(sorted(rooms))
+        if not starts:
+            return
+        if len(starts) * 8 <= len(self._starts):
+            self._splice_runs(starts, ends)
+            return
+        self._prefix = None
+        if not self._ends or starts[0] > self._ends[-1] + 1:
+            # ทุกช่วงใหม่อยู่หลังช่วงเดิมทั้งหมดและไม่ติดกัน ต่อท้ายได้เลย
+            self._starts = self._starts + starts
+            self._ends = self._ends + ends
+            self._size += sum(map(operator.sub, ends, starts)) + len(starts)
+            return
+        # timsort รวมสองลำดับที่เรียงแล้วได้ในเวลาเชิงเส้น ลำดับของ start ใช้จัด end ตามไปด้วย
+        starts = self._starts + starts
+        ends = self._ends + ends
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        starts = list(map(starts.__getitem__, order))
+        ends = list(map(ends.__getitem__, order))
+        breaks = list(map((1).__lt__, map(operator.sub, starts[1:], ends[:-1])))
+        if not all(breaks):
+            # ปลายที่ไกลที่สุดจนถึงช่วงนั้น: ช่วงใหม่เริ่มเมื่อ start ห่างจากปลายของช่วงก่อนหน้าเกิน 1
+            reach = list(itertools.accumulate(ends, max))
+            breaks = list(map((1).__lt__, map(operator.sub, starts[1:], reach[:-1])))
+            starts = [starts[0]] + list(itertools.compress(starts[1:], breaks))
+            ends = list(itertools.compress(reach[:-1], breaks)) + [reach[-1]]
+        self._starts = starts
+        self._ends = ends
+        self._size = sum(map(operator.sub, ends, starts)) + len(starts)
+
+    def _splice_runs(self, starts, ends):
+        # แทรกช่วงใหม่ที่มีน้อย (เรียงแล้ว) ลงในรายการช่วงเดิมในรอบเดียว: คัดลอกช่วงเดิมเป็นชิ้นๆ ระหว่างตำแหน่งที่แทรก
+        # แทนการเรียก add_range ทีละช่วงซึ่งเลื่อนรายการทั้งรายการทุกครั้ง
+        old_starts, old_ends = self._starts, self._ends
+        new_starts, new_ends = [], []
+        previous = 0
+        for lo, hi in zip(starts, ends):
+            # สมาชิกที่มีอยู่แล้วในช่วงนี้ (ไม่ถูกนับซ้ำใน _size)
+            first = bisect.bisect_left(old_ends, lo)
+            last = bisect.bisect_right(old_starts, hi)
+            self._size += hi - lo + 1 - sum(min(hi, end) - max(lo, start) + 1
+                                             for start, end in zip(old_starts[first:last], old_ends[first:last]))
+            # ช่วงเดิมที่ทับหรือติดกับช่วงใหม่ถูกรวมเป็นช่วงเดียว
+            first = bisect.bisect_left(old_ends, lo - 1, previous)
+            last = bisect.bisect_right(old_starts, hi + 1, first)
+            new_starts += old_starts[previous:first]
+            new_ends += old_ends[previous:first]
+            if first < last:
+                lo = min(lo, old_starts[first])
+                hi = max(hi, old_ends[last - 1])
+                previous = last
+            else:
+                previous = first
+            if new_ends and lo <= new_ends[-1] + 1:
+                new_ends[-1] = max(new_ends[-1], hi)
+            else:
+                new_starts.append(lo)
+                new_ends.append(hi)
+        new_starts += old_starts[previous:]
+        new_ends += old_ends[previous:]
+        self._starts = new_starts
+        self._ends = new_ends
+        self._prefix = None
+
+    def remove_many(self, rooms):
+        values = sorted(set(rooms))
+        if len(values) * 16 < len(self._starts):
+            for lo, hi in zip(*_runs(values)):
+                self.remove_range(lo, hi)
+            return
+        starts = []
+        ends = []
+        index = 0
+        for start, end in zip(self._starts, self._ends):
+            while index < len(values) and values[index] < start:
+                index += 1
+            current = start
+            while index < len(values) and values[index] <= end:
+                if values[index] > current:
+                    starts.append(current)
+                    ends.append(values[index] - 1)
+                current = values[index] + 1
+                index += 1
+            if current <= end:
+                starts.append(current)
+                ends.append(end)
+        self._starts = starts
+        self._ends = ends
+        self._size = sum(end - start + 1 for start, end in zip(starts, ends))
+        self._prefix = None
+
+    def rank(self, room):
+        # จำนวนสมาชิกที่ <= room
+        prefix = self._prefix
+        if prefix is None:
+            # สร้างในตัวแปรท้องถิ่นก่อน ผู้อ่านเธรดอื่นจะไม่เห็น prefix ที่ยังสร้างไม่เสร็จ
+            total = 0
+            prefix = [0]
+            for start, end in zip(self._starts, self._ends):
+                total += end - start + 1
+                prefix.append(total)
+            self._prefix = prefix
+        index = self._find(room)
+        if index < 0:
+            return 0
+        return prefix[index] + min(room, self._ends[index]) - self._starts[index] + 1
+
+    def count_range(self, lo, hi):
+        # จำนวนสมาชิกใน [lo, hi]
+        if lo > hi:
+            return 0
+        return self.rank(hi) - self.rank(lo - 1)
+
+    def next_missing(self, room):
+        # จำนวนเต็มที่น้อยที่สุดที่ >= room และไม่อยู่ในเซต
+        run = self.run_containing(room)
+        return room if run is None else run[1] + 1
+
+    def previous_missing(self, room):
+        # จำนวนเต็มที่มากที่สุดที่ <= room และไม่อยู่ในเซต
+        run = self.run_containing(room)
+        return room if run is None else run[0] - 1
+
+
+def _runs(values):
+    # แปลงจำนวนเต็มที่เรียงแล้ว (ซ้ำกันได้) เป็นช่วงต่อเนื่อง คืนรายการ start และ end ของแต่ละช่วง
+    # ช่วงใหม่เริ่มที่ค่าที่ห่างจากค่าก่อนหน้าเกิน 1 (หาด้วย map/compress ทั้งรายการ ไม่วนทีละค่า)
+    if not values:
+        return [], []
+    breaks = list(map((1).__lt__, map(operator.sub, values[1:], values[:-1])))
+    starts = [values[0]]
+    starts += itertools.compress(values[1:], breaks)
+    ends = list(itertools.compress(values[:-1], breaks))
+    ends.append(values[-1])
+    return starts, ends
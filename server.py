@@ -0,0 +1,337 @@
+from hilbert import *
+from main import process_command
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import sys
+import time as time_module
+
+# โปรโตคอล: คำขอหนึ่งบรรทัด "<id> <คำสั่ง> [args...]" (รูปแบบเดียวกับ --script)
+# คำตอบเป็น frame: บรรทัดหัว "<id> <status> <length>" ตามด้วย payload ยาว length ไบต์
+# status: OK = ผลลัพธ์เดียว, ERR = ข้อผิดพลาด, DATA = ชิ้นหนึ่งของผลลัพธ์แบบ stream, END = stream จบแล้ว
+STATUS_OK = "OK"
+STATUS_ERROR = "ERR"
+STATUS_DATA = "DATA"
+STATUS_END = "END"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 1024
+DEFAULT_STREAM_ROWS = 4096
+
+
+def encode_frame(request_id, status, payload=""):
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    return f"{request_id} {status} {len(data)}\n".encode("ascii") + data
+
+
+async def read_frame(reader):
+    header = await reader.readline()
+    if not header:
+        return None
+    request_id, status, length = header.decode("ascii").split()
+    payload = await reader.readexactly(int(length)) if int(length) else b""
+    return request_id, status, payload.decode("utf-8")
+
+
+def format_result(result):
+    if isinstance(result, str):
+        return result
+    if isinstance(result, (list, tuple)):
+        return "\n".join(map(str, result))
+    return str(result)
+
+
+class RoomStream:
+    # ผลลัพธ์แบบ stream ที่ task ของ connection ส่งเอง (ไม่ใช่ batcher) ลูกค้าที่อ่านช้าจึงไม่หยุดคำขอของ connection อื่น
+    # แต่ละชิ้นอ่านจากโรงแรมใหม่ต่อจากห้องสุดท้ายที่ส่งแล้ว ไม่ถือ iterator ของโรงแรมค้างไว้ระหว่างรอ drain
+    # ห้องที่ส่งจึงเรียงและไม่ซ้ำเสมอ ส่วนการแก้ไขที่เกิดระหว่าง stream อาจปรากฏหรือไม่ก็ได้
+    def __init__(self, hotel, rows, start=0, count=None, csv_rows=False):
+        self.hotel = hotel
+        self.rows = rows
+        self.start = start
+        self.remaining = count
+        self.csv_rows = csv_rows
+        self.after = None
+        self.started = False
+
+    def next_chunk(self):
+        # ชิ้นถัดไปเป็นข้อความ หรือ None เมื่อ stream จบแล้ว
+        rows = self.rows if self.remaining is None else min(self.rows, self.remaining)
+        if self.after is None and self.start:
+            # ตำแหน่งเริ่มต้นของหน้าใช้ได้เฉพาะชิ้นแรก ชิ้นต่อไปอ้างอิงจากห้องสุดท้ายที่ส่งแล้ว
+            entries = [(room, None) for room in itertools.islice(self.hotel.iter_sorted_rooms(self.start), rows)]
+        elif rows:
+            after = self.after
+            entries = self.hotel.iter_query(room_range=(after, None))
+            if after is not None:
+                entries = itertools.dropwhile(lambda entry: entry[0] <= after, entries)
+            entries = list(itertools.islice(entries, rows))
+        else:
+            entries = []
+        if not entries and (self.started or not self.csv_rows):
+            return None
+        output = io.StringIO()
+        if self.csv_rows:
+            writer = csv.writer(output)
+            if not self.started:
+                writer.writerow(["Room Number", "Channel Info"])
+            writer.writerows((room, self._label(info)) for room, info in entries)
+        else:
+            output.write("".join(f"{room}\n" for room, _ in entries))
+        self.started = True
+        if entries:
+            self.after = entries[-1][0]
+        if self.remaining is not None:
+            self.remaining -= len(entries)
+        return output.getvalue()
+
+    def _label(self, info):
+        if info["channel"] == "Manual":
+            return f"Manual - {info['manual_channel']}"
+        return self.hotel.channel_to_vehicle_numbers(info["channel"])
+
+
+# คำสั่งที่ผลลัพธ์อาจใหญ่มาก: ส่งกลับเป็น stream ทีละชิ้นแทนการสร้างผลลัพธ์ทั้งก้อน
+def _stream_sorted_rooms(hotel, args, rows):
+    if args:
+        raise ValueError("Sort rooms command takes no arguments")
+    # ทุกชิ้นมีไม่เกิน rows ห้อง หน่วยความจำจึงจำกัดอยู่แล้ว
+    return RoomStream(hotel, rows)
+
+
+def _stream_sorted_page(hotel, args, rows):
+    if len(args) != 2:
+        raise ValueError("Sorted page command requires start and count")
+    start, count = int(args[0]), int(args[1])
+    return RoomStream(hotel, rows, max(start, 0), max(count, 0))
+
+
+def _stream_csv(hotel, args, rows):
+    return RoomStream(hotel, rows, csv_rows=True)
+
+
+STREAMS = {
+    'S': _stream_sorted_rooms,
+    'P': _stream_sorted_page,
+    'W': _stream_csv,
+}
+
+
+def is_error(result):
+    return isinstance(result, str) and result.startswith(("Error", "Invalid command"))
+
+
+class HotelServer:
+    # ทุกคำขอจากทุก connection เข้าคิวเดียว แล้วถูกนำไปใช้กับโรงแรมทีละ micro-batch บน event loop
+    # (โรงแรมถูกแตะบน event loop เดียวและไม่มีการรอกลางการอ่านหรือแก้ไข จึงไม่ต้องใช้ lock) ส่วน journal ทำ fsync ครั้งเดียวต่อ batch
+    def __init__(self, hotel, max_batch=DEFAULT_MAX_BATCH, stream_rows=DEFAULT_STREAM_ROWS):
+        self.hotel = hotel
+        self.max_batch = max_batch
+        self.stream_rows = stream_rows
+        self.requests = 0
+        self.batches = 0
+        self._queue = None
+        self._batcher = None
+        # task ของ stream ที่กำลังส่งแยกตาม connection และ connection ที่รอปิดหลัง stream ของตัวเองจบ
+        self._streams = {}
+        self._closing = set()
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        if path:
+            return await asyncio.start_unix_server(self._handle_client, path=path)
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        for tasks in list(self._streams.values()):
+            for task in list(tasks):
+                task.cancel()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode("utf-8").split()
+                if not parts:
+                    continue
+                if len(parts) < 2:
+                    await self._queue.put((parts[0], None, None, writer))
+                else:
+                    await self._queue.put((parts[0], parts[1].upper(), parts[2:], writer))
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        # ปิด connection หลังจากคำขอที่ค้างอยู่ในคิวได้รับคำตอบแล้ว
+        await self._queue.put((None, None, None, writer))
+
+    async def _run_batches(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.batches += 1
+            try:
+                await self._apply_batch(batch)
+            except Exception as e:
+                # batch ที่ผิดพลาดต้องไม่หยุด batcher มิฉะนั้นคำขอถัดไปของทุก connection จะค้างตลอดไป
+                print(f"Error: Batch failed: {e!r}", file=sys.stderr)
+
+    async def _apply_batch(self, batch):
+        replies = []
+        journal = self.hotel.journal
+        if journal is not None:
+            journal.defer_acknowledgements()
+        try:
+            for index, (request_id, command, args, writer) in enumerate(batch):
+                if request_id is None:
+                    replies.append((writer, None))
+                    continue
+                self.requests += 1
+                if command in STREAMS:
+                    try:
+                        stream = STREAMS[command](self.hotel, args, self.stream_rows)
+                    except (ValueError, TypeError) as e:
+                        replies.append((writer, encode_frame(request_id, STATUS_ERROR, f"Error: {e}")))
+                        continue
+                    # คำตอบก่อนหน้าใน batch ส่ง (และถึงดิสก์) ก่อนเริ่ม stream เพื่อรักษาลำดับ
+                    await self._send_replies(replies, journal)
+                    replies = []
+                    if journal is not None:
+                        journal.defer_acknowledgements()
+                    self._start_stream(request_id, stream, writer)
+                    continue
+                replies.append((writer, self._execute(request_id, command, args)))
+        finally:
+            await self._send_replies(replies, journal)
+
+    def _execute(self, request_id, command, args):
+        if command is None:
+            return encode_frame(request_id, STATUS_ERROR, "Error: Request requires an id and a command")
+        try:
+            result = process_command(self.hotel, command, args)
+            return encode_frame(request_id, STATUS_ERROR if is_error(result) else STATUS_OK, format_result(result))
+        except Exception as e:
+            # รวมถึงผลลัพธ์ที่แปลงเป็นข้อความไม่ได้ (เช่นจำนวนเต็มที่ยาวเกินขีดจำกัดของ str)
+            return encode_frame(request_id, STATUS_ERROR, f"Error: {e}")
+
+    async def _send_replies(self, replies, journal):
+        # คำตอบของการแก้ไขส่งได้หลัง record ใน journal ถึงดิสก์แล้วเท่านั้น (รอ fsync ครั้งเดียวต่อ batch)
+        if journal is not None:
+            sequence = journal.take_deferred_acknowledgement()
+            if sequence:
+                await asyncio.get_running_loop().run_in_executor(None, journal.wait_durable, sequence)
+        writers = []
+        for writer, frame in replies:
+            if writer.is_closing():
+                continue
+            if frame is None:
+                if writer in self._streams:
+                    self._closing.add(writer)
+                else:
+                    writer.close()
+                continue
+            writer.write(frame)
+            # connection ที่มี stream อยู่ให้ task ของ stream รอ drain แทน batcher
+            if writer not in writers and writer not in self._streams:
+                writers.append(writer)
+        for writer in writers:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                writer.close()
+
+    def _start_stream(self, request_id, stream, writer):
+        task = asyncio.create_task(self._stream(request_id, stream, writer))
+        self._streams.setdefault(writer, set()).add(task)
+        task.add_done_callback(lambda task: self._stream_done(writer, task))
+
+    def _stream_done(self, writer, task):
+        tasks = self._streams[writer]
+        tasks.discard(task)
+        if not tasks:
+            del self._streams[writer]
+            if writer in self._closing:
+                self._closing.discard(writer)
+                writer.close()
+
+    async def _stream(self, request_id, stream, writer):
+        # รอ drain ทุกชิ้น (backpressure) เฉพาะ connection นี้ ระหว่างนั้น batcher ทำคำขออื่นต่อได้
+        journal = self.hotel.journal
+        loop = asyncio.get_running_loop()
+        try:
+            while not writer.is_closing():
+                chunk = stream.next_chunk()
+                # ชิ้นที่อ่านหลังการแก้ไขส่งได้เมื่อ record ของการแก้ไขนั้นถึงดิสก์แล้ว (เหมือนคำตอบทั่วไป)
+                if journal is not None and journal.durable_sequence < journal.buffered_sequence:
+                    await loop.run_in_executor(None, journal.wait_durable, journal.buffered_sequence)
+                if chunk is None:
+                    writer.write(encode_frame(request_id, STATUS_END))
+                    await writer.drain()
+                    return
+                writer.write(encode_frame(request_id, STATUS_DATA, chunk))
+                await writer.drain()
+        except ConnectionError:
+            writer.close()
+        except Exception as e:
+            if not writer.is_closing():
+                writer.write(encode_frame(request_id, STATUS_ERROR, f"Error: {e}"))
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a Hilbert's hotel over TCP or a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="most requests applied per micro-batch")
+    parser.add_argument("--quiet", action="store_true", help="silence the hotel's log messages")
+    parser.add_argument("--no-metrics", action="store_true", help="disable per-function metrics while serving")
+    parser.add_argument("--data-dir", help="open a journaled hotel from this data directory")
+    parser.add_argument("--compact-room-ids", action="store_true", help="store channel rooms as base^exponent ids")
+    return parser.parse_args(argv)
+
+
+async def serve(options):
+    if options.data_dir:
+        hotel = Hilberts.open_durable(options.data_dir, compact_room_ids=options.compact_room_ids)
+    else:
+        hotel = Hilberts(compact_room_ids=options.compact_room_ids)
+    hotel.verbose = not options.quiet
+    if options.no_metrics:
+        hotel.set_metrics_enabled(False)
+    service = HotelServer(hotel, options.max_batch)
+    server = await service.start(options.host, options.port, options.unix)
+    print(f"Serving hotel on {options.unix or f'{options.host}:{options.port}'}", file=sys.stderr)
+    started = time_module.perf_counter()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        hotel.close_journal()
+        elapsed = time_module.perf_counter() - started
+        print(f"{service.requests} requests in {service.batches} batches "
+              f"({service.requests / service.batches if service.batches else 0:.1f} per batch, "
+              f"{service.requests / elapsed if elapsed else 0:.0f} requests/sec)", file=sys.stderr)
+
+
+def main(argv=None):
+    options = parse_arguments(argv)
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,629 @@
+import bisect
+import csv
+import heapq
+import io
+import itertools
+import multiprocessing
+import os
+
+from hilbert import DEFAULT_CHANNELS, DEFAULT_STATUS_PAGE_SIZE, Hilberts
+from journal import decode_value, encode_value
+from room_id import parse_room, room_count
+
+SHARD_BY_CHANNEL = "channel"
+SHARD_BY_RANGE = "range"
+DEFAULT_SHARD_RANGE = 1 << 20
+DEFAULT_PAGE_ROWS = 4096
+# การย้ายแขกข้าม shard ที่เริ่มแล้วแต่ยังไม่จบ (อยู่ใน data_dir ของ coordinator)
+MOVE_INTENT_FILE = "move.intent"
+SUGGESTION_COUNT = 10
+_SUGGESTION_MARK = " Suggested unoccupied rooms: "
+# คำสั่งที่ส่งไป shard เดียวตามห้อง (อาร์กิวเมนต์แรกคือหมายเลขห้อง) รวมเป็น batch ต่อ shard ได้ใน run_batch
+ROOM_ROUTED = frozenset({"add_room_manual", "remove_room", "find_room"})
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+# คำสั่งเสริมที่ worker ทำกับ Hilberts ของตัวเอง (นอกเหนือจากเมธอดของ Hilberts ที่เรียกตามชื่อได้เลย)
+def _owned_page(hotel, lo, hi, count):
+    # แขกในช่วง [lo, hi] เรียงตามห้องไม่เกิน count คน: [(room, {"channel", "guest_info"[, "manual_channel"]})]
+    return list(itertools.islice(hotel.iter_query(room_range=(lo, hi)), count))
+
+
+def _owned_summary(hotel, lo, hi):
+    active_channels = hotel._active_channels()
+    # แขกของช่องทางที่ยังอยู่ในห้องที่ถูกลบ (ไม่ถูกนับใน count_occupied แต่นับในจำนวนห้องที่มีแขกของสถานะ)
+    hidden = 0
+    for channel in active_channels:
+        exponents = hotel._channel_exponents(channel, lo, hi)
+        last = min(exponents.stop - 1, hotel.guests_per_channel[channel])
+        if exponents.start <= last:
+            hidden += hotel.removed_powers[channel].count_range(exponents.start, last)
+    return {
+        "guests": {channel: hotel.guests_per_channel[channel] for channel in active_channels},
+        "occupied": hotel.count_occupied(lo, hi),
+        "hidden": hidden,
+        "removed": len(hotel.removed_rooms),
+        "manual": hotel.rooms.count_channel("Manual"),
+    }
+
+
+def _owned_query(hotel, lo, hi, channel, guest_prefix, manual_channel, limit):
+    return hotel.query(channel, (lo, hi), guest_prefix, manual_channel, 0, limit)
+
+
+def _owned_counts(hotel, lo, hi):
+    return hotel.count_occupied(lo, hi), hotel._count_removed(lo, hi)
+
+
+def _channel_rooms(hotel, channel):
+    # ห้อง materialized และห้องที่ถูกลบที่อยู่บนลำดับเลขยกกำลังของช่องทาง (ต้องย้ายไป shard ของช่องทางเมื่อลงทะเบียน)
+    materialized = sorted(hotel.materialized_powers[channel].values())
+    removed = []
+    last = hotel.removed_rooms.last()
+    if last is not None:
+        for exponent in hotel._channel_exponents(channel, 1, last):
+            room = hotel._channel_room(channel, exponent)
+            if room in hotel.removed_rooms:
+                removed.append(room)
+    return materialized, removed
+
+
+def _is_occupied(hotel, room_number):
+    return hotel._is_occupied(hotel._room_key(room_number))
+
+
+def _guest_at(hotel, room_number):
+    # ข้อมูลแขกที่ hand_off_guest จะคืน (None ถ้าห้องว่าง) โดยไม่แก้ไขโรงแรม
+    room_number = hotel._room_key(room_number)
+    if not hotel._is_occupied(room_number):
+        return None
+    if room_number in hotel.rooms:
+        return hotel.rooms[room_number].as_dict()
+    channel, exponent = hotel._channel_guest_at(room_number)
+    return {"channel": channel, "guest_info": hotel._channel_guest_info(channel, exponent)}
+
+
+def _raise_highest(hotel, room_number):
+    hotel.update_highest_occupied_room(room_number)
+
+
+def _attribute(hotel, name):
+    return getattr(hotel, name)
+
+
+SHARD_COMMANDS = {
+    "owned_page": _owned_page,
+    "owned_summary": _owned_summary,
+    "owned_query": _owned_query,
+    "owned_counts": _owned_counts,
+    "channel_rooms": _channel_rooms,
+    "is_occupied": _is_occupied,
+    "guest_at": _guest_at,
+    "raise_highest": _raise_highest,
+    "attribute": _attribute,
+}
+
+
+def _serve_shard(connection, data_dir):
+    # ลูปของ worker: รับ list ของ (คำสั่ง, args) ต่อข้อความ ทำตามลำดับ แล้วตอบ (ผลลัพธ์, ห้องสูงสุดของ shard)
+    hotel = Hilberts.open_durable(data_dir) if data_dir else Hilberts()
+    hotel.verbose = False
+    try:
+        while True:
+            commands = connection.recv()
+            if commands is None:
+                break
+            results = []
+            for name, args in commands:
+                try:
+                    command = SHARD_COMMANDS.get(name)
+                    results.append(command(hotel, *args) if command else getattr(hotel, name)(*args))
+                except Exception as e:
+                    results.append(ShardError(f"{name} failed: {type(e).__name__}: {e}"))
+            connection.send((results, hotel.highest_occupied_room))
+    finally:
+        hotel.close_journal()
+        connection.close()
+
+
+class ShardedHotel:
+    # โรงแรมที่แบ่งห้องให้ worker หลาย process (แต่ละ process มี Hilberts และ GIL ของตัวเอง) โดยมี coordinator นี้เป็นผู้ส่งต่อคำสั่ง
+    # shard_by="channel": ห้องของช่องทาง (base ** k ทุก k) อยู่ที่ shard ของช่องทางนั้น ห้องอื่นอยู่ shard ที่ room % shards
+    # shard_by="range": shard i ดูแลห้อง (bounds[i-1], bounds[i]] (shard สุดท้ายไม่มีขอบบน) แขกของช่องทางเป็นเพียงตัวนับ
+    #   จึงเพิ่มในทุก shard และแต่ละ shard ตอบเฉพาะห้องในช่วงของตัวเอง
+    # ทุก shard ลงทะเบียนช่องทางเดียวกันตามลำดับเดียวกัน ฐานของช่องทางจึงตรงกันทุก shard
+    # ถ้าระบุ data_dir แต่ละ shard เป็นโรงแรมแบบ journaled ใน data_dir/shard-NNN (เปิดซ้ำต้องใช้ shards/shard_by/bounds เดิม)
+    def __init__(self, shards=None, shard_by=SHARD_BY_CHANNEL, bounds=None, range_size=DEFAULT_SHARD_RANGE, data_dir=None,
+                 page_rows=DEFAULT_PAGE_ROWS):
+        if shard_by not in (SHARD_BY_CHANNEL, SHARD_BY_RANGE):
+            raise ValueError(f"shard_by must be {SHARD_BY_CHANNEL!r} or {SHARD_BY_RANGE!r}")
+        shards = int(shards or os.cpu_count() or 1)
+        if shard_by == SHARD_BY_RANGE:
+            bounds = sorted(int(bound) for bound in bounds) if bounds is not None else [int(range_size) * i for i in range(1, shards)]
+            shards = len(bounds) + 1
+        if shards < 1:
+            raise ValueError("A sharded hotel needs at least one shard")
+        self.shards = shards
+        self.shard_by = shard_by
+        self.bounds = bounds
+        self.page_rows = page_rows
+        self.verbose = True
+        self._intent_path = os.path.join(data_dir, MOVE_INTENT_FILE) if data_dir else None
+        # ทะเบียนช่องทางของ coordinator (ไม่มีแขก) ใช้ถอดรหัสห้องของช่องทางและสร้างรหัสยานพาหนะ
+        self.registry = Hilberts(verbose=False)
+        self._channel_shards = {}
+        self.highest_occupied_room = 0
+        # ห้องสูงสุดที่แต่ละ shard รู้ (remove_room ของ shard เทียบกับห้องสูงสุดของทั้งโรงแรม)
+        self._shard_highest = [0] * shards
+        self._connections = []
+        self._processes = []
+        for shard in range(shards):
+            parent, child = multiprocessing.Pipe()
+            path = os.path.join(data_dir, f"shard-{shard:03d}") if data_dir else None
+            process = multiprocessing.Process(target=_serve_shard, args=(child, path), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        # ช่องทางที่ลงทะเบียนไว้ใน shard ที่เปิดจาก data_dir
+        for channel in self._call(0, "attribute", "channels"):
+            if channel not in self.registry.channels:
+                self.registry.register_channel(channel)
+        for channel in self.registry.channels:
+            self._assign_channel(channel)
+        self._broadcast("attribute", "highest_occupied_room")
+        if data_dir:
+            # ทำการย้ายข้าม shard ที่ค้างอยู่ตอนปิดให้จบ และรวมห้องของช่องทางที่ลงทะเบียนไม่เสร็จ
+            self._recover_transfer()
+            if shard_by == SHARD_BY_CHANNEL:
+                for channel in list(self.registry.channels)[len(DEFAULT_CHANNELS):]:
+                    self._gather_channel(channel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        # เมธอดอื่นของ Hilberts (เช่น relocate, remove_range, เมธอด bulk) ยังไม่รองรับในโหมด shard
+        if not name.startswith("_") and callable(getattr(Hilberts, name, None)):
+            raise AttributeError(f"{name} is not supported by a sharded hotel")
+        raise AttributeError(name)
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
+
+    def close_journal(self):
+        self.close()
+
+    def _assign_channel(self, channel):
+        self._channel_shards[channel] = len(self._channel_shards) % self.shards
+
+    def shard_of(self, room_number):
+        room_number = int(parse_room(room_number))
+        if self.shard_by == SHARD_BY_RANGE:
+            return bisect.bisect_left(self.bounds, room_number)
+        decoded = self.registry.decode_room(room_number)
+        if decoded is not None:
+            return self._channel_shards[decoded[0]]
+        return room_number % self.shards
+
+    def _owned_range(self, shard, lo, hi):
+        # ส่วนของ [lo, hi] ที่ shard ดูแล (โหมด channel ทุก shard ดูแลทั้งช่วง) หรือ None ถ้าไม่มี
+        if self.shard_by == SHARD_BY_RANGE:
+            if shard:
+                lo = max(lo, self.bounds[shard - 1] + 1)
+            if shard < len(self.bounds):
+                hi = min(hi, self.bounds[shard])
+        return (lo, hi) if lo <= hi else None
+
+    def _run(self, batches):
+        # batches = {shard: [(คำสั่ง, args), ...]} ส่งให้ทุก shard ก่อนแล้วค่อยรอคำตอบ shard จึงทำงานพร้อมกัน
+        # shard ที่ยังไม่รู้ห้องสูงสุดล่าสุดของทั้งโรงแรมได้รับคำสั่ง raise_highest นำหน้าในข้อความเดียวกัน
+        synced = set()
+        for shard, commands in batches.items():
+            if self._shard_highest[shard] < self.highest_occupied_room:
+                commands = [("raise_highest", (self.highest_occupied_room,)), *commands]
+                synced.add(shard)
+            self._connections[shard].send(commands)
+        replies = {}
+        for shard in batches:
+            results, highest = self._connections[shard].recv()
+            self._shard_highest[shard] = highest
+            self.highest_occupied_room = max(self.highest_occupied_room, highest)
+            for result in results:
+                if isinstance(result, ShardError):
+                    raise result
+            replies[shard] = results[1:] if shard in synced else results
+        return replies
+
+    def _call(self, shard, name, *args):
+        return self._run({shard: [(name, args)]})[shard][0]
+
+    def _broadcast(self, name, *args):
+        replies = self._run({shard: [(name, args)] for shard in range(self.shards)})
+        return [replies[shard][0] for shard in range(self.shards)]
+
+    def register_channel(self, name):
+        result = self.registry.register_channel(name)
+        if result.startswith("Error"):
+            return result
+        name = str(name).strip()
+        self._broadcast("register_channel", name)
+        self._assign_channel(name)
+        if self.shard_by == SHARD_BY_CHANNEL:
+            self._gather_channel(name)
+        return result
+
+    def _gather_channel(self, channel):
+        # ห้องบนลำดับเลขยกกำลังของฐานช่องทางที่อยู่ shard อื่นต้องย้ายมาอยู่ shard ของช่องทาง (ทำซ้ำได้)
+        owner = self._channel_shards[channel]
+        for shard, (materialized, removed) in enumerate(self._broadcast("channel_rooms", channel)):
+            if shard == owner:
+                continue
+            for room in materialized:
+                self._transfer(shard, room, owner, room, self._call(shard, "guest_at", room))
+            for room in removed:
+                self._call(owner, "remove_room", room)
+                self._call(shard, "restore_range", room, room)
+
+    def _transfer(self, source, from_room, target, to_room, guest):
+        # ย้ายแขกข้าม shard เป็นสองการแก้ไขใน journal คนละ shard จึงบันทึกเจตนาไว้ก่อน
+        # ถ้าเครื่องล่มระหว่างนั้น การเปิดครั้งถัดไปทำต่อให้จบจากเจตนานี้ (_recover_transfer)
+        self._write_intent([source, from_room, target, to_room, guest])
+        self._call(source, "hand_off_guest", from_room)
+        self._call(target, "receive_guest", to_room, guest)
+        if self._intent_path:
+            os.unlink(self._intent_path)
+
+    def _write_intent(self, intent):
+        if not self._intent_path:
+            return
+        data = bytearray()
+        encode_value(intent, data)
+        temporary = self._intent_path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._intent_path)
+
+    def _recover_transfer(self):
+        if not os.path.exists(self._intent_path):
+            return
+        with open(self._intent_path, "rb") as file:
+            (source, from_room, target, to_room, guest), _ = decode_value(file.read(), 0)
+        # แขกยังอยู่ห้องต้นทาง (ยังไม่ได้ส่ง) หรืออยู่ห้องปลายทางแล้ว: ไม่ต้องทำอะไร
+        # ไม่อยู่ทั้งสองห้อง: hand_off ถึงดิสก์แล้วแต่ receive ยังไม่ถึง จึงรับแขกที่ปลายทางให้
+        replies = self._run({source: [("is_occupied", (from_room,))], target: [("is_occupied", (to_room,))]})
+        if not replies[source][0] and not replies[target][0]:
+            self._call(target, "receive_guest", to_room, guest)
+        os.unlink(self._intent_path)
+
+    def add_initial_guests(self, num_guests):
+        if self.shard_by == SHARD_BY_RANGE:
+            return self._broadcast("add_initial_guests", num_guests)[0]
+        return self._call(self._channel_shards["Original"], "add_initial_guests", num_guests)
+
+    def add_new_guests(self, channel, num_guests):
+        if channel not in self._channel_shards:
+            return f"Error: Invalid channel name {channel}"
+        if self.shard_by == SHARD_BY_RANGE:
+            return self._broadcast("add_new_guests", channel, num_guests)[0]
+        return self._call(self._channel_shards[channel], "add_new_guests", channel, num_guests)
+
+    def add_room_manual(self, room_number, guest_info, channel):
+        result = self._call(self.shard_of(room_number), "add_room_manual", room_number, guest_info, channel)
+        return self._with_suggestions(result, room_number)
+
+    def _with_suggestions(self, result, room_number):
+        # shard แนะนำได้เฉพาะห้องว่างในมุมมองของตัวเอง จึงแทนที่ด้วยห้องว่างของทั้งโรงแรม
+        if isinstance(result, str) and result.startswith("Error: ") and _SUGGESTION_MARK in result:
+            head = result.partition(_SUGGESTION_MARK)[0]
+            return f"{head}{_SUGGESTION_MARK}{', '.join(map(str, self.suggest_rooms(SUGGESTION_COUNT, near=room_number)))}"
+        return result
+
+    def next_free(self, after=0):
+        room = max(int(parse_room(after)), 0) + 1
+        if self.shard_by == SHARD_BY_RANGE:
+            # ถามเฉพาะ shard เจ้าของช่วง: shard อื่นไม่รู้ว่าแขกของช่องทางในช่วงนั้นย้ายออกไปแล้วหรือไม่
+            shard = self.shard_of(room)
+            while True:
+                room = self._call(shard, "next_free", room - 1)
+                if shard == len(self.bounds) or room <= self.bounds[shard]:
+                    return room
+                room = self.bounds[shard] + 1
+                shard += 1
+        # โหมด channel ห้องที่ shard ไม่ได้ดูแลว่างในมุมมองของ shard นั้นเสมอ: ห้องว่างคือห้องที่ทุก shard เห็นว่าว่าง
+        # ทุกห้องก่อนคำตอบที่มากที่สุดถูกใช้ใน shard ที่ตอบ จึงข้ามไปได้ทันที
+        while True:
+            candidate = max(self._broadcast("next_free", room - 1))
+            if candidate == room:
+                return room
+            room = candidate
+
+    def previous_free(self, before):
+        room = int(parse_room(before)) - 1
+        if room < 1:
+            return None
+        if self.shard_by == SHARD_BY_RANGE:
+            shard = self.shard_of(room)
+            while True:
+                candidate = self._call(shard, "previous_free", room + 1)
+                if candidate is not None and (shard == 0 or candidate > self.bounds[shard - 1]):
+                    return candidate
+                if shard == 0:
+                    return None
+                room = self.bounds[shard - 1]
+                shard -= 1
+        while True:
+            candidates = self._broadcast("previous_free", room + 1)
+            if None in candidates:
+                return None
+            candidate = min(candidates)
+            if candidate == room:
+                return room
+            room = candidate
+
+    def suggest_rooms(self, count, near=None):
+        # เหมือน Hilberts.suggest_rooms แต่ใช้ห้องว่างของทั้งโรงแรม
+        count = int(count)
+        if near is None:
+            suggested = []
+            room = 0
+            while len(suggested) < count:
+                room = self.next_free(room)
+                suggested.append(room)
+            return suggested
+        near = int(parse_room(near))
+        above = self.next_free(near - 1)
+        below = self.previous_free(near)
+        suggested = []
+        while len(suggested) < count:
+            if below is not None and near - below <= above - near:
+                suggested.append(below)
+                below = self.previous_free(below)
+            else:
+                suggested.append(above)
+                above = self.next_free(above)
+        return sorted(suggested)
+
+    def remove_room(self, room_number):
+        return self._call(self.shard_of(room_number), "remove_room", room_number)
+
+    def find_room(self, room_number):
+        return self._call(self.shard_of(room_number), "find_room", room_number)
+
+    def move_guest(self, from_room, to_room):
+        source, target = self.shard_of(from_room), self.shard_of(to_room)
+        if source == target:
+            return self._call(source, "move_guest", from_room, to_room)
+        # ย้ายข้าม shard: ตรวจทั้งสองห้องพร้อมกัน แล้วส่งแขกจาก shard ต้นทางไป shard ปลายทาง
+        replies = self._run({source: [("guest_at", (from_room,))], target: [("is_occupied", (to_room,))]})
+        guest = replies[source][0]
+        if guest is None:
+            return f"Error: Room {from_room} is not occupied"
+        if replies[target][0]:
+            return f"Error: Room {to_room} is already occupied"
+        self._transfer(source, from_room, target, to_room, guest)
+        return f"Guest successfully moved from room {from_room} to room {to_room}"
+
+    def run_batch(self, commands):
+        # รันหลายคำสั่ง [(ชื่อเมธอด, args), ...] คืนผลลัพธ์ตามลำดับ: คำสั่งที่ลงที่ shard เดียวถูกรวมเป็นข้อความเดียวต่อ shard
+        # และทุก shard ทำงานพร้อมกัน ส่วนคำสั่งที่ต้องใช้หลาย shard (ย้ายข้าม shard, broadcast) คั่นเป็นจุดรอ
+        # ห้องที่แนะนำใน error ของ add_room_manual คำนวณจากทั้งโรงแรมหลังข้อความของ batch นั้นทำเสร็จ
+        results = [None] * len(commands)
+        batches, positions = {}, {}
+
+        def flush():
+            for shard, replies in self._run(batches).items():
+                for position, result in zip(positions[shard], replies):
+                    name, args = commands[position]
+                    results[position] = self._with_suggestions(result, args[0]) if name == "add_room_manual" else result
+            batches.clear()
+            positions.clear()
+
+        for position, (name, args) in enumerate(commands):
+            shard = self._route(name, args)
+            if name == "remove_room" and batches and int(parse_room(args[0])) > self.highest_occupied_room:
+                # ห้องสูงสุดของทั้งโรงแรมอาจเพิ่มจากคำสั่งที่ยังไม่ได้ส่ง จึงส่งก่อนเพื่อให้ผลเหมือนทำทีละคำสั่ง
+                flush()
+            if shard is None:
+                flush()
+                results[position] = getattr(self, name)(*args)
+                continue
+            batches.setdefault(shard, []).append((name, tuple(args)))
+            positions.setdefault(shard, []).append(position)
+        flush()
+        return results
+
+    def _route(self, name, args):
+        # shard เดียวที่ทำคำสั่งนี้ได้ทั้งหมด หรือ None
+        if name in ROOM_ROUTED:
+            return self.shard_of(args[0])
+        if name == "move_guest":
+            source = self.shard_of(args[0])
+            return source if source == self.shard_of(args[1]) else None
+        if name == "add_new_guests" and self.shard_by == SHARD_BY_CHANNEL:
+            return self._channel_shards.get(args[0])
+        return None
+
+    def _range_bounds(self, lo, hi):
+        lo = 1 if lo is None else max(int(parse_room(lo)), 1)
+        hi = self.highest_occupied_room if hi is None else int(parse_room(hi))
+        return lo, hi
+
+    def _fan_out(self, name, lo, hi, *args):
+        # ส่งคำสั่งช่วงห้องให้ทุก shard ที่ดูแลส่วนหนึ่งของ [lo, hi] พร้อมกัน คืน {shard: ผลลัพธ์}
+        batches = {}
+        for shard in range(self.shards):
+            owned = self._owned_range(shard, lo, hi)
+            if owned is not None:
+                batches[shard] = [(name, (*owned, *args))]
+        return {shard: replies[0] for shard, replies in self._run(batches).items()}
+
+    def count_occupied(self, lo=None, hi=None):
+        lo, hi = self._range_bounds(lo, hi)
+        if lo > hi:
+            return 0
+        return sum(occupied for occupied, _ in self._fan_out("owned_counts", lo, hi).values())
+
+    def count_empty_rooms(self, lo=None, hi=None):
+        lo, hi = self._range_bounds(lo, hi)
+        if lo > hi:
+            return 0
+        counts = self._fan_out("owned_counts", lo, hi).values()
+        return room_count(lo, hi, sum(occupied + removed for occupied, removed in counts))
+
+    def free_in_range(self, lo, hi):
+        return self.count_empty_rooms(lo, hi)
+
+    def _iter_shard_entries(self, shard, lo, hi):
+        # แขกของ shard ในช่วง [lo, hi] เรียงตามห้อง ดึงทีละหน้า
+        while lo <= hi:
+            page = self._call(shard, "owned_page", lo, hi, self.page_rows)
+            yield from page
+            if len(page) < self.page_rows:
+                return
+            lo = page[-1][0] + 1
+
+    def _iter_entries(self, lo=None, hi=None):
+        lo, hi = self._range_bounds(lo, hi)
+        streams = []
+        for shard in range(self.shards):
+            owned = self._owned_range(shard, lo, hi)
+            if owned is not None:
+                streams.append(self._iter_shard_entries(shard, *owned))
+        return heapq.merge(*streams, key=_entry_room)
+
+    def iter_sorted_rooms(self, start=0):
+        return itertools.islice((room for room, _ in self._iter_entries()), int(start), None)
+
+    def sort_rooms(self):
+        # ห้องของแต่ละ shard เรียงอยู่แล้ว จึงเป็น k-way merge ของ shard
+        return self.iter_sorted_rooms()
+
+    def sorted_rooms_page(self, start, count):
+        return list(itertools.islice(self.iter_sorted_rooms(start), int(count)))
+
+    def query(self, channel=None, room_range=None, guest_prefix=None, manual_channel=None, offset=0, limit=100):
+        # แต่ละ shard คืนผลลัพธ์ offset + limit แรกในช่วงของตัวเอง แล้ว merge เลือกหน้าที่ต้องการ
+        offset, limit = max(int(offset), 0), max(int(limit), 0)
+        lo, hi = self._range_bounds(*(room_range or (None, None)))
+        if lo > hi:
+            return []
+        pages = list(self._fan_out("owned_query", lo, hi, channel, guest_prefix, manual_channel, offset + limit).values())
+        for page in pages:
+            if isinstance(page, str):
+                return page
+        return list(itertools.islice(heapq.merge(*pages, key=_entry_room), offset, offset + limit))
+
+    def iter_csv_chunks(self, batch_rows=10000):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["Room Number", "Channel Info"])
+        batch = []
+        for room, info in self._iter_entries():
+            if info["channel"] == "Manual":
+                label = f"Manual - {info['manual_channel']}"
+            else:
+                label = self.registry.channel_to_vehicle_numbers(info["channel"])
+            batch.append((room, label))
+            if len(batch) >= batch_rows:
+                writer.writerows(batch)
+                batch = []
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        writer.writerows(batch)
+        yield output.getvalue()
+
+    def export_csv(self, fileobj, batch_rows=10000):
+        binary = not isinstance(fileobj, io.TextIOBase)
+        write = getattr(fileobj, "sendall", None) or fileobj.write
+        for chunk in self.iter_csv_chunks(batch_rows):
+            write(chunk.encode("utf-8") if binary else chunk)
+        return f"Data written to {getattr(fileobj, 'name', 'stream')}"
+
+    def write_to_file(self):
+        return "".join(self.iter_csv_chunks())
+
+    def memory_usage(self):
+        return sum(self._broadcast("memory_usage"))
+
+    def memory_report(self, *args):
+        # ผลรวมของแต่ละโครงสร้างจากทุก shard
+        report = {}
+        for shard_report in self._broadcast("memory_report", *args):
+            for key, size in shard_report.items():
+                report[key] = report.get(key, 0) + size
+        return report
+
+    def get_hotel_status(self, manual_page=1, manual_page_size=DEFAULT_STATUS_PAGE_SIZE):
+        manual_page, manual_page_size = max(int(manual_page), 1), max(int(manual_page_size), 1)
+        highest = self.highest_occupied_room
+        summaries = self._fan_out("owned_summary", 1, highest) if highest else {}
+        guests = {}
+        for summary in summaries.values():
+            for channel, count in summary["guests"].items():
+                # โหมด range ทุก shard มีตัวนับของช่องทางเท่ากัน โหมด channel มีเพียง shard เดียว
+                guests[channel] = max(guests.get(channel, 0), count)
+        occupied = sum(summary["occupied"] for summary in summaries.values())
+        hidden = sum(summary["hidden"] for summary in summaries.values())
+        removed = sum(summary["removed"] for summary in summaries.values())
+        parts = [f"""
+# Hilbert's Infinite Hotel Status
+
+## Overview
+- **Shards:** {self.shards} (by {self.shard_by})
+- **Total Guests:** {sum(guests.values())}
+- **Occupied Channels:** {len(guests)} out of {len(self.registry.channels)}
+- **Total Occupied Rooms:** {occupied + hidden}
+- **Highest Occupied Room:** {highest}
+- **Empty Rooms** (up to highest occupied): {int(highest) - occupied - removed}
+- **Removed Rooms:** {removed}\n
+## Guests per Channel
+
+| Channel | Guests |
+|---------|--------|
+"""]
+        for channel in self.registry.channels:
+            if channel in guests:
+                parts.append(f"| {channel:<7} | {guests[channel]:<6} |\n")
+        parts.append("\n## Shards\n\n| Shard | Occupied | Manual | Removed |\n|-------|----------|--------|---------|\n")
+        for shard, summary in summaries.items():
+            parts.append(f"| {shard:<5} | {summary['occupied']:<8} | {summary['manual']:<6} | {summary['removed']:<7} |\n")
+
+        parts.append("\n## Manual Rooms\n\n")
+        manual_count = sum(summary["manual"] for summary in summaries.values())
+        if manual_count:
+            page_count = -(-manual_count // manual_page_size)
+            manual_page = min(manual_page, page_count)
+            first = (manual_page - 1) * manual_page_size
+            page = self.query("Manual", offset=first, limit=manual_page_size)
+            parts.append(f"Showing rooms {first + 1}-{first + len(page)} of {manual_count} (page {manual_page} of {page_count})\n\n")
+            parts.append("| Room Number | Guest Info | Channel |\n")
+            parts.append("|-------------|------------|--------|\n")
+            for room, info in page:
+                parts.append(f"| {room:<11} | {info['guest_info']:<10} | {info['manual_channel']:<7} |\n")
+        else:
+            parts.append("No manually added rooms.\n")
+        return "".join(parts)
+
+
+def _entry_room(entry):
+    return entry[0]
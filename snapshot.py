@@ -0,0 +1,261 @@
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from external_sort import decode_room, decode_varint, encode_room, encode_varint
+from guest_store import GuestRecord, GuestStore
+from room_index import IntervalSet
+
+# โครงสร้างไฟล์: header ขนาดคงที่ + payload โดยมี CRC32 ของ payload อยู่ใน header
+# payload เป็น varint ยกเว้นคอลัมน์ของที่เก็บห้องและช่วงของห้องที่ถูกลบ/ไม่ว่าง ซึ่งเป็น array ความกว้างคงที่
+# อ่านกลับจาก mmap ได้ทั้งคอลัมน์ รองรับเฉพาะเวอร์ชันปัจจุบัน
+SNAPSHOT_MAGIC = b"HILBSNAP"
+SNAPSHOT_VERSION = 5
+_HEADER = struct.Struct("<8sHHQI4x")
+FLAG_COMPACT_ROOM_IDS = 1
+_WORD_LIMIT = 1 << 64
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _encode_string(value, out):
+    data = value.encode("utf-8")
+    encode_varint(len(data), out)
+    out += data
+
+
+def _decode_string(buffer, position):
+    length, position = decode_varint(buffer, position)
+    end = position + length
+    return bytes(buffer[position:end]).decode("utf-8"), end
+
+
+def _encode_sorted(values, out):
+    # เก็บเลขที่เรียงแล้วเป็นผลต่าง (delta) เพื่อให้ varint สั้น
+    encode_varint(len(values), out)
+    previous = 0
+    for value in values:
+        encode_varint(value - previous, out)
+        previous = value
+
+
+def _decode_sorted(buffer, position):
+    count, position = decode_varint(buffer, position)
+    values = []
+    previous = 0
+    for _ in range(count):
+        delta, position = decode_varint(buffer, position)
+        previous += delta
+        values.append(previous)
+    return values, position
+
+
+def _encode_array(values, typecode, out):
+    # คอลัมน์ความกว้างคงที่แบบ little-endian อ่านกลับได้ทั้งคอลัมน์ด้วย array.frombytes
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    out += column.tobytes()
+
+
+def _decode_array(buffer, position, typecode, count):
+    column = array(typecode)
+    end = position + count * column.itemsize
+    column.frombytes(buffer[position:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+
+def _encode_runs(intervals, out):
+    # ช่วงของ IntervalSet: ช่วงที่อยู่ใน 64 บิตเก็บเป็นคอลัมน์ start และ end ความกว้างคงที่
+    # ช่วงที่เหลือ (ห้องขนาดใหญ่มาก มีน้อย) เก็บทีละช่วงเป็น varint (ระยะจากช่วงก่อนหน้า, ความยาว - 1)
+    starts, ends = intervals.columns()
+    fixed = bisect.bisect_left(ends, _WORD_LIMIT)
+    encode_varint(fixed, out)
+    _encode_array(starts[:fixed], "Q", out)
+    _encode_array(ends[:fixed], "Q", out)
+    encode_varint(len(starts) - fixed, out)
+    previous = ends[fixed - 1] if fixed else 0
+    for start, end in zip(starts[fixed:], ends[fixed:]):
+        encode_varint(start - previous, out)
+        encode_varint(end - start, out)
+        previous = end
+
+
+def _decode_runs(buffer, position):
+    fixed, position = decode_varint(buffer, position)
+    starts, position = _decode_array(buffer, position, "Q", fixed)
+    ends, position = _decode_array(buffer, position, "Q", fixed)
+    starts, ends = starts.tolist(), ends.tolist()
+    count, position = decode_varint(buffer, position)
+    previous = ends[-1] if ends else 0
+    for _ in range(count):
+        start, position = decode_varint(buffer, position)
+        length, position = decode_varint(buffer, position)
+        start += previous
+        previous = start + length
+        starts.append(start)
+        ends.append(previous)
+    return IntervalSet.from_runs(starts, ends), position
+
+
+def _encode_strings(values, out):
+    # ตารางสตริงทั้งตาราง: ความยาว (จำนวนตัวอักษร) เป็นคอลัมน์ ตามด้วยข้อความทั้งหมดที่ต่อกันเป็นก้อนเดียว
+    encode_varint(len(values), out)
+    _encode_array(map(len, values), "I", out)
+    data = "".join(values).encode("utf-8")
+    encode_varint(len(data), out)
+    out += data
+
+
+def _decode_strings(buffer, position):
+    count, position = decode_varint(buffer, position)
+    lengths, position = _decode_array(buffer, position, "I", count)
+    text, position = _decode_string(buffer, position)
+    ends = itertools.accumulate(lengths)
+    return list(map(text.__getitem__, map(slice, itertools.accumulate(lengths, initial=0), ends))), position
+
+
+def encode_snapshot(hotel, journal_sequence=0):
+    # snapshot เก็บเฉพาะสถานะที่นำ relocation ไปใช้แล้ว
+    hotel.compact()
+    out = bytearray()
+    # ลำดับสุดท้ายของ journal ที่รวมอยู่ใน snapshot นี้แล้ว และ transform ของช่องทาง (multiplier, offset)
+    encode_varint(journal_sequence, out)
+    multiplier, offset = hotel.channel_transform
+    encode_varint(multiplier, out)
+    encode_varint(offset, out)
+    encode_varint(len(hotel.channels), out)
+    for channel, base in hotel.channels.items():
+        _encode_string(channel, out)
+        encode_varint(base, out)
+        encode_varint(hotel.guests_per_channel[channel], out)
+        _encode_sorted(sorted(hotel.vacated_exponents[channel]), out)
+    encode_varint(hotel.initial_guests, out)
+    encode_room(hotel.highest_occupied_room, out)
+    _encode_runs(hotel.removed_rooms, out)
+    _encode_runs(hotel.blocked_rooms, out)
+
+    # คอลัมน์ของที่เก็บห้องตามที่อยู่ในหน่วยความจำ (รหัสอ้างอิงตารางชื่อ channel และตารางสตริง ช่อง 0 = ไม่มีค่า)
+    (keys, channel_codes, info_codes, manual_codes), channel_names, strings, boxed = hotel.rooms.columns()
+    _encode_strings(channel_names[1:], out)
+    _encode_strings([value or "" for value in strings[1:]], out)
+    encode_varint(len(keys), out)
+    _encode_array(keys, "Q", out)
+    _encode_array(channel_codes, "H", out)
+    _encode_array(info_codes, "I", out)
+    _encode_array(manual_codes, "I", out)
+    # ห้องที่ไม่ใช่ int 64 บิต (RoomId และห้องขนาดใหญ่มาก) มีน้อย เก็บทีละห้อง
+    encode_varint(len(boxed), out)
+    for room, record in boxed:
+        encode_room(room, out)
+        _encode_string(record.channel, out)
+        _encode_string(record.guest_info, out)
+        encode_varint(int(record.manual_channel is not None), out)
+        if record.manual_channel is not None:
+            _encode_string(record.manual_channel, out)
+    return out
+
+
+def snapshot_flags(hotel):
+    return FLAG_COMPACT_ROOM_IDS if hotel.compact_room_ids else 0
+
+
+def write_snapshot(hotel, path, journal_sequence=0):
+    return write_snapshot_payload(path, encode_snapshot(hotel, journal_sequence), snapshot_flags(hotel))
+
+
+def write_snapshot_payload(path, payload, flags):
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, len(payload), zlib.crc32(payload))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(header)
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return len(header) + len(payload)
+
+
+def read_snapshot(path, hotel_factory):
+    return read_snapshot_with_sequence(path, hotel_factory)[0]
+
+
+def read_snapshot_with_sequence(path, hotel_factory):
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < _HEADER.size:
+            raise SnapshotError(f"Snapshot {path} is truncated")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, version, flags, payload_length, checksum = _HEADER.unpack_from(buffer, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{path} is not a hotel snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot version {version}")
+            if _HEADER.size + payload_length != size:
+                raise SnapshotError(f"Snapshot {path} is truncated")
+            view = memoryview(buffer)[_HEADER.size:]
+            try:
+                if zlib.crc32(view) != checksum:
+                    raise SnapshotError(f"Snapshot {path} failed its checksum")
+            finally:
+                view.release()
+            hotel = hotel_factory(compact_room_ids=bool(flags & FLAG_COMPACT_ROOM_IDS))
+            journal_sequence, position = decode_varint(buffer, _HEADER.size)
+            multiplier, position = decode_varint(buffer, position)
+            offset, position = decode_varint(buffer, position)
+            hotel.channel_transform = (multiplier, offset)
+            _decode_payload(hotel, buffer, position)
+    return hotel, journal_sequence
+
+
+def _decode_payload(hotel, buffer, position):
+    channel_count, position = decode_varint(buffer, position)
+    for _ in range(channel_count):
+        channel, position = _decode_string(buffer, position)
+        base, position = decode_varint(buffer, position)
+        count, position = decode_varint(buffer, position)
+        vacated, position = _decode_sorted(buffer, position)
+        # ช่องทางที่ลงทะเบียนภายหลังถูกลงทะเบียนใหม่ตามลำดับเดิม จึงได้ฐานเดิม
+        if channel not in hotel.channels and base == hotel._next_channel_base():
+            hotel._add_channel(channel, base)
+        if hotel.channels.get(channel) != base:
+            raise SnapshotError(f"Snapshot channel {channel} does not match this hotel")
+        if count:
+            hotel._extend_channel(channel, count)
+        for exponent in vacated:
+            hotel._vacate(channel, exponent)
+    hotel.initial_guests, position = decode_varint(buffer, position)
+    hotel.highest_occupied_room, position = decode_room(buffer, position)
+    removed_rooms, position = _decode_runs(buffer, position)
+    blocked_rooms, position = _decode_runs(buffer, position)
+
+    # คอลัมน์ถูกคัดลอกจาก buffer ทั้งก้อน ดัชนีรองของห้อง (channel, คำใน guest_info) ยังไม่สร้างจนกว่าจะถูกค้น
+    channel_names, position = _decode_strings(buffer, position)
+    strings, position = _decode_strings(buffer, position)
+    room_count, position = decode_varint(buffer, position)
+    keys, position = _decode_array(buffer, position, "Q", room_count)
+    channel_codes, position = _decode_array(buffer, position, "H", room_count)
+    info_codes, position = _decode_array(buffer, position, "I", room_count)
+    manual_codes, position = _decode_array(buffer, position, "I", room_count)
+    rooms = GuestStore.from_columns((keys, channel_codes, info_codes, manual_codes), [None] + channel_names, [None] + strings)
+    hotel._restore_rooms(rooms, removed_rooms, blocked_rooms)
+    boxed_count, position = decode_varint(buffer, position)
+    for _ in range(boxed_count):
+        room, position = decode_room(buffer, position)
+        channel, position = _decode_string(buffer, position)
+        guest_info, position = _decode_string(buffer, position)
+        has_manual, position = decode_varint(buffer, position)
+        manual_channel = None
+        if has_manual:
+            manual_channel, position = _decode_string(buffer, position)
+        hotel._materialize(room, GuestRecord(channel, guest_info, manual_channel))
+    return position
@@ -1,21 +1,24 @@
 import streamlit as st
 from hilbert import *
 import pandas as pd
+from engine import HotelEngine
+
+@st.cache_resource
+def get_engine():
+    # โรงแรมเดียวที่ทุก session ใช้ร่วมกัน; engine จัดการ lock ให้
+    return HotelEngine(Hilberts())
 
 def main():
     st.set_page_config(page_title="Hilbert Nuanua Infinite Hotel", page_icon="🏨", layout="wide")
     
     st.title("🏨 Hilbert Nuanua Infinite Hotel")
     
-    if 'hotel' not in st.session_state:
-        st.session_state.hotel = Hilberts()
-    
-    hotel = st.session_state.hotel
+    hotel = get_engine()
 
     st.sidebar.title("Operations")
     operation = st.sidebar.radio(
         "Choose an operation:",
-        ["Initialize Hotel", "Add Guests", "Manage Rooms", "Hotel Status", "File Operations"]
+        ["Initialize Hotel", "Add Guests", "Manage Rooms", "Find Guests", "Hotel Status", "File Operations"]
     )
 
     if operation == "Initialize Hotel":
@@ -31,7 +34,7 @@ def main():
 
     elif operation == "Add Guests":
         st.header("Add Guests to Channels")
-        channels = ["Bus", "Train", "Plane", "Ship"]
+        channels = [channel for channel in hotel.channels if channel != "Original"]
         col1, col2 = st.columns(2)
         with col1:
             channel = st.selectbox("Select channel:", channels)
@@ -45,9 +48,18 @@ def main():
             st.success(result)
             st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
 
+        st.subheader("Register a New Channel")
+        new_channel = st.text_input("Channel name:")
+        if st.button("Register Channel"):
+            result = hotel.register_channel(new_channel)
+            if result.startswith("Error"):
+                st.error(result)
+            else:
+                st.success(result)
+
     elif operation == "Manage Rooms":
         st.header("Manage Rooms")
-        action = st.radio("Choose an action:", ["Add Room Manually", "Remove Room", "Find Room", "Sort Rooms", "Move Guests"])
+        action = st.radio("Choose an action:", ["Add Room Manually", "Remove Room", "Find Room", "Sort Rooms", "Move Guests", "Relocate All Guests", "Remove Room Range"])
         
         if action == "Add Room Manually":
             col1, col2, col3 = st.columns(3)
@@ -101,33 +113,28 @@ def main():
         #         st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
         elif action == "Sort Rooms":
             st.subheader("Sort Rooms")
-            col1, col2, col3 = st.columns(3)
+            col1, col2 = st.columns(2)
             with col1:
-                chunk_size = st.number_input("Chunk size:", min_value=1000, value=1000000, step=1000)
-            with col2:
                 start = st.number_input("Start from:", min_value=0, step=1)
-            with col3:
+            with col2:
                 count = st.number_input("Number of rooms to display:", min_value=1, max_value=1000, value=20, step=1)
             
             if st.button("Sort Rooms"):
                 with st.spinner("Sorting rooms..."):
                     start_time = time_module.perf_counter()
-                    all_sorted_rooms = hotel.sort_rooms(chunk_size)
+                    # ดึงเฉพาะหน้าที่ต้องการจาก iterator ที่ merge ห้องไว้แล้ว ไม่ต้องเรียงทั้งโรงแรม
+                    displayed_rooms = hotel.sorted_rooms_page(start, count)
                     end_time = time_module.perf_counter()
                     total_time = end_time - start_time
                     
-                    # เลือกห้องตาม start และ count
-                    displayed_rooms = all_sorted_rooms[start:start+count]
-                    
-                    st.write(f"Sorted Rooms (showing {len(displayed_rooms)} out of {len(all_sorted_rooms)} total rooms):")
+                    st.write(f"Sorted Rooms (showing {len(displayed_rooms)} rooms starting at position {start}):")
                     if displayed_rooms:
-                        df = pd.DataFrame({"Room Number": displayed_rooms})
+                        df = pd.DataFrame({"Room Number": [str(room) for room in displayed_rooms]})
                         st.dataframe(df)
                     else:
                         st.write("No rooms to display in the specified range.")
                     
                     st.info(f"Sorting completed in {total_time:.6f} seconds")
-                    st.info(f"Total rooms sorted: {len(all_sorted_rooms)}")
 
                 # แสดงข้อมูลเพิ่มเติมเกี่ยวกับการใช้หน่วยความจำ
                 memory_usage = hotel.memory_usage()
@@ -147,12 +154,94 @@ def main():
                 st.success(result)
                 st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
 
+        elif action == "Relocate All Guests":
+            st.write("Move every guest from room n to room multiplier × n + offset.")
+            col1, col2 = st.columns(2)
+            with col1:
+                multiplier = st.number_input("Multiplier:", min_value=1, step=1)
+            with col2:
+                offset = st.number_input("Offset:", min_value=0, step=1)
+            col3, col4 = st.columns(2)
+            with col3:
+                if st.button("Relocate"):
+                    start_time = time_module.perf_counter()
+                    result = hotel.relocate(multiplier, offset)
+                    end_time = time_module.perf_counter()
+                    st.success(result)
+                    st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+            with col4:
+                if st.button("Apply Pending Relocations"):
+                    start_time = time_module.perf_counter()
+                    result = hotel.compact()
+                    end_time = time_module.perf_counter()
+                    st.success(result)
+                    st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+
+        elif action == "Remove Room Range":
+            col1, col2 = st.columns(2)
+            with col1:
+                lo = st.number_input("First room:", min_value=1, step=1)
+            with col2:
+                hi = st.number_input("Last room:", min_value=1, step=1)
+            col3, col4 = st.columns(2)
+            with col3:
+                if st.button("Remove Rooms"):
+                    start_time = time_module.perf_counter()
+                    result = hotel.remove_range(lo, hi)
+                    end_time = time_module.perf_counter()
+                    st.success(result)
+                    st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+            with col4:
+                if st.button("Restore Rooms"):
+                    start_time = time_module.perf_counter()
+                    result = hotel.restore_range(lo, hi)
+                    end_time = time_module.perf_counter()
+                    st.success(result)
+                    st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+
+    elif operation == "Find Guests":
+        st.header("Find Guests")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            channel = st.selectbox("Channel:", ["Any", "Manual", *hotel.channels])
+        with col2:
+            manual_channel = st.text_input("Manual channel:")
+        with col3:
+            guest_prefix = st.text_input("Guest info starts with:")
+        col4, col5, col6, col7 = st.columns(4)
+        with col4:
+            lo = st.number_input("From room:", min_value=1, value=1, step=1)
+        with col5:
+            hi = st.number_input("To room (0 = highest occupied):", min_value=0, value=0, step=1)
+        with col6:
+            page = st.number_input("Page:", min_value=1, value=1, step=1)
+        with col7:
+            page_size = st.number_input("Results per page:", min_value=1, value=DEFAULT_QUERY_LIMIT, step=1)
+        if st.button("Find Guests"):
+            start_time = time_module.perf_counter()
+            # ผลลัพธ์มาจากดัชนีรองทีละหน้า หน้าที่เคยค้นแล้วมาจาก result cache
+            result = hotel.query(None if channel == "Any" else channel, (lo, hi or None), guest_prefix or None,
+                                 manual_channel or None, (page - 1) * page_size, page_size)
+            end_time = time_module.perf_counter()
+            if isinstance(result, str):
+                st.error(result)
+            elif result:
+                st.dataframe(pd.DataFrame([{"Room Number": str(room), **info} for room, info in result]))
+            else:
+                st.write("No matching guests on this page.")
+            st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+
     elif operation == "Hotel Status":
         st.header("Hotel Status")
+        col1, col2 = st.columns(2)
+        with col1:
+            manual_page = st.number_input("Manual rooms page:", min_value=1, value=1)
+        with col2:
+            manual_page_size = st.number_input("Manual rooms per page:", min_value=1, value=50)
         if st.button("Show Hotel Status"):
             with st.spinner("Fetching hotel status..."):
                 start_time = time_module.perf_counter()
-                status = hotel.get_hotel_status()
+                status = hotel.get_hotel_status(manual_page, manual_page_size)
                 end_time = time_module.perf_counter()
             st.markdown(status)
             st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
@@ -170,7 +259,8 @@ def main():
         if st.button("Generate File"):
             with st.spinner("Generating file..."):
                     start_time = time_module.perf_counter()
-                    file_content = hotel.write_to_file()
+                    # ไฟล์ของโรงแรมที่ยังไม่เปลี่ยนมาจาก result cache โดยไม่ต้องสร้างใหม่
+                    export_file = hotel.export_csv_blob()
                     end_time = time_module.perf_counter()
                 
             st.success("File generated successfully")
@@ -179,21 +269,73 @@ def main():
             # สร้างปุ่มดาวน์โหลด
             st.download_button(
                     label="Download CSV",
-                    data=file_content,
+                    data=export_file,
                     file_name="hotel_rooms.csv",
                     mime="text/csv"
             )
 
+        st.subheader("Bulk Import")
+        uploaded = st.file_uploader("CSV of room number, guest info, channel (no header):", type="csv")
+        if uploaded is not None and st.button("Import Rooms"):
+            rows = pd.read_csv(uploaded, header=None, dtype=str).values
+            start_time = time_module.perf_counter()
+            result = hotel.add_rooms_manual_bulk(rows)
+            end_time = time_module.perf_counter()
+            if result.startswith("Error"):
+                st.error(result)
+            else:
+                st.success(result)
+            st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+
+        st.subheader("Snapshots")
+        snapshot_path = st.text_input("Snapshot file:", value="hotel.snap")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Save Snapshot"):
+                start_time = time_module.perf_counter()
+                result = hotel.save_snapshot(snapshot_path)
+                end_time = time_module.perf_counter()
+                st.success(result)
+                st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+        with col2:
+            if st.button("Load Snapshot"):
+                try:
+                    start_time = time_module.perf_counter()
+                    hotel.replace(Hilberts.load_snapshot(snapshot_path))
+                    end_time = time_module.perf_counter()
+                    st.success(f"Hotel restored from {snapshot_path}")
+                    st.info(f"Operation completed in {end_time - start_time:.6f} seconds")
+                except (OSError, ValueError) as e:
+                    st.error(f"Error loading snapshot: {e}")
+
     st.sidebar.header("System Info")
+    exact_memory = st.sidebar.checkbox("Exact memory report (tracemalloc, slow)")
     if st.sidebar.button("Show Memory Usage"):
-        memory_usage = hotel.memory_usage()
-        st.sidebar.info(f"Current memory usage: {memory_usage} bytes")
+        memory_report = hotel.memory_report("exact" if exact_memory else "sampled")
+        st.sidebar.info(f"Current memory usage: {memory_report['total']} bytes")
+        for structure, size in memory_report.items():
+            if structure != "total":
+                st.sidebar.text(f"{structure}: {size} bytes")
+
+    collect_metrics = st.sidebar.checkbox("Collect function metrics", value=hotel.metrics.enabled)
+    if collect_metrics != hotel.metrics.enabled:
+        hotel.set_metrics_enabled(collect_metrics)
 
     if st.sidebar.button("Show Function Execution Times"):
-        function_times = hotel.get_function_times()
+        function_stats = hotel.get_function_stats()
         st.sidebar.subheader("Function Execution Times")
-        for func, time in function_times.items():
-            st.sidebar.text(f"{func}: {time} seconds")
+        for func, stats in function_stats.items():
+            st.sidebar.text(f"{func}: {stats['inclusive_seconds']:.6f} seconds ({stats['calls']} calls)")
+            st.sidebar.text(f"  self {stats['self_seconds']:.6f}s | p50 {stats['p50_seconds']:.6f}s | p95 {stats['p95_seconds']:.6f}s | p99 {stats['p99_seconds']:.6f}s | max {stats['max_seconds']:.6f}s")
+        cache_stats = hotel.get_cache_stats()
+        st.sidebar.subheader("Result Cache")
+        st.sidebar.text(f"{cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.1%} hit rate)")
+        st.sidebar.text(f"{cache_stats['entries']} entries, {cache_stats['bytes']} bytes, {cache_stats['evictions']} evictions")
+
+    metrics_format = st.sidebar.selectbox("Metrics export format:", ["json", "prometheus"])
+    if st.sidebar.button("Export Metrics"):
+        path = hotel.export_metrics("hilbert_metrics.json" if metrics_format == "json" else "hilbert_metrics.prom", metrics_format)
+        st.sidebar.success(f"Metrics written to {path}")
 
 if __name__ == "__main__":
     main()